@@ -6,54 +6,152 @@ Incluye gestión inteligente de contexto, fragmentación, resumen, y streaming.
 """
 
 import os
+import time
 import asyncio
-import json as jsonlib
 import numpy as np
 import httpx
+from datetime import date
+from functools import lru_cache
+from typing import Optional
 from openai import OpenAI
 from app.db.crud import obtener_faqs
-from app.utils.helpers import sanitizar_texto, generar_embedding
+from app.utils.helpers import sanitizar_texto, generar_embeddings
+from app.utils.metadatos import condicion_filtros, inferir_filtros
+from app.utils.streaming import DecodificadorSSE, FIN_STREAM, extraer_contenido
+from app.agents.enrutador_modelos import EnrutadorModelos, ErrorModelo
+from app.agents.prompt import EnsambladorPrompt
+from app.agents.consultas_tablas import ConsultaTablasTool
+from app.agents.indice_vectorial import IndiceVectorialMapeado
+from app.config import (
+    OPENROUTER_MODELOS,
+    PROMPT_MAX_TOKENS,
+    DIMENSION_EMBEDDING,
+    VECTOR_COMPACTO,
+    VECTOR_SOBREMUESTREO,
+    VECTOR_BACKEND,
+    CONTEXTO_TIMEOUT_RECUPERACION,
+    CONTEXTO_TIMEOUT_OPCIONAL,
+)
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
+# Expresión de orden para la pasada ANN de cada modo compacto ($1 es el embedding de la consulta)
+ORDEN_COMPACTO = {
+    "halfvec": f"embedding::halfvec({DIMENSION_EMBEDDING}) <-> $1::vector::halfvec({DIMENSION_EMBEDDING})",
+    "binario": (
+        f"binary_quantize(embedding)::bit({DIMENSION_EMBEDDING}) "
+        f"<~> binary_quantize($1::vector)::bit({DIMENSION_EMBEDDING})"
+    ),
+}
+
+# Consultas de búsqueda con texto fijo por combinación de filtros: asyncpg las prepara una
+# vez por conexión y reutiliza la sentencia preparada de su caché (DB_CACHE_SENTENCIAS)
+@lru_cache(maxsize=None)
+def sql_busqueda(modo_compacto: str = "", categoria: Optional[str] = None, con_periodo: bool = False) -> str:
+    """
+    Consulta de búsqueda vectorial para un modo y unos filtros.
+
+    Sin filtros, el modo compacto hace la pasada ANN sobre su índice y reordena los
+    candidatos con la distancia exacta. Con filtros se busca siempre sobre el vector
+    float32, porque un índice HNSW global con WHERE filtra después de la pasada ANN y
+    devuelve menos de top_k filas cuando el filtro es selectivo:
+
+    - solo categoría: el WHERE coincide con el del índice HNSW parcial de la categoría;
+    - con periodo: los fragmentos de un periodo son pocos, se leen con el índice de
+      periodo y se ordenan con la distancia exacta (OFFSET 0 impide usar el HNSW).
+
+    Parámetros: $1 embedding, $2 top_k y $3 candidatos (modo compacto sin filtros) o
+    periodo (si se filtra por él).
+
+    :param modo_compacto: "halfvec", "binario" o vacío.
+    :param categoria: Categoría a filtrar o None.
+    :param con_periodo: Si se filtra por periodo.
+    """
+    if con_periodo:
+        return f"""
+    SELECT *
+        FROM (
+            SELECT * FROM documentos {condicion_filtros(categoria, True, 3)} OFFSET 0
+        ) d
+    ORDER BY embedding <-> $1::vector
+        LIMIT $2;
+    """
+    if categoria is not None or not modo_compacto:
+        return f"""
+    SELECT *
+        FROM documentos
+        {condicion_filtros(categoria, False, 3)}
+    ORDER BY embedding <-> $1::vector
+        LIMIT $2;
+    """
+    return f"""
+    WITH candidatos AS (
+        SELECT id
+            FROM documentos
+        ORDER BY {ORDEN_COMPACTO[modo_compacto]}
+            LIMIT $3
+    )
+    SELECT d.*
+        FROM candidatos c
+        JOIN documentos d USING (id)
+    ORDER BY d.embedding <-> $1::vector
+        LIMIT $2;
+    """
+
+
+class ErrorRecuperacion(Exception):
+    """
+    La consulta a las tablas o la búsqueda de documentos no terminó; sin ese contexto
+    no se genera respuesta.
+    """
+
 
 class VectorSearchTool:
     """
     Herramienta para búsqueda vectorial en la tabla documentos usando pgvector.
 
     Permite consultas vectoriales en PostgreSQL para obtener documentos relevantes.
+    En modo compacto la pasada ANN usa un índice halfvec o binario y los candidatos
+    sobremuestreados se reordenan con la distancia exacta sobre el vector completo;
+    las búsquedas filtradas por categoría o periodo usan siempre el vector completo.
     """
 
-    def __init__(self, pool):
+    def __init__(self, pool, modo_compacto: str = VECTOR_COMPACTO, sobremuestreo: int = VECTOR_SOBREMUESTREO):
         """
         Inicializa la herramienta con el pool de conexiones async a la base de datos.
 
         :param pool: Pool de conexiones async a PostgreSQL.
+        :param modo_compacto: "halfvec", "binario" o vacío para buscar sobre el vector float32.
+        :param sobremuestreo: Candidatos por resultado que se traen de la pasada compacta.
         """
         self.pool = pool
+        self.modo_compacto = modo_compacto if modo_compacto in ORDEN_COMPACTO else ""
+        self.sobremuestreo = max(1, sobremuestreo)
 
-    async def search(self, query_embedding: list, top_k: int = 5):
+    async def search(self, query_embedding: list, top_k: int = 5, categoria: str = None, periodo: date = None):
         """
         Realiza búsqueda vectorial y devuelve documentos más relevantes.
 
         :param query_embedding: Embedding de la consulta (lista de floats).
         :param top_k: Número máximo de resultados a devolver.
+        :param categoria: Solo documentos de esta categoría (ver app/utils/metadatos.py).
+        :param periodo: Solo documentos de este periodo (primer día del mes).
         :return: Lista de diccionarios con documentos (id, nombre_archivo, contenido, distancia).
         """
-        sql = """
-            SELECT *
-                FROM documentos
-            ORDER BY embedding <-> $1::vector
-                LIMIT $2;
-            """
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(sql, query_embedding, top_k)
-            
-            rows = await conn.fetch(sql, query_embedding, top_k)
-            print(f"[VectorSearchTool] recuperé {len(rows)} docs:", [r['nombre_archivo'] for r in rows])
+        # Las búsquedas filtradas usan el vector float32 (ver sql_busqueda)
+        compacto = self.modo_compacto if categoria is None and periodo is None else ""
+        sql = sql_busqueda(compacto, categoria, periodo is not None)
+        args = [query_embedding, top_k]
+        if compacto:
+            args.append(top_k * self.sobremuestreo)
+        if periodo is not None:
+            args.append(periodo)
 
-            
-            return [dict(row) for row in rows]
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(sql, *args)
+        modo = f"({compacto}) " if compacto else ""
+        print(f"[VectorSearchTool] {modo}recuperé {len(rows)} docs:", [r['nombre_archivo'] for r in rows])
+        return [dict(row) for row in rows]
 
 
 class AgnoMunicipalAgent:
@@ -64,22 +162,36 @@ class AgnoMunicipalAgent:
     resumen, fragmentación, filtrado y búsqueda en internet con filtro geográfico.
     """
 
-    def __init__(self, pool, api_key: str):
+    def __init__(self, pool, api_key: str, modelos: list = None):
         """
         Inicializa el agente con cliente OpenAI para OpenRouter y búsqueda vectorial.
 
-        :param pool: Pool de conexiones async a PostgreSQL.
+        :param pool: Pool de conexiones async a PostgreSQL (o `db`, que expone el mismo `acquire()`).
         :param api_key: API key para OpenRouter.
+        :param modelos: Modelos en orden de preferencia (por defecto OPENROUTER_MODELOS).
         """
         self.client = OpenAI(
             base_url="https://openrouter.ai/api/v1",
             api_key=api_key,
         )
-        self.model_id = "deepseek/deepseek-r1-0528-qwen3-8b:free"
+        self.modelos = modelos or OPENROUTER_MODELOS
+        self.model_id = self.modelos[0]
+        self.enrutador = EnrutadorModelos(self.modelos)
+
+        # Métricas de cancelación por desconexión; la media se estima en fragmentos del stream
+        self.cancelaciones = 0
+        self.tokens_ahorrados = 0
+        self.tokens_respuesta_media = 400.0
+        self.etapas_omitidas = {}
+        self.etapas_fallidas = 0
         self.enable_search = True
         self.pool = pool
         self.api_key = api_key
         self.vector_tool = VectorSearchTool(pool)
+        if VECTOR_BACKEND == "memoria":
+            # Búsqueda en proceso; pgvector queda como respaldo mientras no haya instantánea
+            self.vector_tool = IndiceVectorialMapeado(respaldo=self.vector_tool)
+        self.tablas_tool = ConsultaTablasTool(pool)
 
         self.prompt_inicial = (
             "Eres un asistente municipal experto en los diversos trámites, servicios, reglamentos y aspectos operativos que competen al gobierno local de Momostenango, en el departamento de Totonicapán, Guatemala. "
@@ -99,6 +211,19 @@ class AgnoMunicipalAgent:
             "Tu comunicación debe ser clara, profesional, exacta y fácil de comprender, adaptada a usuarios con diferentes niveles de conocimiento, como vecinos, prestadores de servicios, inversionistas o cualquier persona que busque información o realizar un trámite municipal."
         )
 
+        self.system_prompt = (
+            "Eres un asistente municipal que responde solo preguntas relacionadas con "
+            "servicios, trámites y normativas municipales. No respondas preguntas sobre noticias, "
+            "temas políticos, ni información fuera del contexto municipal."
+        )
+
+        # Prefijo estático: se construye y se cuenta una sola vez por agente
+        self.ensamblador = EnsambladorPrompt(
+            f"{self.system_prompt}\n\n{self.prompt_inicial}",
+            self.contar_tokens,
+            PROMPT_MAX_TOKENS,
+        )
+
 
     def contar_tokens(self, texto: str) -> int:
         """
@@ -152,6 +277,68 @@ class AgnoMunicipalAgent:
             # En caso de error, devolver texto original truncado
             return texto[:max_tokens*4]
 
+    async def _completar(self, messages: list, max_tokens: int, temperature: float = 0.3) -> str:
+        """
+        Pide una respuesta completa (sin streaming) probando los modelos disponibles en orden.
+
+        Cada intento se registra en el cortacircuitos del modelo, igual que en streaming.
+
+        :param messages: Mensajes de la conversación.
+        :param max_tokens: Máximo de tokens de la respuesta.
+        :param temperature: Temperatura de muestreo.
+        :return: Texto de la respuesta.
+        :raises ErrorModelo: Si ningún modelo responde.
+        """
+        url = "https://openrouter.ai/api/v1/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        ultimo_error = None
+        async with httpx.AsyncClient(timeout=60) as client:
+            for modelo in self.enrutador.candidatos():
+                payload = {
+                    "model": modelo,
+                    "messages": messages,
+                    "max_tokens": max_tokens,
+                    "temperature": temperature,
+                }
+                circuito = self.enrutador.circuitos[modelo]
+                try:
+                    response = await client.post(url, headers=headers, json=payload)
+                    if response.status_code != 200:
+                        raise ErrorModelo(f"{modelo} ({response.status_code}): {response.text}")
+                    content = response.json()["choices"][0]["message"]["content"]
+                    if not content:
+                        raise ErrorModelo(f"{modelo}: respuesta vacía")
+                except Exception as e:
+                    print(f"[Agente] Falló {modelo}: {e}")
+                    circuito.registrar_fallo()
+                    ultimo_error = e
+                    continue
+                circuito.registrar_exito()
+                return content.strip()
+        raise ErrorModelo(f"Ningún modelo pudo completar: {ultimo_error}")
+
+    async def resumir_conversacion(self, resumen_previo: str, turnos: list, max_tokens: int) -> str:
+        """
+        Incorpora turnos antiguos de la conversación al resumen acumulado.
+
+        :param resumen_previo: Resumen actual de la conversación (puede estar vacío).
+        :param turnos: Lista de tuplas (pregunta, respuesta) a incorporar.
+        :param max_tokens: Extensión máxima del nuevo resumen.
+        :return: Resumen actualizado.
+        """
+        texto_turnos = "\n".join(f"Ciudadano: {p}\nAgente: {r}" for p, r in turnos)
+        prompt = (
+            "Actualiza el resumen de una conversación entre un ciudadano y el asistente municipal "
+            "de Momostenango. Conserva los datos concretos (trámites, montos, fechas, nombres, "
+            f"oficinas) y lo que el ciudadano necesita. Usa como máximo {max_tokens} palabras.\n\n"
+            f"Resumen actual:\n{resumen_previo or '(vacío)'}\n\n"
+            f"Nuevos turnos:\n{texto_turnos}\n\nResumen actualizado:"
+        )
+        return await self._completar([{"role": "user", "content": prompt}], max_tokens=max_tokens * 2)
+
     async def fragmentar_y_filtrar_texto(self, texto: str, pregunta: str, max_fragmentos: int = 5, max_tokens_fragmento: int = 300):
         """
         Divide texto en fragmentos, genera embeddings y selecciona los más relevantes para la pregunta.
@@ -179,12 +366,10 @@ class AgnoMunicipalAgent:
         if buffer:
             fragmentos.append(" ".join(buffer))
 
-        embedding_pregunta = await generar_embedding(pregunta)
-
-        fragmentos_embeddings = []
-        for frag in fragmentos:
-            emb = await generar_embedding(frag)
-            fragmentos_embeddings.append((frag, emb))
+        # La pregunta y los fragmentos se vectorizan en una sola petición
+        embeddings = await generar_embeddings([pregunta, *fragmentos])
+        embedding_pregunta = embeddings[0]
+        fragmentos_embeddings = list(zip(fragmentos, embeddings[1:]))
 
         def similitud_coseno(a, b):
             a = np.array(a)
@@ -205,102 +390,250 @@ class AgnoMunicipalAgent:
 
         return contexto
 
-    async def responder_stream(self, pregunta: str, embedding=None, contexto_adicional: str = ""):
+    async def responder_stream(
+        self,
+        pregunta: str,
+        embedding=None,
+        contexto_adicional: str = "",
+        traza: dict = None,
+        historial: list = None,
+    ):
         """
         Responde a una pregunta con streaming real desde OpenRouter.
 
-        Integra búsqueda vectorial en MCP, FAQs y contexto adicional,
-        limita contexto y envía fragmentos de respuesta en tiempo real.
+        Integra búsqueda vectorial en MCP, consultas a las tablas presupuestarias,
+        FAQs y contexto adicional, limita contexto y envía fragmentos de respuesta en tiempo real.
 
         :param pregunta: Pregunta del usuario.
         :param embedding: Embedding de la pregunta (opcional).
         :param contexto_adicional: Texto adicional para contexto (opcional).
+        :param traza: Diccionario opcional que se completa con los IDs de documentos
+            recuperados (`documentos_ids`) y la duración de cada etapa en ms (`tiempos`).
+        :param historial: Mensajes previos de la sesión (resumen y últimos turnos).
         :yield: Fragmentos de texto codificados en utf-8.
         """
+        if traza is None:
+            traza = {}
+        tiempos = traza.setdefault("tiempos", {})
+        inicio = time.perf_counter()
+
+        def marcar(etapa: str, desde: float):
+            tiempos[etapa] = round((time.perf_counter() - desde) * 1000, 1)
+
+        pregunta_original = pregunta
         pregunta = sanitizar_texto(pregunta)
         if not self.filtro_basico(pregunta):
             yield "Lo siento, no puedo responder esa pregunta.".encode("utf-8")
             return
 
-        docs = []
-        if embedding:
-            docs = await self.vector_tool.search(embedding, top_k=5)
-
-        faqs = await obtener_faqs(limit=5)
+        # Grafo de etapas: la consulta a las tablas presupuestarias, la búsqueda vectorial,
+        # las FAQs y el filtrado del contexto adicional corren en paralelo. Las FAQs y el
+        # contexto adicional son enriquecimientos opcionales: si tardan más que su timeout
+        # se descartan en lugar de retrasar el primer token.
+        async def buscar_documentos():
+            if not embedding:
+                return []
+            # Si la pregunta nombra una categoría o un mes se busca solo en esa parte
+            # del índice; si el filtro deja la búsqueda vacía se repite sin filtros
+            filtros = inferir_filtros(pregunta_original)
+            documentos = await self._etapa(
+                "busqueda_vectorial", self.vector_tool.search(embedding, top_k=5, **filtros),
+                CONTEXTO_TIMEOUT_RECUPERACION, tiempos, [], opcional=False,
+            )
+            if filtros:
+                tiempos["filtros"] = {k: str(v) for k, v in filtros.items()}
+                if not documentos:
+                    tiempos["filtros"]["relajados"] = True
+                    documentos = await self._etapa(
+                        "busqueda_vectorial_sin_filtros", self.vector_tool.search(embedding, top_k=5),
+                        CONTEXTO_TIMEOUT_RECUPERACION, tiempos, [], opcional=False,
+                    )
+            return documentos
+
+        filtrar_contexto = (
+            self._etapa(
+                "contexto_adicional", self.fragmentar_y_filtrar_texto(contexto_adicional, pregunta),
+                CONTEXTO_TIMEOUT_OPCIONAL, tiempos, "",
+            )
+            if contexto_adicional
+            else asyncio.sleep(0, result="")
+        )
+        # Los montos de las tablas complementan a los documentos, no los reemplazan
+        etapas = [
+            asyncio.ensure_future(self._etapa(
+                "consulta_tablas", self.tablas_tool.consultar(pregunta_original),
+                CONTEXTO_TIMEOUT_RECUPERACION, tiempos, "", opcional=False,
+            )),
+            asyncio.ensure_future(buscar_documentos()),
+            asyncio.ensure_future(
+                self._etapa("faqs", obtener_faqs(limit=5), CONTEXTO_TIMEOUT_OPCIONAL, tiempos, [])
+            ),
+            asyncio.ensure_future(filtrar_contexto),
+        ]
+        try:
+            datos_tablas, docs, faqs, contexto_adicional_filtrado = await asyncio.gather(*etapas)
+        except ErrorRecuperacion as e:
+            # Sin documentos ni datos el modelo respondería sin fundamento
+            for etapa in etapas:
+                etapa.cancel()
+            await asyncio.gather(*etapas, return_exceptions=True)
+            print(f"[Agente] Recuperación de contexto fallida: {e}")
+            tiempos["error_recuperacion"] = str(e)
+            self.etapas_fallidas += 1
+            yield "Lo siento, no pude consultar los documentos municipales en este momento. Intenta de nuevo en unos minutos.".encode("utf-8")
+            return
+        traza["documentos_ids"] = [doc['id'] for doc in docs]
 
+        t_ensamblado = time.perf_counter()
         contexto_docs = "\n".join([doc['contenido'] for doc in docs])
         contexto_faqs = "\n".join([f"Q: {f['pregunta']} A: {f['respuesta']}" for f in faqs])
+        ms_ensamblado = (time.perf_counter() - t_ensamblado) * 1000
+
+        # Solo el contexto dinámico se ajusta al presupuesto; el prefijo estático nunca se resume
+        t_ensamblado = time.perf_counter()
+        contexto_dinamico = self.ensamblador.contexto_dinamico([
+            ("Datos presupuestarios (reportes de ejecución)", datos_tablas),
+            ("Documentos relevantes", contexto_docs),
+            ("FAQs relevantes", contexto_faqs),
+            ("Contexto adicional", contexto_adicional_filtrado),
+        ])
+        tokens_dinamicos = self.contar_tokens(contexto_dinamico)
+        ms_ensamblado += (time.perf_counter() - t_ensamblado) * 1000
+
+        presupuesto = self.ensamblador.presupuesto_dinamico
+        if tokens_dinamicos > presupuesto:
+            t = time.perf_counter()
+            contexto_dinamico = await self.resumir_texto_largo(contexto_dinamico, max_tokens=presupuesto)
+            tokens_dinamicos = self.contar_tokens(contexto_dinamico)
+            marcar("resumen_ms", t)
+
+        t_ensamblado = time.perf_counter()
+        messages = self.ensamblador.mensajes(contexto_dinamico, pregunta, historial)
+        tokens_historial = sum(self.contar_tokens(m["content"]) for m in historial or [])
+        ms_ensamblado += (time.perf_counter() - t_ensamblado) * 1000
+        self.ensamblador.registrar_ensamblado(ms_ensamblado)
+        tiempos["ensamblado_prompt_ms"] = round(ms_ensamblado, 3)
+        traza["tokens_prompt"] = {
+            "estaticos": self.ensamblador.tokens_prefijo,
+            "dinamicos": tokens_dinamicos,
+            "historial": tokens_historial,
+        }
 
-        contexto_adicional_filtrado = ""
-        if contexto_adicional:
-            contexto_adicional_filtrado = await self.fragmentar_y_filtrar_texto(contexto_adicional, pregunta)
+        generados = 0
+        t = time.perf_counter()
+        fragmentos = self.enrutador.generar(lambda modelo: self._stream_openrouter(modelo, messages))
+        try:
+            async for content in fragmentos:
+                if generados == 0:
+                    marcar("primer_token_ms", t)
+                generados += 1
+                yield content.encode("utf-8")
+            marcar("total_ms", inicio)
+            self._registrar_respuesta_completa(generados)
+        except (asyncio.CancelledError, GeneratorExit):
+            # El ciudadano se desconectó: cerrar el stream hacia OpenRouter
+            self._registrar_cancelacion(generados)
+            raise
+        except ErrorModelo as e:
+            yield f"Error del servidor: {e}".encode("utf-8")
+        except Exception as e:
+            yield f"Error en la comunicación con el agente: {e}".encode("utf-8")
+        finally:
+            await fragmentos.aclose()
 
-        contexto_completo = (
-            f"{self.prompt_inicial}\n\n"
-            f"Documentos relevantes:\n{contexto_docs}\n\n"
-            f"FAQs relevantes:\n{contexto_faqs}\n\n"
-            f"Contexto adicional:\n{contexto_adicional_filtrado}"
-        )
+    async def _etapa(self, nombre: str, corrutina, timeout: float, tiempos: dict, por_defecto, opcional: bool = True):
+        """
+        Ejecuta una etapa del ensamblado de contexto con su propio timeout.
+
+        :param nombre: Nombre de la etapa; su duración se guarda en `tiempos[f"{nombre}_ms"]`.
+        :param corrutina: Corrutina que produce el resultado de la etapa.
+        :param timeout: Segundos máximos de espera.
+        :param tiempos: Diccionario de tiempos de la traza; las etapas omitidas se anotan en `omitidas`.
+        :param por_defecto: Valor que se devuelve si la etapa se omite.
+        :param opcional: Si es True la etapa se omite cuando supera el timeout o falla;
+            si es False (recuperación de tablas y documentos) se lanza ErrorRecuperacion.
+        :return: Resultado de la etapa o `por_defecto`.
+        :raise ErrorRecuperacion: Si una etapa no opcional supera el timeout o falla.
+        """
+        t = time.perf_counter()
+        try:
+            resultado = await asyncio.wait_for(corrutina, timeout)
+        except asyncio.TimeoutError as e:
+            if not opcional:
+                raise ErrorRecuperacion(f"{nombre} superó {timeout}s") from e
+            print(f"[Agente] Etapa {nombre} omitida: superó {timeout}s")
+        except Exception as e:
+            if not opcional:
+                raise ErrorRecuperacion(f"{nombre}: {e}") from e
+            print(f"[Agente] Etapa {nombre} omitida por error: {e}")
+        else:
+            tiempos[f"{nombre}_ms"] = round((time.perf_counter() - t) * 1000, 1)
+            return resultado
+        tiempos.setdefault("omitidas", []).append(nombre)
+        self.etapas_omitidas[nombre] = self.etapas_omitidas.get(nombre, 0) + 1
+        return por_defecto
+
+    def _registrar_respuesta_completa(self, tokens: int):
+        """
+        Actualiza la longitud media de las respuestas completas (en fragmentos del stream).
+        """
+        self.tokens_respuesta_media = 0.9 * self.tokens_respuesta_media + 0.1 * tokens
 
-        if self.contar_tokens(contexto_completo) > 1000:
-            contexto_completo = await self.resumir_texto_largo(contexto_completo, max_tokens=700)
+    def _registrar_cancelacion(self, tokens_generados: int):
+        """
+        Registra una respuesta cancelada y estima los tokens que no se generaron.
+        """
+        ahorrados = max(0, int(self.tokens_respuesta_media) - tokens_generados)
+        self.cancelaciones += 1
+        self.tokens_ahorrados += ahorrados
+        print(f"[Agente] Generación cancelada tras {tokens_generados} tokens (~{ahorrados} tokens ahorrados)")
 
-        system_prompt = (
-            "Eres un asistente municipal que responde solo preguntas relacionadas con "
-            "servicios, trámites y normativas municipales. No respondas preguntas sobre noticias, "
-            "temas políticos, ni información fuera del contexto municipal."
-        )
+    def estado_cancelaciones(self) -> dict:
+        """
+        Métricas de respuestas canceladas por desconexión del ciudadano.
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "system", "content": contexto_completo},
-            {"role": "user", "content": pregunta},
-        ]
+        :return: Diccionario con cancelaciones y tokens ahorrados estimados.
+        """
+        return {
+            "cancelaciones": self.cancelaciones,
+            "tokens_ahorrados_estimados": self.tokens_ahorrados,
+            "tokens_respuesta_media": round(self.tokens_respuesta_media, 1),
+        }
 
+    async def _stream_openrouter(self, modelo: str, messages: list):
+        """
+        Abre un stream de chat completions en OpenRouter para un modelo.
+
+        :param modelo: Id del modelo en OpenRouter.
+        :param messages: Mensajes de la conversación.
+        :yield: Fragmentos de texto de la respuesta.
+        :raises ErrorModelo: Si OpenRouter responde con un estado distinto de 200.
+        """
         url = "https://openrouter.ai/api/v1/chat/completions"
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
         payload = {
-            "model": self.model_id,
+            "model": modelo,
             "messages": messages,
             "stream": True
         }
 
-        try:
-            async with httpx.AsyncClient(timeout=None) as client:
-                async with client.stream("POST", url, headers=headers, json=payload) as response:
-                    if response.status_code != 200:
-                        # Leer el contenido del stream y enviarlo como un solo fragmento
-                        full_text = await response.aread()
-                        text = full_text.decode('utf-8')
-                        yield f"Error del servidor: {text}".encode("utf-8")
-                        return
-
-                    buffer = ""
-                    async for chunk in response.aiter_text():
-                        buffer += chunk
-                        while True:
-                            line_end = buffer.find('\n')
-                            if line_end == -1:
-                                break
-                            line = buffer[:line_end].strip()
-                            buffer = buffer[line_end + 1:]
-                            if line.startswith("data: "):
-                                data = line[6:]
-                                if data == "[DONE]":
-                                    return
-                                try:
-                                    data_obj = jsonlib.loads(data)
-                                    content = data_obj["choices"][0]["delta"].get("content")
-                                    if content:
-                                        yield content.encode("utf-8")
-                                except jsonlib.JSONDecodeError:
-                                    # Ignorar líneas mal formadas
-                                    pass
-        except Exception as e:
-            yield f"Error en la comunicación con el agente: {e}".encode("utf-8")
+        async with httpx.AsyncClient(timeout=None) as client:
+            async with client.stream("POST", url, headers=headers, json=payload) as response:
+                if response.status_code != 200:
+                    full_text = await response.aread()
+                    raise ErrorModelo(f"{modelo} ({response.status_code}): {full_text.decode('utf-8', errors='replace')}")
+
+                decodificador = DecodificadorSSE()
+                async for chunk in response.aiter_bytes():
+                    for data in decodificador.alimentar(chunk):
+                        if data == FIN_STREAM:
+                            return
+                        content = extraer_contenido(data)
+                        if content:
+                            yield content
 
     async def buscar_en_internet(self, pregunta: str) -> str:
         """
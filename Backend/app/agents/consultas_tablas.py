@@ -0,0 +1,226 @@
+"""
+Consultas sobre las tablas presupuestarias extraídas de los reportes SICOIN.
+
+Las preguntas numéricas ("¿cuánto se gastó en energía eléctrica?", "¿cuánto se
+recaudó por boleto de ornato?") se resuelven con una consulta SQL sobre
+ejecucion_egresos y ejecucion_ingresos (cargadas por extraccion_tablas.py) y el
+resultado se entrega al LLM como unas pocas líneas de contexto, junto a los
+documentos recuperados por la búsqueda vectorial.
+"""
+
+import re
+import unicodedata
+from typing import List, Optional
+
+import asyncpg
+
+from app.utils.metadatos import inferir_mes
+
+# Palabras completas que indican una pregunta sobre montos presupuestarios. "Cuánto"
+# sola no basta: "¿cuánto cuesta la licencia?" es una pregunta de trámites.
+PALABRAS_NUMERICAS = {
+    "monto", "montos", "gasto", "gastos", "gasta", "gastan", "gastado", "gastaron", "gastara",
+    "presupuesto", "presupuestos", "presupuestado", "presupuestaria", "presupuestario",
+    "asignado", "asignacion", "ejecutado", "ejecucion", "ejecuto", "pagado", "pagaron",
+    "devengado", "ingresos", "recaudo", "recaudado", "recaudaron", "recaudacion", "percibido",
+    "saldo", "vigente",
+}
+
+# Palabras que no ayudan a identificar el renglón o la cuenta
+PALABRAS_VACIAS = {
+    "que", "cual", "cuales", "cuanto", "cuanta", "cuantos", "cuantas", "como", "donde",
+    "del", "las", "los", "por", "para", "con", "una", "uno", "unos", "unas", "sus",
+    "este", "esta", "ese", "esa", "hay", "han", "ha", "fue", "fueron", "sido", "son",
+    "muni", "municipalidad", "municipal", "momostenango", "mes", "año", "ano", "total",
+    "enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+    "septiembre", "octubre", "noviembre", "diciembre", "dinero", "quetzales", "monto",
+    "gasto", "gastos", "gasta", "gastan", "gastado", "gastaron", "presupuesto",
+    "asignado", "ejecutado", "ejecuto", "pagado", "pago", "pagaron", "devengado",
+    "ingreso", "ingresos", "recaudo", "recaudado", "recaudaron", "percibido", "cobro",
+    "cobrado", "saldo", "vigente", "queda", "tiene", "tuvo",
+}
+
+# Los reportes son instantáneas de un periodo: los montos de un renglón se suman entre
+# sus partidas de un mismo reporte, nunca entre reportes de periodos distintos
+SQL_PERIODOS = "SELECT DISTINCT periodo_inicio, periodo_fin FROM {tabla};"
+
+SQL_EGRESOS = """
+    SELECT renglon, descripcion, COUNT(*) AS partidas,
+           SUM(vigente) AS vigente, SUM(devengado) AS devengado, SUM(pagado) AS pagado,
+           SUM(saldo_disponible) AS saldo_disponible,
+           periodo_inicio, periodo_fin,
+           MAX(ts_rank(to_tsvector('spanish', texto_busqueda), consulta)) AS rango
+    FROM ejecucion_egresos, to_tsquery('spanish', $1) AS consulta
+    WHERE to_tsvector('spanish', texto_busqueda) @@ consulta
+      AND periodo_inicio IS NOT DISTINCT FROM $3 AND periodo_fin IS NOT DISTINCT FROM $4
+    GROUP BY renglon, descripcion, periodo_inicio, periodo_fin
+    ORDER BY rango DESC, devengado DESC
+    LIMIT $2;
+"""
+
+SQL_INGRESOS = """
+    SELECT cuenta, concepto, vigente, percibido, saldo_por_ejecutar,
+           periodo_inicio, periodo_fin,
+           ts_rank(to_tsvector('spanish', texto_busqueda), consulta) AS rango
+    FROM ejecucion_ingresos, to_tsquery('spanish', $1) AS consulta
+    WHERE to_tsvector('spanish', texto_busqueda) @@ consulta
+      AND periodo_inicio IS NOT DISTINCT FROM $3 AND periodo_fin IS NOT DISTINCT FROM $4
+    ORDER BY rango DESC, es_detalle, cuenta
+    LIMIT $2;
+"""
+
+
+def normalizar(texto: str) -> str:
+    """
+    Minúsculas y sin tildes, igual que la columna texto_busqueda.
+
+    :param texto: Texto original.
+    :return: Texto normalizado.
+    """
+    sin_tildes = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in sin_tildes if not unicodedata.combining(c)).lower()
+
+
+def es_pregunta_numerica(pregunta: str) -> bool:
+    """
+    Indica si la pregunta pide montos presupuestarios.
+
+    :param pregunta: Pregunta del usuario.
+    """
+    return any(p in PALABRAS_NUMERICAS for p in re.findall(r"[a-zñ]+", normalizar(pregunta)))
+
+
+def terminos_busqueda(pregunta: str) -> List[str]:
+    """
+    Palabras de la pregunta que identifican el renglón de gasto o la cuenta de ingreso.
+
+    :param pregunta: Pregunta del usuario.
+    :return: Lista de términos normalizados.
+    """
+    palabras = re.findall(r"[a-zñ]+", normalizar(pregunta))
+    return [p for p in palabras if len(p) > 2 and p not in PALABRAS_VACIAS]
+
+
+def elegir_periodo(periodos: list, mes: Optional[int], anio: Optional[int]) -> Optional[tuple]:
+    """
+    Elige el reporte a consultar entre los periodos cargados.
+
+    Un reporte es del mes en que empieza su periodo: el de mayo de SICOIN va "del
+    01/05/2025 al 06/06/2025", así que su fin cae en junio.
+
+    :param periodos: Tuplas (inicio, fin) de los reportes cargados.
+    :param mes: Mes que nombra la pregunta, o None.
+    :param anio: Año que nombra la pregunta, o None.
+    :return: El periodo más reciente de ese mes (o de todos si no hay mes), (None, None)
+        si sin mes solo hay reportes sin fechas, o None si no hay reporte del mes.
+    """
+    candidatos = [
+        (inicio, fin) for inicio, fin in periodos
+        if inicio is not None
+        and (mes is None or inicio.month == mes)
+        and (anio is None or inicio.year == anio)
+    ]
+    if candidatos:
+        return max(candidatos, key=lambda p: (p[0], p[1] or p[0]))
+    if mes is None and periodos:
+        return None, None
+    return None
+
+
+def formatear_monto(valor) -> str:
+    return f"Q{valor:,.2f}"
+
+
+def formatear_periodo(inicio, fin) -> str:
+    if inicio is None or fin is None:
+        return ""
+    return f" (periodo del {inicio:%d/%m/%Y} al {fin:%d/%m/%Y})"
+
+
+class ConsultaTablasTool:
+    """
+    Herramienta de consulta SQL sobre los reportes de ejecución presupuestaria.
+    """
+
+    def __init__(self, pool, max_filas: int = 5):
+        """
+        :param pool: Pool de conexiones async a PostgreSQL.
+        :param max_filas: Filas máximas por tabla en la respuesta.
+        """
+        self.pool = pool
+        self.max_filas = max_filas
+        self.disponible = True
+
+    async def _consultar_periodo(self, conn, tabla: str, sql: str, consulta: str, mes: Optional[int], anio: Optional[int]):
+        """
+        Filas de un solo reporte: el del mes (y año) que nombra la pregunta o, si no
+        nombra ninguno, el más reciente.
+
+        :return: Tupla (periodo (inicio, fin) del reporte, filas encontradas); None y sin
+            filas si no hay reporte de ese mes.
+        """
+        periodos = await conn.fetch(SQL_PERIODOS.format(tabla=tabla))
+        periodo = elegir_periodo([(p["periodo_inicio"], p["periodo_fin"]) for p in periodos], mes, anio)
+        if periodo is None:
+            return None, []
+        return periodo, await conn.fetch(sql, consulta, self.max_filas, *periodo)
+
+    async def consultar(self, pregunta: str) -> str:
+        """
+        Busca los renglones de gasto y cuentas de ingreso que mencionan la pregunta.
+
+        Si la pregunta nombra un mes se usa el reporte de ese mes; si no, el más
+        reciente. Los montos nunca se suman entre reportes de periodos distintos.
+
+        :param pregunta: Pregunta del usuario (sin sanear, para conservar las tildes).
+        :return: Contexto breve con los montos encontrados, un aviso si no hay reporte
+            del mes pedido, o cadena vacía si la pregunta no es numérica, no hay
+            coincidencias o las tablas no existen.
+        """
+        if not self.disponible or not es_pregunta_numerica(pregunta):
+            return ""
+        terminos = terminos_busqueda(pregunta)
+        if not terminos:
+            return ""
+        consulta = " | ".join(terminos)
+        mes, anio = inferir_mes(pregunta)
+
+        try:
+            async with self.pool.acquire() as conn:
+                periodo_egresos, egresos = await self._consultar_periodo(
+                    conn, "ejecucion_egresos", SQL_EGRESOS, consulta, mes, anio
+                )
+                periodo_ingresos, ingresos = await self._consultar_periodo(
+                    conn, "ejecucion_ingresos", SQL_INGRESOS, consulta, mes, anio
+                )
+        except asyncpg.exceptions.UndefinedTableError:
+            print("[ConsultaTablasTool] Tablas presupuestarias no cargadas; ejecutar extraccion_tablas.py")
+            self.disponible = False
+            return ""
+
+        if mes and periodo_egresos is None and periodo_ingresos is None:
+            periodo = f"{mes:02d}/{anio}" if anio else f"el mes {mes:02d}"
+            return f"No hay reportes de ejecución presupuestaria cargados para {periodo}."
+        print(f"[ConsultaTablasTool] {len(egresos)} renglones de egresos y {len(ingresos)} cuentas de ingresos")
+        lineas = []
+        if egresos:
+            lineas.append(
+                "Ejecución de egresos" + formatear_periodo(egresos[0]["periodo_inicio"], egresos[0]["periodo_fin"]) + ":"
+            )
+            for fila in egresos:
+                lineas.append(
+                    f"- Renglón {fila['renglon']} {fila['descripcion']}: vigente {formatear_monto(fila['vigente'])}, "
+                    f"devengado {formatear_monto(fila['devengado'])}, pagado {formatear_monto(fila['pagado'])}, "
+                    f"saldo disponible {formatear_monto(fila['saldo_disponible'])} ({fila['partidas']} partidas)"
+                )
+        if ingresos:
+            lineas.append(
+                "Ejecución de ingresos" + formatear_periodo(ingresos[0]["periodo_inicio"], ingresos[0]["periodo_fin"]) + ":"
+            )
+            for fila in ingresos:
+                lineas.append(
+                    f"- Cuenta {fila['cuenta']} {fila['concepto']}: vigente {formatear_monto(fila['vigente'])}, "
+                    f"percibido {formatear_monto(fila['percibido'])}, "
+                    f"saldo por ejecutar {formatear_monto(fila['saldo_por_ejecutar'])}"
+                )
+        return "\n".join(lineas)
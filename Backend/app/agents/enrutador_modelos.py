@@ -0,0 +1,224 @@
+"""
+Enrutador de modelos LLM con cobertura (hedging) y cortacircuitos.
+
+Recorre una lista ordenada de modelos de OpenRouter. Si el modelo en curso no
+entrega su primer token dentro del umbral configurado, lanza en paralelo el siguiente
+modelo y se queda con el que responda primero, cancelando al perdedor. Los modelos que
+fallan de forma consecutiva se retiran de la rotación durante un tiempo de enfriamiento.
+"""
+
+import time
+import asyncio
+from typing import AsyncIterator, Callable, List
+
+from app.config import (
+    HEDGE_UMBRAL_PRIMER_TOKEN,
+    CIRCUITO_MAX_FALLOS,
+    CIRCUITO_ENFRIAMIENTO,
+)
+
+# Fragmentos que cada modelo puede adelantar antes de esperar al consumidor
+TAM_COLA_FRAGMENTOS = 64
+
+_FIN = object()
+
+
+class ErrorModelo(Exception):
+    """
+    Error de un modelo antes o durante la generación de la respuesta.
+    """
+
+
+class CircuitoModelo:
+    """
+    Cortacircuitos de un modelo: se abre tras varios fallos seguidos.
+    """
+
+    def __init__(self, modelo: str, max_fallos: int, enfriamiento: float):
+        self.modelo = modelo
+        self.max_fallos = max_fallos
+        self.enfriamiento = enfriamiento
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self.ttft_medio = None
+
+    def disponible(self, ahora: float) -> bool:
+        return ahora >= self.abierto_hasta
+
+    def registrar_fallo(self):
+        self.fallos += 1
+        if self.fallos >= self.max_fallos:
+            self.abierto_hasta = time.monotonic() + self.enfriamiento
+            print(f"[Enrutador] {self.modelo} fuera de rotación por {self.enfriamiento:.0f}s tras {self.fallos} fallos")
+
+    def registrar_exito(self, ttft: float = None):
+        # Sin ttft (respuestas sin streaming) no se actualiza el TTFT medio
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        if ttft is not None:
+            self.ttft_medio = ttft if self.ttft_medio is None else 0.8 * self.ttft_medio + 0.2 * ttft
+
+
+class _Candidato:
+    def __init__(self, modelo: str, tarea: asyncio.Task, cola: asyncio.Queue):
+        self.modelo = modelo
+        self.tarea = tarea
+        self.cola = cola
+
+
+class EnrutadorModelos:
+    """
+    Selecciona el modelo que responde y coordina la cobertura entre modelos.
+    """
+
+    def __init__(
+        self,
+        modelos: List[str],
+        umbral_primer_token: float = HEDGE_UMBRAL_PRIMER_TOKEN,
+        max_fallos: int = CIRCUITO_MAX_FALLOS,
+        enfriamiento: float = CIRCUITO_ENFRIAMIENTO,
+    ):
+        """
+        :param modelos: Modelos de OpenRouter en orden de preferencia.
+        :param umbral_primer_token: Segundos sin primer token antes de cubrir con el siguiente modelo.
+        :param max_fallos: Fallos consecutivos que abren el circuito de un modelo.
+        :param enfriamiento: Segundos que un modelo queda fuera de rotación.
+        """
+        if not modelos:
+            raise ValueError("Se requiere al menos un modelo")
+        self.modelos = list(modelos)
+        self.umbral_primer_token = umbral_primer_token
+        self.circuitos = {m: CircuitoModelo(m, max_fallos, enfriamiento) for m in self.modelos}
+        self.coberturas = 0
+        self.victorias = {m: 0 for m in self.modelos}
+
+    def candidatos(self) -> List[str]:
+        """
+        Modelos disponibles en orden de preferencia.
+
+        Si todos tienen el circuito abierto se devuelven ordenados por el que reabre
+        primero, para intentar de todos modos en lugar de fallar sin consultar.
+        """
+        ahora = time.monotonic()
+        disponibles = [m for m in self.modelos if self.circuitos[m].disponible(ahora)]
+        if disponibles:
+            return disponibles
+        return sorted(self.modelos, key=lambda m: self.circuitos[m].abierto_hasta)
+
+    async def _bombear(self, modelo: str, abrir_stream: Callable, cola: asyncio.Queue):
+        """
+        Consume el stream de un modelo dentro de su propia tarea y lo deja en la cola.
+        """
+        try:
+            async for fragmento in abrir_stream(modelo):
+                await cola.put(fragmento)
+            await cola.put(_FIN)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await cola.put(e if isinstance(e, ErrorModelo) else ErrorModelo(f"{modelo}: {e}"))
+
+    async def generar(self, abrir_stream: Callable[[str], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Genera la respuesta del primer modelo que entregue un token.
+
+        :param abrir_stream: Función que recibe el id del modelo y devuelve un iterador
+            asíncrono de fragmentos de texto; debe lanzar una excepción si el modelo falla.
+        :yield: Fragmentos de texto del modelo ganador.
+        :raises ErrorModelo: Si ningún modelo logra responder.
+        """
+        inicio = time.monotonic()
+        candidatos = self.candidatos()
+        esperas = {}
+        siguiente = 0
+        ultimo_error = None
+        ganador = None
+        primero = None
+
+        def lanzar():
+            nonlocal siguiente
+            modelo = candidatos[siguiente]
+            siguiente += 1
+            cola = asyncio.Queue(maxsize=TAM_COLA_FRAGMENTOS)
+            tarea = asyncio.ensure_future(self._bombear(modelo, abrir_stream, cola))
+            candidato = _Candidato(modelo, tarea, cola)
+            esperas[asyncio.ensure_future(cola.get())] = candidato
+
+        try:
+            lanzar()
+            while esperas and ganador is None:
+                cubrir = siguiente < len(candidatos) and len(esperas) < 2
+                hechos, _ = await asyncio.wait(
+                    esperas.keys(),
+                    timeout=self.umbral_primer_token if cubrir else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                if not hechos:
+                    self.coberturas += 1
+                    print(f"[Enrutador] Sin primer token tras {self.umbral_primer_token}s, cubriendo con {candidatos[siguiente]}")
+                    lanzar()
+                    continue
+
+                for espera in hechos:
+                    candidato = esperas.pop(espera)
+                    item = espera.result()
+                    if item is _FIN or isinstance(item, Exception):
+                        ultimo_error = item if item is not _FIN else ErrorModelo(f"{candidato.modelo}: respuesta vacía")
+                        print(f"[Enrutador] Falló {candidato.modelo}: {ultimo_error}")
+                        self.circuitos[candidato.modelo].registrar_fallo()
+                        candidato.tarea.cancel()
+                        if not esperas and siguiente < len(candidatos):
+                            lanzar()
+                    elif ganador is None:
+                        ganador, primero = candidato, item
+                    else:
+                        candidato.tarea.cancel()
+        finally:
+            # Cancelar a los perdedores: cierra sus streams HTTP
+            for espera, candidato in esperas.items():
+                espera.cancel()
+                candidato.tarea.cancel()
+
+        if ganador is None:
+            raise ultimo_error or ErrorModelo("Ningún modelo disponible")
+
+        ttft = time.monotonic() - inicio
+        self.victorias[ganador.modelo] += 1
+        print(f"[Enrutador] Responde {ganador.modelo} (primer token en {ttft:.2f}s)")
+
+        try:
+            yield primero
+            while True:
+                item = await ganador.cola.get()
+                if item is _FIN:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        except Exception:
+            self.circuitos[ganador.modelo].registrar_fallo()
+            raise
+        else:
+            self.circuitos[ganador.modelo].registrar_exito(ttft)
+        finally:
+            ganador.tarea.cancel()
+
+    def estado(self) -> dict:
+        """
+        Métricas por modelo: circuito, fallos, TTFT medio y respuestas ganadas.
+        """
+        ahora = time.monotonic()
+        return {
+            "coberturas": self.coberturas,
+            "modelos": [
+                {
+                    "modelo": m,
+                    "disponible": c.disponible(ahora),
+                    "fallos_consecutivos": c.fallos,
+                    "ttft_medio_s": round(c.ttft_medio, 2) if c.ttft_medio is not None else None,
+                    "respuestas": self.victorias[m],
+                }
+                for m, c in self.circuitos.items()
+            ],
+        }
@@ -0,0 +1,215 @@
+"""
+Índice vectorial en memoria (NumPy mapeado a memoria) para la búsqueda de documentos.
+
+Alternativa a VectorSearchTool con el mismo contrato `search(query_embedding, top_k, categoria, periodo)`:
+los embeddings normalizados se guardan en una matriz .npy que cada worker abre con
+mmap, de modo que el sistema operativo comparte las páginas entre procesos, y el
+top-k se obtiene con un producto matriz-vector y `argpartition`, sin ir a PostgreSQL.
+
+PostgreSQL sigue siendo la fuente de verdad: la ingesta publica una instantánea
+nueva (carpeta con la matriz y los metadatos) y cambia el puntero ACTUAL con un
+reemplazo atómico; los workers detectan el cambio y recargan en la siguiente búsqueda.
+
+Publicar una instantánea manualmente (desde la carpeta Backend):
+    python -m app.agents.indice_vectorial
+"""
+
+import os
+import json
+import time
+import shutil
+import asyncio
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from app.config import DIMENSION_EMBEDDING, VECTOR_SNAPSHOT_DIR
+
+PUNTERO = "ACTUAL"
+INSTANTANEAS_CONSERVADAS = 2
+
+
+def _normalizar_filas(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return matriz / normas
+
+
+async def publicar_instantanea(conn, directorio: str = VECTOR_SNAPSHOT_DIR) -> Path:
+    """
+    Exporta la tabla documentos a una instantánea nueva y la publica como la actual.
+
+    :param conn: Conexión asyncpg con el tipo vector registrado.
+    :param directorio: Carpeta raíz de las instantáneas.
+    :return: Ruta de la instantánea publicada.
+    """
+    rows = await conn.fetch(
+        "SELECT id, nombre_archivo, tipo, contenido, categoria, periodo, embedding FROM documentos ORDER BY id;"
+    )
+    raiz = Path(directorio)
+    destino = raiz / f"instantanea-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    destino.mkdir(parents=True)
+
+    if rows:
+        matriz = _normalizar_filas(np.asarray([r["embedding"] for r in rows], dtype=np.float32))
+    else:
+        matriz = np.zeros((0, DIMENSION_EMBEDDING), dtype=np.float32)
+    np.save(destino / "embeddings.npy", matriz)
+    metadatos = [
+        {
+            "id": r["id"], "nombre_archivo": r["nombre_archivo"], "tipo": r["tipo"], "contenido": r["contenido"],
+            "categoria": r["categoria"], "periodo": r["periodo"].isoformat() if r["periodo"] else None,
+        }
+        for r in rows
+    ]
+    with open(destino / "metadatos.json", "w", encoding="utf-8") as f:
+        json.dump(metadatos, f, ensure_ascii=False)
+
+    # Cambio atómico del puntero: los lectores ven la instantánea anterior o la nueva completa
+    temporal = raiz / f"{PUNTERO}.tmp"
+    temporal.write_text(destino.name, encoding="utf-8")
+    os.replace(temporal, raiz / PUNTERO)
+
+    # Las instantáneas antiguas se borran; los procesos que aún las tengan mapeadas conservan sus páginas
+    anteriores = sorted(p for p in raiz.glob("instantanea-*") if p.is_dir() and p != destino)
+    for vieja in anteriores[:-(INSTANTANEAS_CONSERVADAS - 1) or None]:
+        shutil.rmtree(vieja, ignore_errors=True)
+
+    print(f"[IndiceVectorial] Instantánea {destino.name} publicada con {len(rows)} documentos")
+    return destino
+
+
+class IndiceVectorialMapeado:
+    """
+    Búsqueda exacta por similitud coseno sobre una matriz de embeddings mapeada a memoria.
+    """
+
+    def __init__(self, directorio: str = VECTOR_SNAPSHOT_DIR, respaldo=None):
+        """
+        :param directorio: Carpeta raíz de las instantáneas.
+        :param respaldo: Herramienta con el mismo contrato (por ejemplo VectorSearchTool)
+            que se usa mientras no haya una instantánea publicada.
+        """
+        self.directorio = Path(directorio)
+        self.respaldo = respaldo
+        self._version = None
+        self._matriz = None
+        self._metadatos = []
+        self._categorias = None
+        self._periodos = None
+        self.recargas = 0
+
+    def _revisar_version(self):
+        """
+        Recarga la matriz si el puntero apunta a una instantánea distinta de la cargada.
+        """
+        try:
+            version = (self.directorio / PUNTERO).read_text(encoding="utf-8").strip()
+        except OSError:
+            return
+        if version == self._version:
+            return
+        carpeta = self.directorio / version
+        try:
+            matriz = np.load(carpeta / "embeddings.npy", mmap_mode="r")
+            with open(carpeta / "metadatos.json", "r", encoding="utf-8") as f:
+                metadatos = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[IndiceVectorial] No se pudo cargar {version}: {e}")
+            return
+        self._matriz, self._metadatos, self._version = matriz, metadatos, version
+        # Columnas de filtrado; las instantáneas anteriores a los metadatos no las tienen
+        self._categorias = np.array([m.get("categoria") for m in metadatos], dtype=object)
+        self._periodos = np.array([m.get("periodo") for m in metadatos], dtype=object)
+        self.recargas += 1
+        print(f"[IndiceVectorial] Cargada {version} ({len(metadatos)} documentos)")
+
+    def buscar(self, query_embedding, top_k: int = 5, categoria: str = None, periodo: date = None) -> list:
+        """
+        Top-k por similitud coseno con un producto matriz-vector y argpartition.
+
+        Los filtros se aplican como máscara sobre las similitudes antes de elegir el top-k.
+
+        :param query_embedding: Embedding de la consulta.
+        :param top_k: Número máximo de resultados.
+        :param categoria: Solo documentos de esta categoría.
+        :param periodo: Solo documentos de este periodo (primer día del mes).
+        :return: Lista de documentos con `similitud` y `distancia` (L2 entre vectores normalizados).
+        """
+        consulta = np.asarray(query_embedding, dtype=np.float32)
+        norma = np.linalg.norm(consulta)
+        if norma:
+            consulta = consulta / norma
+        similitudes = self._matriz @ consulta
+        if categoria is not None or periodo is not None:
+            mascara = np.ones(len(similitudes), dtype=bool)
+            if categoria is not None:
+                mascara &= self._categorias == categoria
+            if periodo is not None:
+                mascara &= self._periodos == periodo.isoformat()
+            similitudes = np.where(mascara, similitudes, -np.inf)
+            top_k = min(top_k, int(mascara.sum()))
+        k = min(top_k, len(similitudes))
+        if k == 0:
+            return []
+        mejores = np.argpartition(-similitudes, k - 1)[:k]
+        mejores = mejores[np.argsort(-similitudes[mejores])]
+        resultados = []
+        for i in mejores:
+            similitud = float(similitudes[i])
+            resultados.append({
+                **self._metadatos[i],
+                "similitud": similitud,
+                "distancia": float(np.sqrt(max(0.0, 2.0 - 2.0 * similitud))),
+            })
+        return resultados
+
+    async def search(self, query_embedding: list, top_k: int = 5, categoria: str = None, periodo: date = None):
+        """
+        Misma interfaz que VectorSearchTool.search.
+
+        :param query_embedding: Embedding de la consulta (lista de floats).
+        :param top_k: Número máximo de resultados a devolver.
+        :param categoria: Solo documentos de esta categoría.
+        :param periodo: Solo documentos de este periodo (primer día del mes).
+        :return: Lista de diccionarios con documentos (id, nombre_archivo, tipo, contenido, distancia).
+        """
+        self._revisar_version()
+        if self._matriz is None:
+            if self.respaldo is None:
+                return []
+            return await self.respaldo.search(query_embedding, top_k, categoria=categoria, periodo=periodo)
+        rows = self.buscar(query_embedding, top_k, categoria=categoria, periodo=periodo)
+        print(f"[IndiceVectorial] recuperé {len(rows)} docs:", [r['nombre_archivo'] for r in rows])
+        return rows
+
+    def estado(self) -> dict:
+        """
+        Instantánea cargada y número de documentos.
+        """
+        return {
+            "instantanea": self._version,
+            "documentos": len(self._metadatos),
+            "recargas": self.recargas,
+        }
+
+
+async def publicar_desde_bd():
+    """
+    Publica una instantánea con su propia conexión, para los scripts que no usan asyncpg.
+    """
+    import asyncpg
+    from pgvector.asyncpg import register_vector
+    from app.config import DATABASE_URL
+
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await register_vector(conn)
+        await publicar_instantanea(conn)
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(publicar_desde_bd())
@@ -0,0 +1,185 @@
+"""
+Memoria de conversación por sesión.
+
+Guarda los últimos turnos de cada sesión (por token_sesion) de forma literal y
+condensa los turnos más antiguos en un resumen compacto que se actualiza en segundo
+plano al terminar cada respuesta. Así el tamaño del prompt se mantiene acotado sin
+importar cuánto dure la conversación.
+"""
+
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, List
+
+from app.config import (
+    MEMORIA_TURNOS_LITERALES,
+    MEMORIA_MAX_TOKENS_TURNO,
+    MEMORIA_MAX_TOKENS_RESUMEN,
+    MEMORIA_MAX_SESIONES,
+    MEMORIA_TTL,
+)
+
+
+def recortar_palabras(texto: str, max_palabras: int, desde_el_final: bool = False) -> str:
+    """
+    Recorta un texto a un número máximo de palabras.
+
+    :param texto: Texto original.
+    :param max_palabras: Palabras máximas a conservar.
+    :param desde_el_final: Si es True conserva las últimas palabras en lugar de las primeras.
+    :return: Texto recortado.
+    """
+    palabras = texto.split()
+    if len(palabras) <= max_palabras:
+        return texto
+    if desde_el_final:
+        return "... " + " ".join(palabras[-max_palabras:])
+    return " ".join(palabras[:max_palabras]) + " ..."
+
+
+class EstadoSesion:
+    """
+    Turnos literales, turnos pendientes de resumir y resumen acumulado de una sesión.
+    """
+
+    def __init__(self):
+        self.turnos = deque()
+        self.pendientes = []
+        self.resumen = ""
+        self.ultimo_uso = time.monotonic()
+        self.tarea = None
+
+
+class MemoriaConversacion:
+    """
+    Memoria acotada de conversaciones, indexada por token de sesión.
+    """
+
+    def __init__(
+        self,
+        turnos_literales: int = MEMORIA_TURNOS_LITERALES,
+        max_tokens_turno: int = MEMORIA_MAX_TOKENS_TURNO,
+        max_tokens_resumen: int = MEMORIA_MAX_TOKENS_RESUMEN,
+        max_sesiones: int = MEMORIA_MAX_SESIONES,
+        ttl: float = MEMORIA_TTL,
+    ):
+        """
+        :param turnos_literales: Turnos recientes que se envían tal cual.
+        :param max_tokens_turno: Tokens máximos por pregunta o respuesta guardada.
+        :param max_tokens_resumen: Tokens máximos del resumen de turnos antiguos.
+        :param max_sesiones: Sesiones en memoria antes de descartar las menos recientes.
+        :param ttl: Segundos de inactividad tras los cuales se olvida una sesión.
+        """
+        self.turnos_literales = turnos_literales
+        self.max_tokens_turno = max_tokens_turno
+        self.max_tokens_resumen = max_tokens_resumen
+        self.max_sesiones = max_sesiones
+        self.ttl = ttl
+        self._sesiones = OrderedDict()
+
+    def _obtener(self, token_sesion: str, crear: bool = False):
+        ahora = time.monotonic()
+        estado = self._sesiones.get(token_sesion)
+        if estado is not None and ahora - estado.ultimo_uso > self.ttl:
+            self.olvidar(token_sesion)
+            estado = None
+        if estado is None and crear:
+            estado = EstadoSesion()
+            self._sesiones[token_sesion] = estado
+            while len(self._sesiones) > self.max_sesiones:
+                self.olvidar(next(iter(self._sesiones)))
+        if estado is not None:
+            estado.ultimo_uso = ahora
+            self._sesiones.move_to_end(token_sesion)
+        return estado
+
+    def historial(self, token_sesion: str) -> List[dict]:
+        """
+        Mensajes previos de la sesión para incluir en el prompt.
+
+        :param token_sesion: Token de la sesión.
+        :return: Resumen (si existe) seguido de los últimos turnos como mensajes de chat.
+        """
+        estado = self._obtener(token_sesion)
+        if estado is None:
+            return []
+        mensajes = []
+        if estado.resumen:
+            mensajes.append({
+                "role": "system",
+                "content": f"Resumen de la conversación previa con el ciudadano:\n{estado.resumen}",
+            })
+        for pregunta, respuesta in estado.turnos:
+            mensajes.append({"role": "user", "content": pregunta})
+            mensajes.append({"role": "assistant", "content": respuesta})
+        return mensajes
+
+    def agregar_turno(
+        self,
+        token_sesion: str,
+        pregunta: str,
+        respuesta: str,
+        resumir: Callable[[str, List[tuple], int], Awaitable[str]],
+    ):
+        """
+        Guarda un turno y, si hay turnos que salen de la ventana literal, programa
+        su incorporación al resumen en segundo plano.
+
+        :param token_sesion: Token de la sesión.
+        :param pregunta: Pregunta del ciudadano.
+        :param respuesta: Respuesta completa del agente.
+        :param resumir: Función asíncrona (resumen_previo, turnos, max_tokens) -> nuevo resumen.
+        """
+        estado = self._obtener(token_sesion, crear=True)
+        estado.turnos.append((
+            recortar_palabras(pregunta, self.max_tokens_turno),
+            recortar_palabras(respuesta, self.max_tokens_turno),
+        ))
+        while len(estado.turnos) > self.turnos_literales:
+            estado.pendientes.append(estado.turnos.popleft())
+
+        if estado.pendientes and (estado.tarea is None or estado.tarea.done()):
+            estado.tarea = asyncio.create_task(self._actualizar_resumen(estado, resumir))
+
+    async def _actualizar_resumen(self, estado: EstadoSesion, resumir: Callable):
+        """
+        Incorpora los turnos pendientes al resumen; se repite si llegan más mientras tanto.
+        """
+        while estado.pendientes:
+            turnos, estado.pendientes = estado.pendientes, []
+            try:
+                resumen = await resumir(estado.resumen, turnos, self.max_tokens_resumen)
+            except Exception as e:
+                print(f"[Memoria] Error resumiendo la conversación: {e}")
+                resumen = None
+            if not resumen:
+                # Sin resumen del modelo: conservar lo más reciente de forma literal
+                texto = " ".join(f"Ciudadano: {p} Agente: {r}" for p, r in turnos)
+                resumen = f"{estado.resumen} {texto}".strip()
+            estado.resumen = recortar_palabras(resumen, self.max_tokens_resumen, desde_el_final=True)
+
+    def olvidar(self, token_sesion: str):
+        """
+        Elimina la memoria de una sesión.
+
+        :param token_sesion: Token de la sesión.
+        """
+        estado = self._sesiones.pop(token_sesion, None)
+        if estado is not None and estado.tarea is not None and not estado.tarea.done():
+            estado.tarea.cancel()
+
+    def estado(self) -> dict:
+        """
+        Métricas de la memoria de conversaciones.
+        """
+        return {
+            "sesiones": len(self._sesiones),
+            "resumenes_en_curso": sum(
+                1 for e in self._sesiones.values() if e.tarea is not None and not e.tarea.done()
+            ),
+        }
+
+
+# Instancia global para usar en la app
+memoria_conversacion = MemoriaConversacion()
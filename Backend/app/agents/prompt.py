@@ -0,0 +1,85 @@
+"""
+Ensamblado del prompt del agente municipal.
+
+Separa un prefijo estático (instrucciones del sistema), construido una sola vez al
+crear el agente y byte a byte idéntico entre solicitudes para que el proveedor pueda
+cachearlo, del contexto dinámico de cada consulta (documentos, FAQs, contexto adicional
+e historial de la conversación).
+El prefijo nunca se resume; solo el contexto dinámico se ajusta al presupuesto de tokens.
+"""
+
+from typing import Callable, List
+
+
+class EnsambladorPrompt:
+    """
+    Construye los mensajes enviados al LLM a partir del prefijo estático y el contexto dinámico.
+    """
+
+    def __init__(self, instrucciones: str, contar_tokens: Callable[[str], int], max_tokens: int):
+        """
+        :param instrucciones: Texto estático del sistema (rol, alcance, datos de contacto).
+        :param contar_tokens: Función para estimar tokens de un texto.
+        :param max_tokens: Presupuesto total de tokens del prompt de sistema.
+        """
+        self.contar_tokens = contar_tokens
+        self.prefijo = instrucciones
+        self.tokens_prefijo = contar_tokens(instrucciones)
+        self.max_tokens = max_tokens
+        # El mismo objeto se reutiliza en cada solicitud
+        self._mensaje_prefijo = {"role": "system", "content": self.prefijo}
+        self.ensamblados = 0
+        self._ms_total = 0.0
+
+    @property
+    def presupuesto_dinamico(self) -> int:
+        """
+        Tokens disponibles para el contexto dinámico una vez descontado el prefijo.
+        """
+        return max(0, self.max_tokens - self.tokens_prefijo)
+
+    def contexto_dinamico(self, secciones: List[tuple]) -> str:
+        """
+        Une las secciones de contexto de la consulta.
+
+        :param secciones: Lista de tuplas (titulo, texto); se omiten las vacías.
+        :return: Texto del contexto dinámico.
+        """
+        return "\n\n".join(f"{titulo}:\n{texto}" for titulo, texto in secciones if texto)
+
+    def mensajes(self, contexto_dinamico: str, pregunta: str, historial: List[dict] = None) -> List[dict]:
+        """
+        Arma la lista de mensajes con el prefijo estático siempre en primera posición.
+
+        :param contexto_dinamico: Contexto de la consulta (ya ajustado al presupuesto).
+        :param pregunta: Pregunta del usuario.
+        :param historial: Mensajes previos de la conversación (opcional).
+        :return: Lista de mensajes para chat completions.
+        """
+        mensajes = [self._mensaje_prefijo]
+        if contexto_dinamico:
+            mensajes.append({"role": "system", "content": contexto_dinamico})
+        if historial:
+            mensajes.extend(historial)
+        mensajes.append({"role": "user", "content": pregunta})
+        return mensajes
+
+    def registrar_ensamblado(self, ms: float):
+        """
+        Acumula el costo de ensamblar un prompt (sin contar resúmenes hechos con el LLM).
+
+        :param ms: Milisegundos empleados en el ensamblado.
+        """
+        self.ensamblados += 1
+        self._ms_total += ms
+
+    def estado(self) -> dict:
+        """
+        Tokens del prefijo estático y costo medio de ensamblado.
+        """
+        return {
+            "tokens_prefijo_estatico": self.tokens_prefijo,
+            "presupuesto_dinamico": self.presupuesto_dinamico,
+            "ensamblados": self.ensamblados,
+            "ensamblado_medio_ms": round(self._ms_total / self.ensamblados, 3) if self.ensamblados else 0.0,
+        }
@@ -0,0 +1,118 @@
+"""
+Respuestas precalculadas para las preguntas frecuentes.
+
+El proceso precalcular_respuestas.py agrupa las preguntas históricas de
+consultas_respuestas, genera con el agente una respuesta canónica para los grupos
+más frecuentes y la guarda pendiente de revisión. Las respuestas aprobadas se
+cargan en memoria y el chat las consulta antes de pedir turno al LLM: si la pregunta
+es casi igual a una pregunta canónica se responde de inmediato.
+
+Cada respuesta guarda los documentos con que se generó; en cada recarga las que
+dependen de documentos reindexados, archivados o de un periodo ya superado vuelven
+a quedar pendientes de revisión, para no servir cifras de un mes anterior.
+"""
+
+import time
+import asyncio
+from typing import Optional
+
+import numpy as np
+
+from app.config import RESPUESTAS_PRECALCULADAS_UMBRAL, RESPUESTAS_PRECALCULADAS_TTL
+from app.db.crud import (
+    asegurar_tabla_respuestas_precalculadas,
+    obtener_respuestas_precalculadas,
+    invalidar_respuestas_precalculadas,
+)
+
+
+class RespuestasPrecalculadas:
+    """
+    Búsqueda por similitud coseno sobre las respuestas aprobadas cargadas en memoria.
+    """
+
+    def __init__(self, umbral: float = RESPUESTAS_PRECALCULADAS_UMBRAL, ttl: float = RESPUESTAS_PRECALCULADAS_TTL):
+        """
+        :param umbral: Similitud mínima con la pregunta canónica para usar la respuesta.
+        :param ttl: Segundos entre recargas de las respuestas aprobadas.
+        """
+        self.umbral = umbral
+        self.ttl = ttl
+        self._matriz = None
+        self._respuestas = []
+        self._cargado = 0.0
+        self._candado = asyncio.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    async def iniciar(self):
+        """
+        Prepara la tabla y carga las respuestas aprobadas.
+        """
+        await asegurar_tabla_respuestas_precalculadas()
+        await self.recargar()
+
+    async def recargar(self):
+        """
+        Devuelve a revisión las respuestas desactualizadas y vuelve a leer de la base de
+        datos las aprobadas.
+        """
+        invalidadas = await invalidar_respuestas_precalculadas()
+        if invalidadas:
+            print(f"[Precalculadas] {len(invalidadas)} respuestas con datos desactualizados vuelven a revisión: {invalidadas}")
+        filas = await obtener_respuestas_precalculadas(revisadas=True)
+        if filas:
+            matriz = np.asarray([f["embedding"] for f in filas], dtype=np.float32)
+            matriz /= np.maximum(np.linalg.norm(matriz, axis=1, keepdims=True), 1e-12)
+        else:
+            matriz = None
+        self._matriz = matriz
+        self._respuestas = [{k: f[k] for k in ("id", "pregunta", "respuesta", "documentos_ids")} for f in filas]
+        self._cargado = time.monotonic()
+        print(f"[Precalculadas] {len(filas)} respuestas aprobadas cargadas")
+
+    async def buscar(self, embedding) -> Optional[dict]:
+        """
+        Busca una respuesta aprobada para la pregunta.
+
+        :param embedding: Embedding de la pregunta.
+        :return: Diccionario con id, pregunta, respuesta, documentos_ids y similitud, o None si ninguna supera el umbral.
+        """
+        if time.monotonic() - self._cargado > self.ttl and not self._candado.locked():
+            async with self._candado:
+                try:
+                    await self.recargar()
+                except Exception as e:
+                    # Se siguen usando las respuestas ya cargadas
+                    self._cargado = time.monotonic()
+                    print(f"[Precalculadas] No se pudieron recargar: {e}")
+
+        if self._matriz is None:
+            self.fallos += 1
+            return None
+        consulta = np.asarray(embedding, dtype=np.float32)
+        consulta /= max(float(np.linalg.norm(consulta)), 1e-12)
+        similitudes = self._matriz @ consulta
+        mejor = int(np.argmax(similitudes))
+        if similitudes[mejor] < self.umbral:
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return {**self._respuestas[mejor], "similitud": float(similitudes[mejor])}
+
+    def estado(self) -> dict:
+        """
+        Respuestas cargadas y tasa de aciertos desde el inicio.
+        """
+        consultas = self.aciertos + self.fallos
+        return {
+            "respuestas": len(self._respuestas),
+            "umbral": self.umbral,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else 0.0,
+        }
+
+
+# Instancia global para usar en la app
+respuestas_precalculadas = RespuestasPrecalculadas()
@@ -1,21 +1,36 @@
 import os
 import re
-import io
+import math
+import time
 import uuid
 import asyncio
-import PyPDF2
 
-from blacksheep import Response, Request, StreamedContent
+from blacksheep import Response, Request, StreamedContent, WebSocket, WebSocketDisconnectError, WebSocketError
 from blacksheep.server.responses import json, text
 from app.db.crud import (
     crear_sesion,
-    guardar_consulta_respuesta,
     obtener_ciudadano_por_email,
     crear_ciudadano,
     obtener_sesion_por_token,
 )
+from app.db.connection import db
+from app.db.registro_consultas import registrador_consultas
 from app.utils.helpers import generar_embedding, sanitizar_texto
+from app.utils.servicio_embeddings import cliente_embeddings
+from app.utils.streaming import coalescer_salida, cancelar_si_desconecta
+from app.utils.admision import controlador_admision, SolicitudRechazada
+from app.utils.extraccion_pdf import extraer_paginas
 from app.agents.agno_agent import AgnoMunicipalAgent
+from app.agents.consultas_tablas import es_pregunta_numerica
+from app.agents.memoria import memoria_conversacion
+from app.agents.respuestas_precalculadas import respuestas_precalculadas
+from app.config import (
+    WS_TIMEOUT_AUTENTICACION,
+    WS_INTERVALO_LATIDO,
+    WS_INACTIVIDAD_MAX,
+    WS_ESPERA_ENVIO_MAX,
+    WS_MAX_PENDIENTES,
+)
 
 import logging
 logger = logging.getLogger("upload")
@@ -33,13 +48,12 @@ async def init_agent():
     Inicializa la instancia global del agente AgnoMunicipalAgent.
     """
     global agent_instance
-    from app.db.connection import db
 
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
     if not OPENROUTER_API_KEY:
         raise RuntimeError("La variable de entorno OPENROUTER_API_KEY no está configurada")
 
-    agent_instance = AgnoMunicipalAgent(db.pool, OPENROUTER_API_KEY)
+    agent_instance = AgnoMunicipalAgent(db, OPENROUTER_API_KEY)
 
 
 async def parse_confianza(respuesta: str) -> float:
@@ -58,12 +72,65 @@ async def parse_confianza(respuesta: str) -> float:
     return 0.8
 
 
+async def registrar_turno(sesion_id: int, token_sesion: str, pregunta: str, texto_respuesta: str, traza: dict):
+    """
+    Registra una respuesta completada y la agrega a la memoria de la sesión.
+
+    :param sesion_id: ID de la sesión.
+    :param token_sesion: Token de la sesión (clave de la memoria de conversación).
+    :param pregunta: Pregunta sanitizada.
+    :param texto_respuesta: Respuesta enviada al ciudadano.
+    :param traza: Traza de responder_stream (documentos_ids y tiempos).
+    """
+    # Guardar la transcripción sin bloquear: se escribe por lotes en segundo plano
+    registrador_consultas.registrar(
+        sesion_id,
+        pregunta,
+        texto_respuesta,
+        await parse_confianza(texto_respuesta),
+        traza.get("documentos_ids"),
+        traza["tiempos"],
+    )
+    # El resumen de turnos antiguos se actualiza en segundo plano
+    if "total_ms" in traza["tiempos"]:
+        memoria_conversacion.agregar_turno(
+            token_sesion, pregunta, texto_respuesta, agent_instance.resumir_conversacion
+        )
+
+
+async def buscar_respuesta_precalculada(token_sesion: str, pregunta: str, embedding, traza: dict):
+    """
+    Busca una respuesta precalculada aprobada para la pregunta.
+
+    No se usa si hay un PDF subido pendiente, porque la pregunta probablemente trata sobre él,
+    ni para preguntas sobre montos, que dependen del último reporte presupuestario cargado,
+    ni si la sesión ya tiene turnos: una pregunta corta de seguimiento depende de ellos.
+
+    :param token_sesion: Token de la sesión (clave de la memoria de conversación).
+    :param pregunta: Texto de la pregunta.
+    :param embedding: Embedding de la pregunta.
+    :param traza: Traza de la consulta; se completa con el ID de la respuesta usada.
+    :return: Texto de la respuesta o None si no hay una aplicable.
+    """
+    if pdf_text_temp or es_pregunta_numerica(pregunta) or memoria_conversacion.historial(token_sesion):
+        return None
+    t = time.perf_counter()
+    precalculada = await respuestas_precalculadas.buscar(embedding)
+    if precalculada is None:
+        return None
+    traza["documentos_ids"] = precalculada["documentos_ids"] or []
+    traza["respuesta_precalculada"] = precalculada["id"]
+    traza["tiempos"]["total_ms"] = round((time.perf_counter() - t) * 1000, 1)
+    print(f"[Chat] Respuesta precalculada {precalculada['id']} (similitud {precalculada['similitud']:.3f})")
+    return precalculada["respuesta"]
+
+
 async def chat(request: Request) -> Response:
     """
     Endpoint POST /chat para interactuar con el agente municipal.
 
     Recibe JSON con pregunta, ciudadano_id y token_sesion.
-    Valida sesión, filtra preguntas, genera embedding, y responde con streaming real.
+    Valida sesión y genera el embedding en paralelo, filtra preguntas y responde con streaming real.
     Maneja derivación a humano si la confianza es baja.
 
     :param request: Objeto Request con JSON.
@@ -88,12 +155,20 @@ async def chat(request: Request) -> Response:
     if not pregunta or not ciudadano_id or not token_sesion:
         return Response(text="Faltan parámetros obligatorios.", status=400)
 
-    sesion = await obtener_sesion_por_token(token_sesion)
+    pregunta = sanitizar_texto(pregunta)
+    traza = {"tiempos": {}}
+
+    async def embeber():
+        t = time.perf_counter()
+        resultado = await generar_embedding(pregunta)
+        traza["tiempos"]["embedding_ms"] = round((time.perf_counter() - t) * 1000, 1)
+        return resultado
+
+    # La validación de la sesión y el embedding son independientes: se ejecutan a la vez
+    sesion, embedding = await asyncio.gather(obtener_sesion_por_token(token_sesion), embeber())
     if not sesion or sesion['ciudadano_id'] != ciudadano_id:
         return Response(text="Sesión inválida o expirada.", status=401)
 
-    pregunta = sanitizar_texto(pregunta)
-
     key = (ciudadano_id, token_sesion)
     if key in conversaciones_derivadas:
         mensaje = "Uno de nuestros colaboradores se pondrá en contacto en breve, por favor espere."
@@ -106,7 +181,27 @@ async def chat(request: Request) -> Response:
             content=StreamedContent(b"text/plain", stream_msg)
         )
 
-    embedding = await generar_embedding(pregunta)
+    # Pregunta frecuente con respuesta aprobada: no hace falta turno para el LLM
+    respuesta_precalculada = await buscar_respuesta_precalculada(token_sesion, pregunta, embedding, traza)
+    if respuesta_precalculada is not None:
+        async def stream_precalculada():
+            yield respuesta_precalculada.encode("utf-8")
+            await registrar_turno(sesion['id'], token_sesion, pregunta, respuesta_precalculada, traza)
+
+        return Response(
+            200,
+            content=StreamedContent(b"text/plain", stream_precalculada)
+        )
+
+    # Turno para llamar al LLM; se libera al terminar el streaming, o si este nunca
+    # empieza (cliente desconectado antes de que el servidor itere la respuesta)
+    try:
+        permiso = await controlador_admision.admitir(ciudadano_id)
+    except SolicitudRechazada as e:
+        response = text(e.mensaje, status=e.status)
+        response.add_header(b"Retry-After", str(max(1, math.ceil(e.reintentar_en))).encode())
+        return response
+    permiso.vigilar_inicio()
 
     # Agregar el texto del PDF al contexto
     contexto_adicional = pdf_text_temp
@@ -115,9 +210,25 @@ async def chat(request: Request) -> Response:
 
     try:
         async def stream_response():
-            async for fragmento in agent_instance.responder_stream(pregunta, embedding, contexto_adicional):
-                print(f"[Agente] Respuesta parcial: {fragmento.decode('utf-8')}")
-                yield fragmento
+            permiso.iniciar()
+            respuesta = bytearray()
+            try:
+                fragmentos = agent_instance.responder_stream(
+                    pregunta, embedding, contexto_adicional, traza, memoria_conversacion.historial(token_sesion)
+                )
+                salida = coalescer_salida(cancelar_si_desconecta(fragmentos, request.is_disconnected))
+                try:
+                    async for fragmento in salida:
+                        print(f"[Agente] Respuesta parcial: {fragmento.decode('utf-8', errors='replace')}")
+                        respuesta += fragmento
+                        yield fragmento
+                finally:
+                    # Cierra el stream hacia el LLM también si se deja de iterar la respuesta
+                    await salida.aclose()
+            finally:
+                permiso.liberar()
+
+            await registrar_turno(sesion['id'], token_sesion, pregunta, respuesta.decode("utf-8", errors="replace"), traza)
 
         return Response(
             200,
@@ -125,7 +236,10 @@ async def chat(request: Request) -> Response:
         )
     except Exception:
         # Fallback a búsqueda en internet si falla streaming
-        resultado = await agent_instance.buscar_en_internet(pregunta)
+        try:
+            resultado = await agent_instance.buscar_en_internet(pregunta)
+        finally:
+            permiso.liberar()
         confianza = await parse_confianza(resultado)
         if confianza < 0.6:
             conversaciones_derivadas.add(key)
@@ -139,7 +253,7 @@ async def chat(request: Request) -> Response:
                 content=StreamedContent(b"text/plain", stream_msg)
             )
 
-        await guardar_consulta_respuesta(sesion['id'], pregunta, resultado, confianza)
+        registrador_consultas.registrar(sesion['id'], pregunta, resultado, confianza)
 
         async def stream_response():
             for token in resultado.split():
@@ -153,10 +267,215 @@ async def chat(request: Request) -> Response:
 
 
 
+# Métricas de las conexiones WebSocket de /ws/chat
+conexiones_ws = {"activas": 0, "aceptadas": 0, "rechazadas": 0, "cerradas_inactividad": 0, "cerradas_lentas": 0}
+
+
+async def chat_ws(websocket: WebSocket):
+    """
+    Endpoint WebSocket /ws/chat para conversaciones interactivas.
+
+    La sesión se valida una sola vez por conexión y cada respuesta se envía como
+    frames a medida que se genera. Todos los mensajes son JSON de texto con un campo `tipo`:
+
+    - Cliente: `autenticar` (primer mensaje, con `ciudadano_id` y `token_sesion`),
+      `pregunta` (con `pregunta`) y `ping`.
+    - Servidor: `autenticado`, `fragmento` (con `texto`), `fin`, `error` (con `mensaje`
+      y, si aplica, `reintentar_en`), `ping` y `pong`.
+
+    El servidor envía `ping` tras WS_INTERVALO_LATIDO segundos sin tráfico y cierra la
+    conexión si el cliente deja de responder durante tres latidos o si pasa
+    WS_INACTIVIDAD_MAX segundos sin hacer preguntas. Si un
+    frame no se puede entregar en WS_ESPERA_ENVIO_MAX segundos (cliente lento) se
+    cancela la generación y se cierra la conexión.
+
+    :param websocket: Conexión WebSocket entrante.
+    """
+    global pdf_text_temp
+
+    await websocket.accept()
+    if agent_instance is None:
+        await websocket.close(1013, "Servicio no disponible. Intente más tarde.")
+        return
+
+    candado_envio = asyncio.Lock()
+
+    async def enviar(datos: dict):
+        # Los envíos del lector (pong) y de la respuesta en curso no deben intercalarse
+        async with candado_envio:
+            await asyncio.wait_for(websocket.send_json(datos), WS_ESPERA_ENVIO_MAX)
+
+    try:
+        auth = await asyncio.wait_for(websocket.receive_json(), WS_TIMEOUT_AUTENTICACION)
+        ciudadano_id = auth.get("ciudadano_id")
+        token_sesion = auth.get("token_sesion")
+        sesion = await obtener_sesion_por_token(token_sesion) if auth.get("tipo") == "autenticar" else None
+    except WebSocketDisconnectError:
+        return
+    except (asyncio.TimeoutError, ValueError, TypeError, KeyError, AttributeError):
+        sesion = None
+    if not sesion or sesion['ciudadano_id'] != ciudadano_id:
+        conexiones_ws["rechazadas"] += 1
+        await websocket.close(4401, "Sesión inválida o expirada.")
+        return
+
+    conexiones_ws["aceptadas"] += 1
+    conexiones_ws["activas"] += 1
+
+    key = (ciudadano_id, token_sesion)
+    preguntas = asyncio.Queue(maxsize=WS_MAX_PENDIENTES)
+    desconectado = asyncio.Event()
+    ultimo_mensaje = ultima_pregunta = time.monotonic()
+
+    async def leer():
+        nonlocal ultimo_mensaje, ultima_pregunta
+        try:
+            while True:
+                try:
+                    mensaje = await websocket.receive_json()
+                    tipo = mensaje.get("tipo")
+                except (ValueError, TypeError, KeyError, AttributeError):
+                    await enviar({"tipo": "error", "mensaje": "Mensaje inválido."})
+                    continue
+                ultimo_mensaje = time.monotonic()
+                if tipo == "ping":
+                    await enviar({"tipo": "pong"})
+                elif tipo == "pregunta" and mensaje.get("pregunta"):
+                    ultima_pregunta = ultimo_mensaje
+                    try:
+                        preguntas.put_nowait(mensaje["pregunta"])
+                    except asyncio.QueueFull:
+                        await enviar({"tipo": "error", "mensaje": "Demasiadas preguntas pendientes."})
+                elif tipo != "pong":
+                    await enviar({"tipo": "error", "mensaje": "Mensaje inválido."})
+        except (WebSocketError, asyncio.TimeoutError):
+            pass
+        finally:
+            desconectado.set()
+
+    async def esta_desconectado() -> bool:
+        return desconectado.is_set()
+
+    lector = asyncio.ensure_future(leer())
+    try:
+        await enviar({"tipo": "autenticado", "sesion_id": sesion['id']})
+        while not desconectado.is_set():
+            espera_pregunta = asyncio.ensure_future(preguntas.get())
+            hechos, _ = await asyncio.wait(
+                {espera_pregunta, lector}, timeout=WS_INTERVALO_LATIDO, return_when=asyncio.FIRST_COMPLETED
+            )
+            if espera_pregunta not in hechos:
+                espera_pregunta.cancel()
+                if desconectado.is_set():
+                    break
+                ahora = time.monotonic()
+                if ahora - ultima_pregunta > WS_INACTIVIDAD_MAX or ahora - ultimo_mensaje > 3 * WS_INTERVALO_LATIDO:
+                    conexiones_ws["cerradas_inactividad"] += 1
+                    await websocket.close(1000, "Conexión inactiva.")
+                    break
+                await enviar({"tipo": "ping"})
+                continue
+
+            pregunta = sanitizar_texto(espera_pregunta.result())
+            if key in conversaciones_derivadas:
+                await enviar({
+                    "tipo": "fragmento",
+                    "texto": "Uno de nuestros colaboradores se pondrá en contacto en breve, por favor espere.",
+                })
+                await enviar({"tipo": "fin"})
+                continue
+
+            traza = {"tiempos": {}}
+            t = time.perf_counter()
+            embedding = await generar_embedding(pregunta)
+            traza["tiempos"]["embedding_ms"] = round((time.perf_counter() - t) * 1000, 1)
+
+            respuesta_precalculada = await buscar_respuesta_precalculada(token_sesion, pregunta, embedding, traza)
+            if respuesta_precalculada is not None:
+                await enviar({"tipo": "fragmento", "texto": respuesta_precalculada})
+                await enviar({"tipo": "fin"})
+                await registrar_turno(sesion['id'], token_sesion, pregunta, respuesta_precalculada, traza)
+                continue
+
+            try:
+                permiso = await controlador_admision.admitir(ciudadano_id)
+            except SolicitudRechazada as e:
+                await enviar({"tipo": "error", "mensaje": e.mensaje, "reintentar_en": e.reintentar_en})
+                continue
+
+            respuesta = bytearray()
+            try:
+                contexto_adicional = pdf_text_temp
+                pdf_text_temp = ""
+
+                fragmentos = agent_instance.responder_stream(
+                    pregunta, embedding, contexto_adicional, traza, memoria_conversacion.historial(token_sesion)
+                )
+                salida = coalescer_salida(cancelar_si_desconecta(fragmentos, esta_desconectado))
+                try:
+                    async for fragmento in salida:
+                        respuesta += fragmento
+                        await enviar({"tipo": "fragmento", "texto": fragmento.decode("utf-8", errors="replace")})
+                finally:
+                    # Cierra el stream hacia el LLM también si el envío falla
+                    await salida.aclose()
+            finally:
+                permiso.liberar()
+            if desconectado.is_set():
+                break
+            await enviar({"tipo": "fin"})
+            await registrar_turno(sesion['id'], token_sesion, pregunta, respuesta.decode("utf-8", errors="replace"), traza)
+    except asyncio.TimeoutError:
+        # El cliente no consume los frames: se libera la conexión en lugar de acumularlos
+        conexiones_ws["cerradas_lentas"] += 1
+        print("[ChatWS] Cliente lento, se cierra la conexión")
+        await websocket.close(1008, "Cliente lento.")
+    except WebSocketError:
+        # El cliente cerró la conexión mientras se enviaba la respuesta
+        pass
+    finally:
+        lector.cancel()
+        conexiones_ws["activas"] -= 1
+
+
+async def estado(request: Request) -> Response:
+    """
+    Endpoint GET /estado con métricas del control de admisión y de los modelos.
+
+    Permite monitorear la profundidad de la cola, la ocupación de turnos hacia el LLM,
+    el estado de los cortacircuitos de cada modelo, los tokens ahorrados por
+    desconexiones, la ocupación y espera del pool de conexiones a PostgreSQL y las
+    peticiones atendidas por el servicio de embeddings o por el modelo local.
+
+    :param request: Objeto Request.
+    :return: JSON con el estado del controlador de admisión y del enrutador de modelos.
+    """
+    estado_actual = {
+        "admision": controlador_admision.estado(),
+        "registro_consultas": registrador_consultas.estado(),
+        "memoria": memoria_conversacion.estado(),
+        "pool": db.estado(),
+        "websocket": conexiones_ws,
+        "respuestas_precalculadas": respuestas_precalculadas.estado(),
+        "embeddings": cliente_embeddings.estado(),
+    }
+    if agent_instance is not None:
+        estado_actual["modelos"] = agent_instance.enrutador.estado()
+        estado_actual["cancelaciones"] = agent_instance.estado_cancelaciones()
+        estado_actual["etapas_omitidas"] = agent_instance.etapas_omitidas
+        estado_actual["recuperaciones_fallidas"] = agent_instance.etapas_fallidas
+        estado_actual["prompt"] = agent_instance.ensamblador.estado()
+        if hasattr(agent_instance.vector_tool, "estado"):
+            estado_actual["indice_vectorial"] = agent_instance.vector_tool.estado()
+    return json(estado_actual, status=200)
+
+
 async def limpiar_conversacion(request: Request) -> Response:
     """
     Endpoint POST /limpiar para limpiar la conversación y permitir continuar tras derivación a humano.
 
+    También olvida la memoria de conversación de la sesión.
+
     :param request: Objeto Request con JSON.
     :return: JSON con mensaje de confirmación.
     """
@@ -173,6 +492,7 @@ async def limpiar_conversacion(request: Request) -> Response:
 
     key = (ciudadano_id, token_sesion)
     conversaciones_derivadas.discard(key)
+    memoria_conversacion.olvidar(token_sesion)
 
     return json({"mensaje": "Conversación limpiada, puede continuar."}, status=200)
 
@@ -238,7 +558,7 @@ async def upload(request: Request):
     4. Lee content_type desde part.content_type y decodifica si es bytes.
     5. Valida 'application/pdf'; si falla → 400.
     6. Lee contenido_bytes = part.content.
-    7. Extrae texto con PyPDF2 y guarda en pdf_text_temp.
+    7. Extrae texto con el backend configurado (PDF_BACKEND) y guarda en pdf_text_temp.
     8. Devuelve JSON de éxito.
     """
     global agent_instance, pdf_text_temp
@@ -280,14 +600,14 @@ async def upload(request: Request):
         return text("Error al leer el contenido del archivo.", status=400)
     print("DEBUG: bytes leídos:", len(contenido_bytes))
 
-    # 7) Extraer texto con PyPDF2
+    # 7) Extraer texto (backend configurable, PyPDF2 como respaldo) fuera del event loop;
+    # los PDF de los ciudadanos no pasan por la caché en disco
     try:
-        reader = PyPDF2.PdfReader(io.BytesIO(contenido_bytes))
+        paginas = await asyncio.to_thread(extraer_paginas, contenido_bytes, usar_cache=False)
     except Exception as e:
-        print("DEBUG: fallo PyPDF2.PdfReader:", e)
+        print("DEBUG: fallo al leer el PDF:", e)
         return text("Error al leer el PDF.", status=400)
 
-    paginas = [page.extract_text() or "" for page in reader.pages]
     texto_completo = "\n".join(paginas)
     print("DEBUG: caracteres extraídos:", len(texto_completo))
 
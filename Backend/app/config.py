@@ -19,4 +19,118 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
 
 DATABASE_URL = (
     f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-)
\ No newline at end of file
+)
+
+# Streaming de respuestas: tamaño (bytes) y espera máxima (ms) antes de enviar un bloque al cliente
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", "512"))
+STREAM_FLUSH_MS = int(os.getenv("STREAM_FLUSH_MS", "50"))
+
+# Control de admisión para las llamadas al LLM
+ADMISION_MAX_CONCURRENTES = int(os.getenv("ADMISION_MAX_CONCURRENTES", "8"))
+ADMISION_MAX_COLA = int(os.getenv("ADMISION_MAX_COLA", "32"))
+ADMISION_ESPERA_MAX = float(os.getenv("ADMISION_ESPERA_MAX", "10"))
+ADMISION_MAX_POR_CIUDADANO = int(os.getenv("ADMISION_MAX_POR_CIUDADANO", "2"))
+ADMISION_CUBO_CAPACIDAD = float(os.getenv("ADMISION_CUBO_CAPACIDAD", "5"))
+ADMISION_CUBO_RECARGA = float(os.getenv("ADMISION_CUBO_RECARGA", "0.2"))
+# Segundos para que empiece el envío de una respuesta admitida; si no empieza, el turno se libera
+ADMISION_INICIO_MAX = float(os.getenv("ADMISION_INICIO_MAX", "15"))
+
+# Modelos de OpenRouter en orden de preferencia, separados por comas
+OPENROUTER_MODELOS = [
+    m.strip()
+    for m in os.getenv(
+        "OPENROUTER_MODELOS",
+        "deepseek/deepseek-r1-0528-qwen3-8b:free,"
+        "meta-llama/llama-3.3-70b-instruct:free,"
+        "mistralai/mistral-small-3.2-24b-instruct:free",
+    ).split(",")
+    if m.strip()
+]
+
+# Cobertura entre modelos y cortacircuitos
+HEDGE_UMBRAL_PRIMER_TOKEN = float(os.getenv("HEDGE_UMBRAL_PRIMER_TOKEN", "6"))
+CIRCUITO_MAX_FALLOS = int(os.getenv("CIRCUITO_MAX_FALLOS", "3"))
+CIRCUITO_ENFRIAMIENTO = float(os.getenv("CIRCUITO_ENFRIAMIENTO", "60"))
+
+# Intervalo (ms) para revisar si el ciudadano cerró la conexión durante el streaming
+DESCONEXION_INTERVALO_MS = int(os.getenv("DESCONEXION_INTERVALO_MS", "250"))
+
+# Registro diferido (write-behind) de consultas y respuestas
+REGISTRO_MAX_PENDIENTES = int(os.getenv("REGISTRO_MAX_PENDIENTES", "1000"))
+REGISTRO_TAM_LOTE = int(os.getenv("REGISTRO_TAM_LOTE", "50"))
+REGISTRO_INTERVALO = float(os.getenv("REGISTRO_INTERVALO", "2"))
+REGISTRO_MAX_REINTENTOS = int(os.getenv("REGISTRO_MAX_REINTENTOS", "5"))
+
+# Presupuesto de tokens del prompt de sistema (prefijo estático + contexto dinámico)
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "1000"))
+
+# Memoria de conversación por sesión
+MEMORIA_TURNOS_LITERALES = int(os.getenv("MEMORIA_TURNOS_LITERALES", "3"))
+MEMORIA_MAX_TOKENS_TURNO = int(os.getenv("MEMORIA_MAX_TOKENS_TURNO", "150"))
+MEMORIA_MAX_TOKENS_RESUMEN = int(os.getenv("MEMORIA_MAX_TOKENS_RESUMEN", "200"))
+MEMORIA_MAX_SESIONES = int(os.getenv("MEMORIA_MAX_SESIONES", "5000"))
+MEMORIA_TTL = float(os.getenv("MEMORIA_TTL", "3600"))
+
+# Extracción de texto de PDFs: backend ("auto", "pymupdf", "pypdfium2", "pdfplumber" o "pypdf2")
+# y carpeta de la caché de páginas extraídas (vacía para desactivarla), fuera del código fuente
+PDF_BACKEND = os.getenv("PDF_BACKEND", "auto")
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "agente_municipal", "pdf"))
+
+# Almacenamiento compacto de embeddings para la búsqueda ANN: "" (vector float32),
+# "halfvec" (media precisión) o "binario" (cuantización binaria). Los candidatos se
+# reordenan con los vectores completos; el sobremuestreo indica cuántos se traen por resultado.
+DIMENSION_EMBEDDING = 384
+VECTOR_COMPACTO = os.getenv("VECTOR_COMPACTO", "").lower()
+VECTOR_SOBREMUESTREO = int(os.getenv("VECTOR_SOBREMUESTREO", "4"))
+
+# Backend de búsqueda vectorial: "postgres" (pgvector) o "memoria" (matriz NumPy mapeada
+# a memoria, cargada desde la última instantánea publicada en VECTOR_SNAPSHOT_DIR)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "postgres").lower()
+VECTOR_SNAPSHOT_DIR = os.getenv("VECTOR_SNAPSHOT_DIR", ".vector_snapshot")
+
+# Pool de conexiones a PostgreSQL: tamaño, espera máxima (s) para obtener una conexión,
+# timeout (s) por consulta, sentencias preparadas cacheadas por conexión (0 si se usa
+# PgBouncer en modo transacción) y segundos de inactividad antes de cerrar una conexión
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_ESPERA_MAX = float(os.getenv("DB_POOL_ESPERA_MAX", "5"))
+DB_TIMEOUT_CONSULTA = float(os.getenv("DB_TIMEOUT_CONSULTA", "30"))
+DB_CACHE_SENTENCIAS = int(os.getenv("DB_CACHE_SENTENCIAS", "100"))
+DB_INACTIVIDAD_MAX = float(os.getenv("DB_INACTIVIDAD_MAX", "300"))
+
+# Timeouts (s) de las etapas del ensamblado de contexto: la recuperación (tablas y
+# búsqueda vectorial) y los enriquecimientos opcionales (FAQs y contexto adicional),
+# que se descartan si no terminan a tiempo
+CONTEXTO_TIMEOUT_RECUPERACION = float(os.getenv("CONTEXTO_TIMEOUT_RECUPERACION", "5"))
+CONTEXTO_TIMEOUT_OPCIONAL = float(os.getenv("CONTEXTO_TIMEOUT_OPCIONAL", "1.5"))
+
+# Chat por WebSocket: espera máxima (s) del mensaje de autenticación, intervalo del
+# latido, segundos sin preguntas antes de cerrar la conexión, espera máxima para
+# entregar un frame (cliente lento) y preguntas en cola por conexión
+WS_TIMEOUT_AUTENTICACION = float(os.getenv("WS_TIMEOUT_AUTENTICACION", "10"))
+WS_INTERVALO_LATIDO = float(os.getenv("WS_INTERVALO_LATIDO", "20"))
+WS_INACTIVIDAD_MAX = float(os.getenv("WS_INACTIVIDAD_MAX", "300"))
+WS_ESPERA_ENVIO_MAX = float(os.getenv("WS_ESPERA_ENVIO_MAX", "10"))
+WS_MAX_PENDIENTES = int(os.getenv("WS_MAX_PENDIENTES", "4"))
+
+# Respuestas precalculadas para las preguntas frecuentes: similitud coseno mínima entre
+# la pregunta y la pregunta canónica para responder sin llamar al LLM, y segundos entre
+# recargas de las respuestas aprobadas
+RESPUESTAS_PRECALCULADAS_UMBRAL = float(os.getenv("RESPUESTAS_PRECALCULADAS_UMBRAL", "0.92"))
+RESPUESTAS_PRECALCULADAS_TTL = float(os.getenv("RESPUESTAS_PRECALCULADAS_TTL", "300"))
+
+# Detección de duplicados al indexar: similitud de Jaccard estimada (MinHash) a partir
+# de la cual un documento es copia de otro ya indexado o un fragmento se descarta
+DUPLICADOS_UMBRAL_DOCUMENTO = float(os.getenv("DUPLICADOS_UMBRAL_DOCUMENTO", "0.8"))
+DUPLICADOS_UMBRAL_FRAGMENTO = float(os.getenv("DUPLICADOS_UMBRAL_FRAGMENTO", "0.9"))
+
+# Servicio de embeddings compartido por todos los workers: modelo, socket Unix del proceso
+# que lo carga (vacío para codificar siempre en el propio proceso), textos máximos por
+# lote, espera (ms) para completar un lote, timeout (s) por petición y segundos antes de
+# volver a intentar el servicio después de un fallo
+MODELO_EMBEDDING = os.getenv("MODELO_EMBEDDING", "all-MiniLM-L6-v2")
+EMBEDDINGS_SOCKET = os.getenv("EMBEDDINGS_SOCKET", "/tmp/agente_municipal_embeddings.sock")
+EMBEDDINGS_LOTE_MAX = int(os.getenv("EMBEDDINGS_LOTE_MAX", "64"))
+EMBEDDINGS_ESPERA_LOTE_MS = float(os.getenv("EMBEDDINGS_ESPERA_LOTE_MS", "5"))
+EMBEDDINGS_TIMEOUT = float(os.getenv("EMBEDDINGS_TIMEOUT", "10"))
+EMBEDDINGS_REINTENTO = float(os.getenv("EMBEDDINGS_REINTENTO", "30"))
@@ -2,28 +2,64 @@
 Módulo de conexión a la base de datos PostgreSQL usando asyncpg y pgvector.
 
 Establece un pool de conexiones para uso eficiente y registra la extensión pgvector
-para manejar tipos vectoriales en consultas.
+en cada conexión del pool para manejar tipos vectoriales en consultas. El tamaño,
+los tiempos de espera y la caché de sentencias preparadas se configuran en app/config.py.
 """
 
+import time
+from contextlib import asynccontextmanager
+
 import asyncpg
 from pgvector.asyncpg import register_vector
-from app.config import DATABASE_URL
+from app.config import (
+    DATABASE_URL,
+    DB_POOL_MIN,
+    DB_POOL_MAX,
+    DB_POOL_ESPERA_MAX,
+    DB_TIMEOUT_CONSULTA,
+    DB_CACHE_SENTENCIAS,
+    DB_INACTIVIDAD_MAX,
+)
+
+
+async def _inicializar_conexion(conn):
+    """
+    Hook `init` del pool: se ejecuta una vez por cada conexión física nueva.
+    """
+    await register_vector(conn)
+
 
 class Database:
     """
     Clase para manejar el pool de conexiones a PostgreSQL.
+
+    `acquire()` tiene la misma forma que `asyncpg.Pool.acquire`, de modo que la
+    instancia puede pasarse a las herramientas del agente en lugar del pool y así
+    quedan medidas la espera y la ocupación de todas las conexiones.
     """
 
     def __init__(self):
         self.pool = None
+        self.adquisiciones = 0
+        self.agotadas = 0
+        self.en_uso = 0
+        self.max_en_uso = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
 
     async def connect(self):
         """
-        Inicializa el pool de conexiones y registra la extensión vector.
+        Inicializa el pool de conexiones; cada conexión registra la extensión vector al crearse.
         """
-        self.pool = await asyncpg.create_pool(DATABASE_URL)
-        async with self.pool.acquire() as conn:
-            await register_vector(conn)
+        self.pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN,
+            max_size=DB_POOL_MAX,
+            command_timeout=DB_TIMEOUT_CONSULTA,
+            statement_cache_size=DB_CACHE_SENTENCIAS,
+            max_inactive_connection_lifetime=DB_INACTIVIDAD_MAX,
+            init=_inicializar_conexion,
+        )
 
     async def close(self):
         """
@@ -32,26 +68,74 @@ class Database:
         if self.pool:
             await self.pool.close()
 
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Toma una conexión del pool midiendo cuánto se esperó por ella.
+
+        :raise asyncio.TimeoutError: Si no hay conexión libre en DB_POOL_ESPERA_MAX segundos.
+        """
+        inicio = time.perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=DB_POOL_ESPERA_MAX)
+        except Exception:
+            self.agotadas += 1
+            raise
+        espera = time.perf_counter() - inicio
+        self.adquisiciones += 1
+        self._espera_total += espera
+        self._espera_max = max(self._espera_max, espera)
+        self.en_uso += 1
+        self.max_en_uso = max(self.max_en_uso, self.en_uso)
+        try:
+            yield conn
+        finally:
+            self.en_uso -= 1
+            await self.pool.release(conn)
+
     async def fetch(self, query: str, *args):
         """
         Ejecuta una consulta SELECT y devuelve resultados.
         """
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             return await conn.fetch(query, *args)
 
     async def fetchrow(self, query: str, *args):
         """
         Ejecuta una consulta SELECT y devuelve una fila.
         """
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             return await conn.fetchrow(query, *args)
 
     async def execute(self, query: str, *args):
         """
         Ejecuta una consulta que no devuelve resultados (INSERT, UPDATE, DELETE).
         """
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             return await conn.execute(query, *args)
 
+    def estado(self) -> dict:
+        """
+        Métricas del pool: tamaño, ocupación y espera para obtener conexión.
+
+        :return: Diccionario con el tamaño del pool y los contadores de adquisición.
+        """
+        if self.pool is None:
+            return {"conectado": False}
+        return {
+            "conectado": True,
+            "tamano": self.pool.get_size(),
+            "libres": self.pool.get_idle_size(),
+            "min": self.pool.get_min_size(),
+            "max": self.pool.get_max_size(),
+            "en_uso": self.en_uso,
+            "max_en_uso": self.max_en_uso,
+            "utilizacion": round(self.en_uso / self.pool.get_max_size(), 2),
+            "adquisiciones": self.adquisiciones,
+            "agotadas": self.agotadas,
+            "espera_media_ms": round(1000 * self._espera_total / self.adquisiciones, 2) if self.adquisiciones else 0.0,
+            "espera_max_ms": round(1000 * self._espera_max, 2),
+        }
+
 # Instancia global para usar en la app
-db = Database()
\ No newline at end of file
+db = Database()
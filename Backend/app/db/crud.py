@@ -11,6 +11,8 @@ Incluye saneamiento básico y validación de datos.
 
 from typing import List, Optional
 from app.db.connection import db
+from app.config import DIMENSION_EMBEDDING
+from app.utils.metadatos import asegurar_metadatos
 from datetime import datetime
 
 
@@ -94,4 +96,150 @@ async def guardar_consulta_respuesta(sesion_id: int, pregunta: str, respuesta: s
     INSERT INTO consultas_respuestas (sesion_id, pregunta, respuesta, confianza)
     VALUES ($1, $2, $3, $4);
     """
-    await db.execute(query, sesion_id, pregunta, respuesta, confianza)
\ No newline at end of file
+    await db.execute(query, sesion_id, pregunta, respuesta, confianza)
+
+COLUMNAS_CONSULTAS_RESPUESTAS = [
+    "sesion_id", "pregunta", "respuesta", "confianza", "documentos_ids", "tiempos",
+]
+
+
+async def asegurar_columnas_consultas_respuestas():
+    """
+    Agrega a consultas_respuestas las columnas de trazabilidad si aún no existen.
+    """
+    await db.execute(
+        """
+        ALTER TABLE consultas_respuestas
+            ADD COLUMN IF NOT EXISTS documentos_ids INTEGER[],
+            ADD COLUMN IF NOT EXISTS tiempos JSONB;
+        """
+    )
+
+
+async def guardar_consultas_respuestas_lote(registros: List[tuple]):
+    """
+    Guarda varias consultas y respuestas en una sola operación COPY.
+
+    :param registros: Tuplas en el orden de COLUMNAS_CONSULTAS_RESPUESTAS;
+        `tiempos` debe venir serializado como JSON.
+    """
+    async with db.acquire() as conn:
+        await conn.copy_records_to_table(
+            "consultas_respuestas",
+            records=registros,
+            columns=COLUMNAS_CONSULTAS_RESPUESTAS,
+        )
+
+
+# Índices ANN sobre expresiones compactas del embedding; la columna float32 se
+# conserva para reordenar los candidatos con la distancia exacta
+INDICES_COMPACTOS = {
+    "halfvec": (
+        "CREATE INDEX IF NOT EXISTS documentos_embedding_halfvec ON documentos "
+        f"USING hnsw ((embedding::halfvec({DIMENSION_EMBEDDING})) halfvec_l2_ops);"
+    ),
+    "binario": (
+        "CREATE INDEX IF NOT EXISTS documentos_embedding_binario ON documentos "
+        f"USING hnsw ((binary_quantize(embedding)::bit({DIMENSION_EMBEDDING})) bit_hamming_ops);"
+    ),
+}
+
+
+async def asegurar_indice_compacto(modo: str):
+    """
+    Crea el índice ANN del modo de almacenamiento compacto si aún no existe.
+
+    :param modo: "halfvec" o "binario"; cualquier otro valor no hace nada.
+    """
+    sql = INDICES_COMPACTOS.get(modo)
+    if sql:
+        await db.execute(sql)
+
+
+async def asegurar_metadatos_documentos():
+    """
+    Agrega las columnas de categoría y periodo a documentos, completa las filas sin
+    metadatos y crea los índices HNSW parciales por categoría.
+    """
+    async with db.acquire() as conn:
+        await asegurar_metadatos(conn)
+
+
+async def asegurar_tabla_respuestas_precalculadas():
+    """
+    Crea la tabla de respuestas precalculadas para las preguntas frecuentes si aún no
+    existe; `documentos_ids` guarda los documentos con que se generó cada respuesta.
+    """
+    await db.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS respuestas_precalculadas (
+            id SERIAL PRIMARY KEY,
+            pregunta TEXT NOT NULL,
+            respuesta TEXT NOT NULL,
+            embedding vector({DIMENSION_EMBEDDING}) NOT NULL,
+            frecuencia INTEGER NOT NULL DEFAULT 0,
+            revisada BOOLEAN NOT NULL DEFAULT FALSE,
+            fecha_creacion TIMESTAMP NOT NULL DEFAULT NOW(),
+            documentos_ids INTEGER[]
+        );
+        ALTER TABLE respuestas_precalculadas ADD COLUMN IF NOT EXISTS documentos_ids INTEGER[];
+        """
+    )
+
+
+async def obtener_respuestas_precalculadas(revisadas: bool = True) -> List[dict]:
+    """
+    Obtiene las respuestas precalculadas.
+
+    :param revisadas: True para las aprobadas (las que usa el chat), False para las pendientes de revisión.
+    :return: Lista de diccionarios con id, pregunta, respuesta, embedding, frecuencia y documentos_ids.
+    """
+    query = """
+    SELECT id, pregunta, respuesta, embedding, frecuencia, documentos_ids
+        FROM respuestas_precalculadas
+    WHERE revisada = $1
+    ORDER BY frecuencia DESC;
+    """
+    rows = await db.fetch(query, revisadas)
+    return [dict(row) for row in rows]
+
+
+async def aprobar_respuestas_precalculadas(ids: List[int]) -> int:
+    """
+    Marca respuestas precalculadas como revisadas para que el chat las use.
+
+    :param ids: IDs de las respuestas aprobadas.
+    :return: Número de filas actualizadas.
+    """
+    resultado = await db.execute(
+        "UPDATE respuestas_precalculadas SET revisada = TRUE WHERE id = ANY($1::int[]);", ids
+    )
+    return int(resultado.split()[-1])
+
+
+async def invalidar_respuestas_precalculadas(conn=None) -> List[int]:
+    """
+    Devuelve a revisión las respuestas aprobadas cuyos datos cambiaron desde que se
+    generaron: alguno de sus documentos se reindexó, archivó o borró (su id ya no
+    existe), o ya hay un periodo más reciente de la misma categoría. Las respuestas
+    sin documentos registrados (anteriores a la columna documentos_ids) no se pueden
+    comprobar y también vuelven a revisión.
+
+    :param conn: Conexión asyncpg a usar (la ingesta tiene la suya); por defecto el pool de la app.
+    :return: IDs de las respuestas devueltas a revisión.
+    """
+    query = """
+    UPDATE respuestas_precalculadas r
+        SET revisada = FALSE
+    WHERE r.revisada
+      AND (r.documentos_ids IS NULL OR EXISTS (
+        SELECT 1
+            FROM unnest(r.documentos_ids) AS u(id)
+            LEFT JOIN documentos d ON d.id = u.id
+        WHERE d.id IS NULL
+           OR d.periodo < (SELECT MAX(n.periodo) FROM documentos n WHERE n.categoria = d.categoria)
+      ))
+    RETURNING r.id;
+    """
+    rows = await (conn or db).fetch(query)
+    return [row['id'] for row in rows]
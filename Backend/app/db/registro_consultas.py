@@ -0,0 +1,159 @@
+"""
+Registro diferido (write-behind) de consultas y respuestas.
+
+Las respuestas del chat se encolan en memoria sin bloquear la petición y una tarea
+en segundo plano las guarda por lotes en consultas_respuestas, reintentando si la
+base de datos falla y vaciando lo pendiente al detener la aplicación.
+"""
+
+import asyncio
+import json as jsonlib
+from typing import List, Optional
+
+from app.config import (
+    REGISTRO_MAX_PENDIENTES,
+    REGISTRO_TAM_LOTE,
+    REGISTRO_INTERVALO,
+    REGISTRO_MAX_REINTENTOS,
+)
+from app.db.crud import (
+    asegurar_columnas_consultas_respuestas,
+    guardar_consultas_respuestas_lote,
+)
+
+# Marca que se encola al detener para que la tarea termine tras vaciar lo pendiente
+_DETENER = object()
+
+
+class RegistradorConsultas:
+    """
+    Buffer acotado de consultas que se vacía por lotes hacia PostgreSQL.
+    """
+
+    def __init__(
+        self,
+        max_pendientes: int = REGISTRO_MAX_PENDIENTES,
+        tam_lote: int = REGISTRO_TAM_LOTE,
+        intervalo: float = REGISTRO_INTERVALO,
+        max_reintentos: int = REGISTRO_MAX_REINTENTOS,
+    ):
+        """
+        :param max_pendientes: Capacidad del buffer; al llenarse se descartan registros nuevos.
+        :param tam_lote: Registros máximos por escritura.
+        :param intervalo: Segundos máximos que un registro espera antes de escribirse.
+        :param max_reintentos: Intentos por lote antes de descartarlo.
+        """
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.max_reintentos = max_reintentos
+        self._cola = asyncio.Queue(maxsize=max_pendientes)
+        self._tarea = None
+        self.guardados = 0
+        self.descartados = 0
+
+    async def iniciar(self):
+        """
+        Prepara la tabla y arranca la tarea que escribe los lotes.
+        """
+        await asegurar_columnas_consultas_respuestas()
+        self._tarea = asyncio.create_task(self._bucle())
+
+    def registrar(
+        self,
+        sesion_id: int,
+        pregunta: str,
+        respuesta: str,
+        confianza: float,
+        documentos_ids: Optional[List[int]] = None,
+        tiempos: Optional[dict] = None,
+    ):
+        """
+        Encola una consulta para guardarla más tarde; nunca bloquea.
+
+        :param sesion_id: ID de la sesión.
+        :param pregunta: Texto de la pregunta.
+        :param respuesta: Texto completo de la respuesta.
+        :param confianza: Nivel de confianza del agente (0 a 1).
+        :param documentos_ids: IDs de los documentos recuperados.
+        :param tiempos: Duración de cada etapa en milisegundos.
+        """
+        registro = (
+            sesion_id,
+            pregunta,
+            respuesta,
+            confianza,
+            documentos_ids or [],
+            jsonlib.dumps(tiempos or {}),
+        )
+        try:
+            self._cola.put_nowait(registro)
+        except asyncio.QueueFull:
+            self.descartados += 1
+            print("[Registro] Buffer lleno, consulta descartada")
+
+    async def _tomar_lote(self) -> list:
+        """
+        Espera el primer registro y junta hasta tam_lote dentro del intervalo.
+        """
+        lote = [await self._cola.get()]
+        limite = asyncio.get_running_loop().time() + self.intervalo
+        while len(lote) < self.tam_lote and lote[-1] is not _DETENER:
+            restante = limite - asyncio.get_running_loop().time()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self._cola.get(), timeout=restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def _escribir(self, lote: list):
+        """
+        Escribe un lote con reintentos y espera exponencial.
+        """
+        for intento in range(1, self.max_reintentos + 1):
+            try:
+                await guardar_consultas_respuestas_lote(lote)
+                self.guardados += len(lote)
+                return
+            except Exception as e:
+                print(f"[Registro] Error guardando {len(lote)} consultas (intento {intento}): {e}")
+                if intento < self.max_reintentos:
+                    await asyncio.sleep(min(30, 0.5 * 2 ** intento))
+        self.descartados += len(lote)
+        print(f"[Registro] Se descartaron {len(lote)} consultas tras {self.max_reintentos} intentos")
+
+    async def _bucle(self):
+        while True:
+            lote = await self._tomar_lote()
+            detener = lote[-1] is _DETENER
+            if detener:
+                lote.pop()
+            if lote:
+                await self._escribir(lote)
+            if detener:
+                return
+
+    async def detener(self):
+        """
+        Detiene la tarea de fondo y guarda todo lo pendiente.
+        """
+        if self._tarea is None:
+            return
+        await self._cola.put(_DETENER)
+        await self._tarea
+        self._tarea = None
+
+    def estado(self) -> dict:
+        """
+        Métricas del registro: pendientes, guardados y descartados.
+        """
+        return {
+            "pendientes": self._cola.qsize(),
+            "guardados": self.guardados,
+            "descartados": self.descartados,
+        }
+
+
+# Instancia global para usar en la app
+registrador_consultas = RegistradorConsultas()
@@ -7,7 +7,11 @@ Configura middlewares, rutas y eventos de inicio y cierre.
 from blacksheep import Application
 from blacksheep.server.responses import text, Response
 from app.db.connection import db
-from app.api.routes import chat, login, limpiar_conversacion, upload, init_agent
+from app.db.registro_consultas import registrador_consultas
+from app.agents.respuestas_precalculadas import respuestas_precalculadas
+from app.db.crud import asegurar_indice_compacto, asegurar_metadatos_documentos
+from app.config import VECTOR_COMPACTO
+from app.api.routes import chat, chat_ws, login, limpiar_conversacion, upload, init_agent, estado
 import uvicorn
 import traceback
 
@@ -80,6 +84,12 @@ app.router.add_post("/login", login)
 app.router.add_post("/limpiar", limpiar_conversacion)
 app.router.add_post("/upload", upload)
 
+# Registrar rutas GET de monitoreo
+app.router.add_get("/estado", estado)
+
+# Chat interactivo por WebSocket (una autenticación por conexión)
+app.router.add_ws("/ws/chat", chat_ws)
+
 
 @app.on_start
 async def startup(application: Application):
@@ -87,12 +97,18 @@ async def startup(application: Application):
     Evento que se ejecuta al iniciar la aplicación.
 
     Se encarga de establecer la conexión con la base de datos para que la aplicación
-    pueda operar correctamente, y luego inicializa el agente con el pool activo.
+    pueda operar correctamente, completa los metadatos de categoría y periodo de los
+    documentos, crea el índice vectorial compacto si está configurado, arranca el registro diferido de consultas, carga las respuestas precalculadas y luego
+    inicializa el agente con el pool activo.
 
     Args:
         application (Application): Instancia de la aplicación BlackSheep.
     """
     await db.connect()
+    await asegurar_metadatos_documentos()
+    await asegurar_indice_compacto(VECTOR_COMPACTO)
+    await registrador_consultas.iniciar()
+    await respuestas_precalculadas.iniciar()
     await init_agent()
 
 
@@ -101,12 +117,13 @@ async def shutdown(application: Application):
     """
     Evento que se ejecuta al detener la aplicación.
 
-    Se encarga de cerrar la conexión con la base de datos para liberar recursos
-    y evitar posibles fugas de conexión.
+    Guarda las consultas pendientes del registro diferido y luego cierra la conexión
+    con la base de datos para liberar recursos y evitar posibles fugas de conexión.
 
     Args:
         application (Application): Instancia de la aplicación BlackSheep.
     """
+    await registrador_consultas.detener()
     await db.close()
 
 
@@ -0,0 +1,304 @@
+"""
+Control de admisión para las llamadas al LLM.
+
+Limita cuántas respuestas del agente se generan a la vez contra OpenRouter,
+aplica un cubo de tokens y un máximo de solicitudes simultáneas por ciudadano, y
+mantiene una cola de espera acotada que rechaza de inmediato las solicitudes que no
+alcanzarían a ser atendidas dentro del plazo máximo de espera.
+"""
+
+import time
+import asyncio
+from collections import deque
+
+from app.config import (
+    ADMISION_MAX_CONCURRENTES,
+    ADMISION_MAX_COLA,
+    ADMISION_ESPERA_MAX,
+    ADMISION_MAX_POR_CIUDADANO,
+    ADMISION_CUBO_CAPACIDAD,
+    ADMISION_CUBO_RECARGA,
+    ADMISION_INICIO_MAX,
+)
+
+# Máximo de cubos en memoria antes de descartar los que ya están llenos (inactivos)
+MAX_CUBOS = 10000
+
+
+class SolicitudRechazada(Exception):
+    """
+    Se lanza cuando una solicitud no es admitida.
+
+    :param mensaje: Mensaje para el ciudadano.
+    :param status: Código HTTP sugerido (429 por límite del ciudadano, 503 por saturación).
+    :param reintentar_en: Segundos sugeridos antes de reintentar.
+    """
+
+    def __init__(self, mensaje: str, status: int, reintentar_en: float):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+        self.reintentar_en = reintentar_en
+
+
+class CuboTokens:
+    """
+    Cubo de tokens que se recarga de forma continua.
+    """
+
+    def __init__(self, capacidad: float, recarga_por_segundo: float):
+        self.capacidad = capacidad
+        self.recarga = recarga_por_segundo
+        self.tokens = capacidad
+        self.actualizado = time.monotonic()
+
+    def _recargar(self, ahora: float):
+        # `ahora` puede ser anterior a la creación del cubo (se toma al inicio de admitir)
+        transcurrido = max(0.0, ahora - self.actualizado)
+        self.tokens = min(self.capacidad, self.tokens + transcurrido * self.recarga)
+        self.actualizado = max(self.actualizado, ahora)
+
+    def consumir(self, ahora: float) -> bool:
+        """
+        Intenta consumir un token.
+
+        :return: True si había un token disponible.
+        """
+        self._recargar(ahora)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def segundos_para_token(self) -> float:
+        """
+        Tiempo estimado hasta que haya un token disponible.
+        """
+        if self.recarga <= 0:
+            return float("inf")
+        return max(0.0, (1 - self.tokens) / self.recarga)
+
+    def lleno(self, ahora: float) -> bool:
+        self._recargar(ahora)
+        return self.tokens >= self.capacidad
+
+
+class Permiso:
+    """
+    Representa un turno admitido. Debe liberarse al terminar la respuesta.
+    """
+
+    def __init__(self, controlador: "ControladorAdmision", ciudadano_id, espera: float):
+        self._controlador = controlador
+        self.ciudadano_id = ciudadano_id
+        self.espera = espera
+        self.inicio = time.monotonic()
+        self._liberado = False
+        self._vigilancia = None
+
+    def vigilar_inicio(self, plazo: float = ADMISION_INICIO_MAX):
+        """
+        Libera el turno si la respuesta no empieza a enviarse dentro del plazo, por
+        ejemplo cuando el cliente se desconecta antes de que se itere el streaming.
+
+        :param plazo: Segundos de espera hasta que se llame a `iniciar`.
+        """
+        self._vigilancia = asyncio.get_running_loop().call_later(plazo, self._abandonado)
+
+    def iniciar(self):
+        """
+        Marca que la respuesta empezó a enviarse; desde aquí se libera al terminar.
+        """
+        if self._vigilancia is not None:
+            self._vigilancia.cancel()
+            self._vigilancia = None
+
+    def _abandonado(self):
+        self._vigilancia = None
+        if self._liberado:
+            return
+        print(f"[Admision] Turno de {self.ciudadano_id} liberado: la respuesta no empezó a enviarse")
+        self._controlador.abandonadas += 1
+        self.liberar()
+
+    def liberar(self):
+        """
+        Libera el turno; llamadas repetidas no tienen efecto.
+        """
+        self.iniciar()
+        if self._liberado:
+            return
+        self._liberado = True
+        self._controlador._liberar(self)
+
+
+class ControladorAdmision:
+    """
+    Controlador de admisión con límite global, límites por ciudadano y cola acotada.
+    """
+
+    def __init__(
+        self,
+        max_concurrentes: int = ADMISION_MAX_CONCURRENTES,
+        max_cola: int = ADMISION_MAX_COLA,
+        espera_max: float = ADMISION_ESPERA_MAX,
+        max_por_ciudadano: int = ADMISION_MAX_POR_CIUDADANO,
+        capacidad_cubo: float = ADMISION_CUBO_CAPACIDAD,
+        recarga_cubo: float = ADMISION_CUBO_RECARGA,
+    ):
+        self.max_concurrentes = max_concurrentes
+        self.max_cola = max_cola
+        self.espera_max = espera_max
+        self.max_por_ciudadano = max_por_ciudadano
+        self.capacidad_cubo = capacidad_cubo
+        self.recarga_cubo = recarga_cubo
+
+        self.activos = 0
+        self._cola = deque()
+        self._por_ciudadano = {}
+        self._cubos = {}
+
+        # Duración media de una respuesta (media móvil exponencial), usada para estimar la espera
+        self.duracion_media = 5.0
+        self.admitidas = 0
+        self.rechazadas = 0
+        self.abandonadas = 0
+        self._espera_total = 0.0
+
+    @property
+    def profundidad_cola(self) -> int:
+        """
+        Número de solicitudes esperando turno.
+        """
+        return len(self._cola)
+
+    def _cubo(self, ciudadano_id, ahora: float) -> CuboTokens:
+        cubo = self._cubos.get(ciudadano_id)
+        if cubo is None:
+            if len(self._cubos) >= MAX_CUBOS:
+                self._cubos = {k: c for k, c in self._cubos.items() if not c.lleno(ahora)}
+            cubo = CuboTokens(self.capacidad_cubo, self.recarga_cubo)
+            self._cubos[ciudadano_id] = cubo
+        return cubo
+
+    def _rechazar(self, mensaje: str, status: int, reintentar_en: float):
+        self.rechazadas += 1
+        raise SolicitudRechazada(mensaje, status, reintentar_en)
+
+    async def admitir(self, ciudadano_id) -> Permiso:
+        """
+        Solicita un turno para generar una respuesta.
+
+        :param ciudadano_id: Identificador del ciudadano que hace la consulta.
+        :return: Permiso que debe liberarse al terminar.
+        :raises SolicitudRechazada: Si se excede algún límite o el plazo de espera.
+        """
+        ahora = time.monotonic()
+
+        if self._por_ciudadano.get(ciudadano_id, 0) >= self.max_por_ciudadano:
+            self._rechazar("Ya tiene consultas en curso, espere a que terminen.", 429, 1.0)
+
+        cubo = self._cubo(ciudadano_id, ahora)
+        if not cubo.consumir(ahora):
+            self._rechazar(
+                "Ha realizado demasiadas consultas seguidas, intente de nuevo en unos segundos.",
+                429,
+                cubo.segundos_para_token(),
+            )
+
+        if self.activos < self.max_concurrentes and not self._cola:
+            self.activos += 1
+            return self._conceder(ciudadano_id, 0.0)
+
+        if len(self._cola) >= self.max_cola:
+            self._rechazar("El servicio está saturado, intente más tarde.", 503, self.duracion_media)
+
+        espera_estimada = (len(self._cola) + 1) * self.duracion_media / self.max_concurrentes
+        if espera_estimada > self.espera_max:
+            self._rechazar("El servicio está saturado, intente más tarde.", 503, espera_estimada)
+
+        turno = asyncio.get_running_loop().create_future()
+        self._cola.append(turno)
+        self._por_ciudadano[ciudadano_id] = self._por_ciudadano.get(ciudadano_id, 0) + 1
+        try:
+            await asyncio.wait({turno}, timeout=self.espera_max)
+        except BaseException:
+            self._abandonar_turno(turno, ciudadano_id)
+            raise
+
+        if not turno.done():
+            self._abandonar_turno(turno, ciudadano_id)
+            self._rechazar("El servicio está saturado, intente más tarde.", 503, self.duracion_media)
+
+        self._descontar(ciudadano_id)
+        return self._conceder(ciudadano_id, time.monotonic() - ahora)
+
+    def _conceder(self, ciudadano_id, espera: float) -> Permiso:
+        self._por_ciudadano[ciudadano_id] = self._por_ciudadano.get(ciudadano_id, 0) + 1
+        self.admitidas += 1
+        self._espera_total += espera
+        return Permiso(self, ciudadano_id, espera)
+
+    def _abandonar_turno(self, turno, ciudadano_id):
+        """
+        Retira un turno de la cola; si ya se le había cedido un cupo, lo devuelve.
+        """
+        self._descontar(ciudadano_id)
+        if turno.done() and not turno.cancelled():
+            self._ceder_cupo()
+            return
+        turno.cancel()
+        try:
+            self._cola.remove(turno)
+        except ValueError:
+            pass
+
+    def _descontar(self, ciudadano_id):
+        """
+        Resta una solicitud en curso del ciudadano; sin ninguna, se borra su entrada.
+        """
+        restantes = self._por_ciudadano.get(ciudadano_id, 1) - 1
+        if restantes > 0:
+            self._por_ciudadano[ciudadano_id] = restantes
+        else:
+            self._por_ciudadano.pop(ciudadano_id, None)
+
+    def _ceder_cupo(self):
+        """
+        Entrega el cupo al siguiente en la cola o lo devuelve al total disponible.
+        """
+        while self._cola:
+            turno = self._cola.popleft()
+            if not turno.done():
+                turno.set_result(None)
+                return
+        self.activos -= 1
+
+    def _liberar(self, permiso: Permiso):
+        duracion = time.monotonic() - permiso.inicio
+        self.duracion_media = 0.8 * self.duracion_media + 0.2 * duracion
+
+        self._descontar(permiso.ciudadano_id)
+        self._ceder_cupo()
+
+    def estado(self) -> dict:
+        """
+        Métricas actuales del controlador.
+
+        :return: Diccionario con ocupación, profundidad de cola y contadores.
+        """
+        return {
+            "activos": self.activos,
+            "max_concurrentes": self.max_concurrentes,
+            "en_cola": self.profundidad_cola,
+            "max_cola": self.max_cola,
+            "admitidas": self.admitidas,
+            "rechazadas": self.rechazadas,
+            "abandonadas": self.abandonadas,
+            "espera_media_ms": round(1000 * self._espera_total / self.admitidas, 1) if self.admitidas else 0.0,
+            "duracion_media_s": round(self.duracion_media, 2),
+        }
+
+
+# Instancia global para usar en la app
+controlador_admision = ControladorAdmision()
@@ -0,0 +1,309 @@
+"""
+Detección de documentos y fragmentos casi duplicados durante la indexación.
+
+Cada texto se resume en una firma MinHash de sus tejas (secuencias de 5 palabras);
+la fracción de posiciones iguales entre dos firmas estima la similitud de Jaccard de
+los textos. Un índice LSH por bandas propone candidatos sin comparar contra todo el
+índice y la similitud estimada confirma el duplicado.
+
+Un documento casi igual a otro ya indexado no se inserta: se guarda como alias del
+canónico en documentos_alias. Entre documentos distintos se descartan además los
+fragmentos repetidos, así el top-k de la búsqueda no se llena de copias. Solo se
+comparan documentos del mismo periodo (ver app/utils/metadatos.py): una publicación
+mensual que apenas cambia, como el directorio de junio frente al de mayo, es un dato
+nuevo y no una copia.
+
+Revisar la tabla documentos ya indexada (desde la carpeta Backend):
+    python -m app.utils.duplicados            # solo reporta
+    python -m app.utils.duplicados --aplicar  # borra las copias y registra los alias
+"""
+
+import re
+import zlib
+import asyncio
+import argparse
+from collections import defaultdict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import DUPLICADOS_UMBRAL_DOCUMENTO, DUPLICADOS_UMBRAL_FRAGMENTO
+from app.utils.metadatos import metadatos_archivo
+
+NUM_PERMUTACIONES = 128
+BANDAS = 32
+PALABRAS_TEJA = 5
+_PRIMO = np.uint64(4294967311)  # primo mayor que 2**32
+
+# Coeficientes fijos para que las firmas sean comparables entre ejecuciones
+_generador = np.random.default_rng(20250501)
+_A = _generador.integers(1, int(_PRIMO), NUM_PERMUTACIONES, dtype=np.uint64)
+_B = _generador.integers(0, int(_PRIMO), NUM_PERMUTACIONES, dtype=np.uint64)
+
+SQL_CREAR_ALIAS = """
+CREATE TABLE IF NOT EXISTS documentos_alias (
+    alias TEXT PRIMARY KEY,
+    canonico TEXT NOT NULL,
+    similitud REAL NOT NULL,
+    fecha_creacion TIMESTAMP NOT NULL DEFAULT NOW()
+);
+"""
+
+SQL_GUARDAR_ALIAS = """
+INSERT INTO documentos_alias (alias, canonico, similitud) VALUES ($1, $2, $3)
+ON CONFLICT (alias) DO UPDATE SET canonico = EXCLUDED.canonico, similitud = EXCLUDED.similitud;
+"""
+
+
+def firma_minhash(texto: str) -> np.ndarray:
+    """
+    Firma MinHash de las tejas de palabras del texto.
+
+    :param texto: Texto del documento o fragmento.
+    :return: Vector uint32 de NUM_PERMUTACIONES valores.
+    """
+    palabras = re.findall(r"\w+", texto.lower())
+    tejas = {
+        " ".join(palabras[i:i + PALABRAS_TEJA])
+        for i in range(max(1, len(palabras) - PALABRAS_TEJA + 1))
+    }
+    hashes = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tejas), dtype=np.uint64, count=len(tejas))
+    # (a·x + b) mod p con x < 2**32 y a, b < p cabe en uint64
+    permutados = (np.outer(hashes, _A) + _B) % _PRIMO
+    return permutados.min(axis=0).astype(np.uint32)
+
+
+def similitud(firma_a: np.ndarray, firma_b: np.ndarray) -> float:
+    """
+    Similitud de Jaccard estimada entre dos firmas.
+    """
+    return float(np.mean(firma_a == firma_b))
+
+
+@lru_cache(maxsize=None)
+def _periodo(nombre_archivo: str):
+    return metadatos_archivo(nombre_archivo)["periodo"]
+
+
+def mismo_periodo(nombre_a: str, nombre_b: str) -> bool:
+    """
+    Indica si dos archivos corresponden al mismo periodo (o ninguno tiene periodo).
+    """
+    return _periodo(nombre_a) == _periodo(nombre_b)
+
+
+class IndiceLSH:
+    """
+    Índice LSH por bandas sobre firmas MinHash.
+    """
+
+    def __init__(self, bandas: int = BANDAS):
+        self.bandas = bandas
+        self.filas = NUM_PERMUTACIONES // bandas
+        self._cubetas = [defaultdict(list) for _ in range(bandas)]
+        self.firmas = {}
+
+    def _claves(self, firma: np.ndarray):
+        for b in range(self.bandas):
+            yield b, firma[b * self.filas:(b + 1) * self.filas].tobytes()
+
+    def agregar(self, clave, firma: np.ndarray):
+        self.firmas[clave] = firma
+        for b, cubeta in self._claves(firma):
+            self._cubetas[b][cubeta].append(clave)
+
+    def quitar(self, clave):
+        firma = self.firmas.pop(clave, None)
+        if firma is not None:
+            for b, cubeta in self._claves(firma):
+                self._cubetas[b][cubeta].remove(clave)
+
+    def mas_parecido(
+        self, firma: np.ndarray, umbral: float, aceptar: Callable[[object], bool] = None
+    ) -> Optional[Tuple[object, float]]:
+        """
+        Elemento indexado más parecido a la firma, si supera el umbral.
+
+        :param aceptar: Filtro opcional de las claves candidatas.
+        :return: Tupla (clave, similitud) o None.
+        """
+        candidatos = {c for b, cubeta in self._claves(firma) for c in self._cubetas[b].get(cubeta, ())}
+        if aceptar is not None:
+            candidatos = {c for c in candidatos if aceptar(c)}
+        mejor = max(((c, similitud(firma, self.firmas[c])) for c in candidatos), key=lambda x: x[1], default=None)
+        if mejor is None or mejor[1] < umbral:
+            return None
+        return mejor
+
+
+class DetectorDuplicados:
+    """
+    Índices LSH de los documentos y fragmentos ya indexados.
+    """
+
+    def __init__(
+        self,
+        umbral_documento: float = DUPLICADOS_UMBRAL_DOCUMENTO,
+        umbral_fragmento: float = DUPLICADOS_UMBRAL_FRAGMENTO,
+    ):
+        """
+        :param umbral_documento: Similitud mínima para considerar un documento copia de otro.
+        :param umbral_fragmento: Similitud mínima para descartar un fragmento repetido.
+        """
+        self.umbral_documento = umbral_documento
+        self.umbral_fragmento = umbral_fragmento
+        self.documentos = IndiceLSH()
+        self.fragmentos = IndiceLSH()
+        self.documentos_duplicados = 0
+        self.fragmentos_duplicados = 0
+
+    def documento_canonico(self, nombre: str, texto: str) -> Optional[Tuple[str, float]]:
+        """
+        Busca un documento ya indexado del que `texto` sea copia; si no hay, lo registra.
+
+        :param nombre: Nombre del archivo.
+        :param texto: Texto completo del documento.
+        :return: (nombre del canónico, similitud) si es una copia, o None.
+        """
+        firma = firma_minhash(texto)
+        parecido = self.documentos.mas_parecido(
+            firma, self.umbral_documento, aceptar=lambda c: c != nombre and mismo_periodo(c, nombre)
+        )
+        if parecido is not None:
+            self.documentos_duplicados += 1
+            return parecido
+        self.documentos.agregar(nombre, firma)
+        return None
+
+    def filtrar_fragmentos(self, nombre: str, fragmentos: List[str]) -> List[int]:
+        """
+        Índices de los fragmentos que no repiten un fragmento de otro documento.
+
+        Los fragmentos conservados quedan registrados. Se compara solo contra otros
+        documentos del mismo periodo: un documento que repite un párrafo internamente
+        lo conserva, y el de un mes nuevo conserva lo que repite del mes anterior.
+
+        :param nombre: Nombre del archivo al que pertenecen.
+        :param fragmentos: Fragmentos del documento.
+        :return: Índices de los fragmentos a insertar.
+        """
+        conservados = []
+        for i, fragmento in enumerate(fragmentos):
+            firma = firma_minhash(fragmento)
+            parecido = self.fragmentos.mas_parecido(
+                firma, self.umbral_fragmento, aceptar=lambda c: c[0] != nombre and mismo_periodo(c[0], nombre)
+            )
+            if parecido is not None:
+                self.fragmentos_duplicados += 1
+                continue
+            conservados.append(i)
+            self.fragmentos.agregar((nombre, i), firma)
+        return conservados
+
+    def olvidar_documento(self, nombre: str):
+        """
+        Quita un documento y sus fragmentos de los índices (por ejemplo, al reindexarlo).
+        """
+        self.documentos.quitar(nombre)
+        for clave in [c for c in self.fragmentos.firmas if c[0] == nombre]:
+            self.fragmentos.quitar(clave)
+
+    async def cargar(self, conn):
+        """
+        Construye los índices a partir de la tabla documentos.
+
+        :param conn: Conexión asyncpg.
+        """
+        por_documento = await fragmentos_por_documento(conn)
+        for nombre, fragmentos in por_documento.items():
+            self.documentos.agregar(nombre, firma_minhash(" ".join(fragmentos)))
+            for i, fragmento in enumerate(fragmentos):
+                self.fragmentos.agregar((nombre, i), firma_minhash(fragmento))
+        print(
+            f"[Duplicados] Índices cargados: {len(por_documento)} documentos, "
+            f"{len(self.fragmentos.firmas)} fragmentos"
+        )
+
+    def estado(self) -> dict:
+        return {
+            "documentos": len(self.documentos.firmas),
+            "fragmentos": len(self.fragmentos.firmas),
+            "documentos_duplicados": self.documentos_duplicados,
+            "fragmentos_duplicados": self.fragmentos_duplicados,
+        }
+
+
+async def fragmentos_por_documento(conn) -> Dict[str, List[str]]:
+    """
+    Fragmentos indexados agrupados por archivo, en orden de inserción.
+
+    También crea la tabla documentos_alias si aún no existe.
+
+    :param conn: Conexión asyncpg.
+    """
+    await conn.execute(SQL_CREAR_ALIAS)
+    rows = await conn.fetch("SELECT nombre_archivo, contenido FROM documentos ORDER BY nombre_archivo, id;")
+    por_documento: Dict[str, List[str]] = defaultdict(list)
+    for r in rows:
+        por_documento[r["nombre_archivo"]].append(r["contenido"])
+    return por_documento
+
+
+async def guardar_alias(conn, alias: str, canonico: str, similitud_alias: float):
+    """
+    Registra un documento como alias del canónico y borra sus fragmentos si ya estaba indexado.
+
+    :param conn: Conexión asyncpg.
+    :param alias: Nombre del archivo duplicado.
+    :param canonico: Nombre del archivo que se conserva.
+    :param similitud_alias: Similitud de Jaccard estimada entre ambos.
+    """
+    async with conn.transaction():
+        await conn.execute(SQL_GUARDAR_ALIAS, alias, canonico, similitud_alias)
+        await conn.execute("DELETE FROM documentos WHERE nombre_archivo = $1", alias)
+    print(f"[Duplicados] {alias} es copia de {canonico} (similitud {similitud_alias:.2f})")
+
+
+async def _revisar_indice(aplicar: bool):
+    import asyncpg
+    from pgvector.asyncpg import register_vector
+    from app.config import DATABASE_URL
+    from app.agents.indice_vectorial import publicar_instantanea
+
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await register_vector(conn)
+        por_documento = await fragmentos_por_documento(conn)
+        total_fragmentos = sum(len(f) for f in por_documento.values())
+
+        # El canónico es la copia con más fragmentos (la más completa)
+        orden = sorted(por_documento, key=lambda n: (-len(por_documento[n]), len(n), n))
+        detector = DetectorDuplicados()
+        copias = []
+        for nombre in orden:
+            parecido = detector.documento_canonico(nombre, " ".join(por_documento[nombre]))
+            if parecido is not None:
+                copias.append((nombre, *parecido))
+
+        fragmentos_copias = sum(len(por_documento[n]) for n, _, _ in copias)
+        print(
+            f"[Duplicados] {len(copias)} documentos duplicados de {len(por_documento)} "
+            f"({fragmentos_copias} de {total_fragmentos} fragmentos)"
+        )
+        for alias, canonico, similitud_alias in copias:
+            if aplicar:
+                await guardar_alias(conn, alias, canonico, similitud_alias)
+            else:
+                print(f"    {alias} -> {canonico} ({similitud_alias:.2f})")
+        if aplicar and copias:
+            # Los workers con el índice vectorial en memoria dejan de ver las copias borradas
+            await publicar_instantanea(conn)
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detecta documentos duplicados en la tabla documentos.")
+    parser.add_argument("--aplicar", action="store_true", help="Borrar las copias y registrar los alias.")
+    asyncio.run(_revisar_indice(parser.parse_args().aplicar))
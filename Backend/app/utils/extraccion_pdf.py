@@ -0,0 +1,199 @@
+"""
+Extracción de texto de PDFs con backends intercambiables y caché en disco.
+
+Los backends rápidos (pypdfium2, PyMuPDF) se usan si están instalados; PyPDF2 es
+siempre el respaldo, tanto cuando no hay otro backend como cuando uno falla con un
+archivo. El texto se guarda por página en una caché en disco indexada por el hash del
+archivo y el backend, de modo que volver a procesar un PDF sin cambios no lo vuelve
+a leer.
+"""
+
+import io
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import List, Optional, Union
+
+import PyPDF2
+
+from app.config import PDF_BACKEND, PDF_CACHE_DIR
+
+
+def _paginas_pypdf2(datos: bytes) -> List[str]:
+    lector = PyPDF2.PdfReader(io.BytesIO(datos))
+    return [pagina.extract_text() or "" for pagina in lector.pages]
+
+
+def _paginas_pymupdf(datos: bytes) -> List[str]:
+    import fitz
+
+    with fitz.open(stream=datos, filetype="pdf") as documento:
+        return [pagina.get_text() for pagina in documento]
+
+
+# PDFium no admite llamadas concurrentes desde varios hilos
+_candado_pdfium = threading.Lock()
+
+
+def _paginas_pypdfium2(datos: bytes) -> List[str]:
+    import pypdfium2
+
+    with _candado_pdfium:
+        documento = pypdfium2.PdfDocument(datos)
+        try:
+            paginas = []
+            for pagina in documento:
+                texto_pagina = pagina.get_textpage()
+                paginas.append(texto_pagina.get_text_range())
+                texto_pagina.close()
+                pagina.close()
+            return paginas
+        finally:
+            documento.close()
+
+
+def _paginas_pdfplumber(datos: bytes) -> List[str]:
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(datos)) as documento:
+        return [pagina.extract_text() or "" for pagina in documento.pages]
+
+
+# Backends disponibles: nombre -> (módulo requerido, función de extracción)
+BACKENDS = {
+    "pymupdf": ("fitz", _paginas_pymupdf),
+    "pypdfium2": ("pypdfium2", _paginas_pypdfium2),
+    "pdfplumber": ("pdfplumber", _paginas_pdfplumber),
+    "pypdf2": ("PyPDF2", _paginas_pypdf2),
+}
+
+# Orden de preferencia en modo "auto" (pypdfium2 se instala junto con pdfplumber);
+# pdfplumber conserva mejor las columnas pero es el más lento, solo se usa si se pide
+ORDEN_AUTO = ("pypdfium2", "pymupdf", "pypdf2")
+
+
+def backend_disponible(nombre: str) -> bool:
+    """
+    Indica si el módulo del backend está instalado.
+
+    :param nombre: Nombre del backend.
+    """
+    if nombre not in BACKENDS:
+        return False
+    try:
+        __import__(BACKENDS[nombre][0])
+        return True
+    except ImportError:
+        return False
+
+
+def resolver_backend(nombre: str = None) -> str:
+    """
+    Elige el backend a usar.
+
+    :param nombre: Backend pedido o "auto" (por defecto PDF_BACKEND).
+    :return: Nombre del backend; PyPDF2 si el pedido no está instalado.
+    """
+    nombre = (nombre or PDF_BACKEND).lower()
+    if nombre == "auto":
+        return next(b for b in ORDEN_AUTO if backend_disponible(b))
+    if backend_disponible(nombre):
+        return nombre
+    print(f"[PDF] Backend {nombre} no disponible, se usa pypdf2")
+    return "pypdf2"
+
+
+class CacheExtraccion:
+    """
+    Caché en disco del texto por página, indexada por hash del archivo y backend.
+    """
+
+    def __init__(self, directorio: str = PDF_CACHE_DIR):
+        """
+        :param directorio: Carpeta de la caché; si es vacía la caché queda desactivada.
+        """
+        self.directorio = Path(directorio) if directorio else None
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _ruta(self, huella: str, backend: str) -> Path:
+        return self.directorio / huella[:2] / f"{huella}-{backend}.json"
+
+    def obtener(self, huella: str, backend: str) -> Optional[List[str]]:
+        if self.directorio is None:
+            return None
+        ruta = self._ruta(huella, backend)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                paginas = json.load(f)
+        except (OSError, ValueError):
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return paginas
+
+    def guardar(self, huella: str, backend: str, paginas: List[str]):
+        if self.directorio is None:
+            return
+        ruta = self._ruta(huella, backend)
+        try:
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            temporal = ruta.with_suffix(".tmp")
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(paginas, f, ensure_ascii=False)
+            temporal.replace(ruta)
+        except OSError as e:
+            print(f"[PDF] No se pudo guardar la caché de extracción: {e}")
+
+
+# Instancia global para usar en la app
+cache_extraccion = CacheExtraccion()
+
+
+def extraer_paginas(
+    origen: Union[str, Path, bytes],
+    backend: str = None,
+    usar_cache: bool = True,
+) -> List[str]:
+    """
+    Extrae el texto de cada página de un PDF.
+
+    :param origen: Ruta del archivo o contenido en bytes.
+    :param backend: Backend a usar (por defecto PDF_BACKEND).
+    :param usar_cache: Si es False no se lee ni se escribe la caché.
+    :return: Lista con el texto de cada página.
+    """
+    datos = origen if isinstance(origen, (bytes, bytearray)) else Path(origen).read_bytes()
+    backend = resolver_backend(backend)
+    huella = hashlib.sha256(datos).hexdigest()
+
+    if usar_cache:
+        paginas = cache_extraccion.obtener(huella, backend)
+        if paginas is not None:
+            return paginas
+
+    try:
+        paginas = BACKENDS[backend][1](datos)
+    except Exception as e:
+        if backend == "pypdf2":
+            raise
+        print(f"[PDF] Falló {backend} ({e}), se usa pypdf2")
+        backend = "pypdf2"
+        paginas = _paginas_pypdf2(datos)
+
+    if usar_cache:
+        cache_extraccion.guardar(huella, backend, paginas)
+    return paginas
+
+
+def extraer_texto(origen: Union[str, Path, bytes], backend: str = None, usar_cache: bool = True) -> str:
+    """
+    Extrae el texto completo de un PDF uniendo sus páginas.
+
+    :param origen: Ruta del archivo o contenido en bytes.
+    :param backend: Backend a usar (por defecto PDF_BACKEND).
+    :param usar_cache: Si es False no se lee ni se escribe la caché.
+    :return: Texto del PDF.
+    """
+    return "\n".join(extraer_paginas(origen, backend, usar_cache))
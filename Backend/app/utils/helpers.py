@@ -1,17 +1,17 @@
 """
 Funciones auxiliares para el backend.
 
-Incluye generación de embeddings usando sentence-transformers localmente,
-ya que OpenRouter no ofrece embeddings gratuitos.
+Incluye generación de embeddings con sentence-transformers, a través del servicio de
+embeddings compartido (app/utils/servicio_embeddings.py) o localmente si no está
+disponible, ya que OpenRouter no ofrece embeddings gratuitos.
 
 También incluye saneamiento básico de texto para evitar inyección.
 """
 
-from sentence_transformers import SentenceTransformer
-import asyncio
 import re
+import numpy as np
+from app.utils.servicio_embeddings import cliente_embeddings
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
 
 async def generar_embedding(texto: str) -> list:
     """
@@ -20,9 +20,19 @@ async def generar_embedding(texto: str) -> list:
     :param texto: Texto a vectorizar.
     :return: Lista de floats representando el embedding.
     """
-    loop = asyncio.get_event_loop()
-    embedding = await loop.run_in_executor(None, model.encode, texto)
-    return embedding.tolist()
+    matriz = await cliente_embeddings.embeber([texto])
+    return matriz[0].tolist()
+
+async def generar_embeddings(textos: list) -> np.ndarray:
+    """
+    Genera los embeddings de varios textos en una sola petición.
+
+    :param textos: Textos a vectorizar.
+    :return: Matriz float32 con un embedding por fila.
+    """
+    if not textos:
+        return np.zeros((0, 0), dtype=np.float32)
+    return await cliente_embeddings.embeber(list(textos))
 
 def sanitizar_texto(texto: str) -> str:
     """
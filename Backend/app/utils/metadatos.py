@@ -0,0 +1,225 @@
+"""
+Metadatos de los documentos indexados: categoría y periodo de publicación.
+
+La categoría y el periodo se obtienen del nombre del archivo (por ejemplo
+`EJECUCION-PRESUPUESTARIA-DE-EGRESOS-DEL-MES-DE-MAYO-2025.pdf` es un reporte de
+presupuesto de mayo de 2025). La búsqueda vectorial puede filtrarse por ellos: cada
+categoría tiene su propio índice HNSW parcial (sobre el vector float32), así una
+consulta filtrada solo recorre su parte de la tabla; un periodo se lee con el índice
+de periodo y se ordena con la distancia exacta. Los periodos antiguos se archivan
+moviéndolos a documentos_archivo.
+
+Archivar los periodos anteriores a un mes (desde la carpeta Backend):
+    python -m app.utils.metadatos --archivar-antes-de 2025-01
+"""
+
+import re
+import asyncio
+import argparse
+import unicodedata
+from datetime import date
+from typing import Optional
+
+MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+
+# Palabras del nombre del archivo que determinan la categoría, en orden de prioridad
+CATEGORIAS = {
+    "presupuesto": (
+        "EJECUCION-PRESUPUESTARIA", "AMPLIACIONES", "TRANSFERENCIAS", "DEPOSITOS", "COMPRAS",
+        "CONTRATACIONES-POR", "COTIZACION", "SUBSIDIOS", "BECAS", "LISTADO-DE-OBRAS", "EMPRESAS-PRECALIFICADAS",
+    ),
+    "plan": ("PLAN-OPERATIVO", "POA", "MISION", "VISION", "OBJETIVOS"),
+    "directorio": ("DIRECTORIO", "ESTRUCTURA-ORGANICA", "MANUAL-DE-FUNCIONES", "FUNCIONES-DE"),
+    "ley": ("LEY", "CODIGO", "CONSTITUCION", "DECRETO", "ACUERDO", "REGLAMENTO"),
+}
+CATEGORIA_OTRO = "otro"
+
+# Palabras (o inicios de palabra) de la pregunta que indican la categoría buscada
+PALABRAS_CATEGORIA = {
+    "presupuesto": ("presupuest", "gasto", "gastos", "egreso", "ingreso", "ejecucion", "transferencia", "compra", "deposito", "subsidio", "beca", "obra"),
+    "ley": ("ley", "codigo", "constitucion", "decreto", "articulo", "reglamento"),
+    "directorio": ("directorio", "telefono", "correo", "encargado", "puesto", "estructura organica"),
+    "plan": ("plan operativo", "poa", "mision", "vision", "objetivo"),
+}
+
+RE_PERIODO_ARCHIVO = re.compile(r"MES-DE-([A-Z]+)-(\d{4})")
+RE_ANIO = re.compile(r"(?<!\d)(20\d{2})(?!\d)")
+RE_MES_PREGUNTA = re.compile(r"\b(" + "|".join(MESES) + r")\b(?:\s+(?:del|de))?(?:\s+(?:ano\s+)?(20\d{2})\b)?")
+
+
+def _sin_tildes(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+def metadatos_archivo(nombre_archivo: str) -> dict:
+    """
+    Categoría y periodo a partir del nombre del archivo.
+
+    :param nombre_archivo: Nombre del PDF.
+    :return: Diccionario con `categoria`, `periodo` (primer día del mes o None) y `anio` (o None).
+    """
+    nombre = _sin_tildes(nombre_archivo).upper()
+    categoria = next(
+        (c for c, claves in CATEGORIAS.items() if any(k in nombre for k in claves)),
+        CATEGORIA_OTRO,
+    )
+    periodo = None
+    anio = None
+    coincidencia = RE_PERIODO_ARCHIVO.search(nombre)
+    if coincidencia and coincidencia.group(1).lower() in MESES:
+        anio = int(coincidencia.group(2))
+        periodo = date(anio, MESES[coincidencia.group(1).lower()], 1)
+    else:
+        coincidencia = RE_ANIO.search(nombre)
+        if coincidencia:
+            anio = int(coincidencia.group(1))
+    return {"categoria": categoria, "periodo": periodo, "anio": anio}
+
+
+def inferir_mes(pregunta: str) -> tuple:
+    """
+    Mes y año que nombra la pregunta ("en mayo", "mayo de 2025").
+
+    :param pregunta: Pregunta original del ciudadano.
+    :return: Tupla (mes, anio); el año es None si solo se nombra el mes y ambos son
+        None si la pregunta no nombra ningún mes.
+    """
+    coincidencia = RE_MES_PREGUNTA.search(_sin_tildes(pregunta).lower())
+    if not coincidencia:
+        return None, None
+    anio = int(coincidencia.group(2)) if coincidencia.group(2) else None
+    return MESES[coincidencia.group(1)], anio
+
+
+def inferir_filtros(pregunta: str) -> dict:
+    """
+    Filtros de búsqueda que se deducen de la pregunta.
+
+    El periodo solo se usa si la pregunta nombra mes y año; la categoría, si una sola
+    categoría coincide con las palabras de la pregunta.
+
+    :param pregunta: Pregunta original del ciudadano.
+    :return: Diccionario con `categoria` y `periodo` (cada uno puede faltar).
+    """
+    texto = _sin_tildes(pregunta).lower()
+    filtros = {}
+    mes, anio = inferir_mes(pregunta)
+    if mes and anio:
+        filtros["periodo"] = date(anio, mes, 1)
+    categorias = [
+        c for c, palabras in PALABRAS_CATEGORIA.items()
+        if any(re.search(r"\b" + p, texto) for p in palabras)
+    ]
+    if len(categorias) == 1:
+        filtros["categoria"] = categorias[0]
+    return filtros
+
+
+def condicion_filtros(categoria: Optional[str], con_periodo: bool, primer_parametro: int, alias: str = "") -> str:
+    """
+    Condición SQL de los filtros para la tabla documentos.
+
+    La categoría se escribe como literal (solo se aceptan las de CATEGORIAS) para que
+    el planificador pueda usar su índice parcial; el periodo va como parámetro.
+
+    :param categoria: Categoría a filtrar o None.
+    :param con_periodo: Si se filtra por periodo.
+    :param primer_parametro: Número del parámetro ($n) que recibe el periodo.
+    :param alias: Alias de la tabla documentos en la consulta (por ejemplo "d.").
+    :return: Texto de la cláusula WHERE (vacío si no hay filtros).
+    """
+    condiciones = []
+    if categoria is not None:
+        if categoria not in CATEGORIAS and categoria != CATEGORIA_OTRO:
+            raise ValueError(f"Categoría desconocida: {categoria}")
+        condiciones.append(f"{alias}categoria = '{categoria}'")
+    if con_periodo:
+        condiciones.append(f"{alias}periodo = ${primer_parametro}")
+    return ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+
+
+async def asegurar_metadatos(conn):
+    """
+    Agrega las columnas de metadatos a documentos, completa las filas que no los
+    tienen, y crea los índices parciales por categoría y la tabla de archivo.
+
+    :param conn: Conexión asyncpg.
+    """
+    await conn.execute(
+        """
+        ALTER TABLE documentos
+            ADD COLUMN IF NOT EXISTS categoria TEXT,
+            ADD COLUMN IF NOT EXISTS periodo DATE,
+            ADD COLUMN IF NOT EXISTS anio INTEGER;
+        CREATE INDEX IF NOT EXISTS documentos_periodo_idx ON documentos (periodo);
+        CREATE TABLE IF NOT EXISTS documentos_archivo (LIKE documentos INCLUDING DEFAULTS);
+        """
+    )
+    nombres = await conn.fetch("SELECT DISTINCT nombre_archivo FROM documentos WHERE categoria IS NULL;")
+    for fila in nombres:
+        m = metadatos_archivo(fila["nombre_archivo"])
+        await conn.execute(
+            "UPDATE documentos SET categoria = $2, periodo = $3, anio = $4 WHERE nombre_archivo = $1;",
+            fila["nombre_archivo"], m["categoria"], m["periodo"], m["anio"],
+        )
+    if nombres:
+        print(f"[Metadatos] Metadatos completados para {len(nombres)} archivos")
+    for categoria in (*CATEGORIAS, CATEGORIA_OTRO):
+        await conn.execute(
+            f"CREATE INDEX IF NOT EXISTS documentos_hnsw_{categoria} ON documentos "
+            f"USING hnsw (embedding vector_l2_ops) WHERE categoria = '{categoria}';"
+        )
+
+
+async def archivar_periodos(conn, antes_de: date) -> int:
+    """
+    Mueve a documentos_archivo los fragmentos de periodos anteriores a una fecha.
+
+    Los documentos sin periodo (leyes, planes) no se archivan.
+
+    :param conn: Conexión asyncpg.
+    :param antes_de: Se archivan los periodos estrictamente anteriores.
+    :return: Número de fragmentos archivados.
+    """
+    resultado = await conn.execute(
+        """
+        WITH movidos AS (
+            DELETE FROM documentos WHERE periodo < $1 RETURNING *
+        )
+        INSERT INTO documentos_archivo SELECT * FROM movidos;
+        """,
+        antes_de,
+    )
+    archivados = int(resultado.split()[-1])
+    print(f"[Metadatos] {archivados} fragmentos anteriores a {antes_de:%m/%Y} archivados")
+    return archivados
+
+
+async def _archivar_desde_bd(antes_de: date):
+    import asyncpg
+    from pgvector.asyncpg import register_vector
+    from app.config import DATABASE_URL
+    from app.agents.indice_vectorial import publicar_instantanea
+
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await register_vector(conn)
+        await asegurar_metadatos(conn)
+        if await archivar_periodos(conn, antes_de):
+            # Los workers con el índice vectorial en memoria dejan de ver los archivados
+            await publicar_instantanea(conn)
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archiva los documentos de periodos antiguos.")
+    parser.add_argument(
+        "--archivar-antes-de", required=True, metavar="AAAA-MM",
+        type=lambda v: date.fromisoformat(f"{v}-01"),
+        help="Se archivan los periodos anteriores a este mes.",
+    )
+    asyncio.run(_archivar_desde_bd(parser.parse_args().archivar_antes_de))
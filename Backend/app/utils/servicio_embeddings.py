@@ -0,0 +1,394 @@
+"""
+Servicio de embeddings compartido por los workers de la app y la ingesta.
+
+Un solo proceso carga el modelo de sentence-transformers y atiende peticiones por un
+socket Unix. Las peticiones que llegan a la vez (de cualquier worker) se juntan en un
+lote y se codifican con una sola llamada a `encode` en un hilo dedicado, de modo que
+la memoria del modelo se paga una vez por máquina y los event loops de los workers no
+ejecutan inferencia. Las peticiones de más de `lote_max` textos (los fragmentos de un
+documento en la ingesta) se codifican por tramos, y las preguntas del chat que llegan
+mientras tanto entran en el lote siguiente en lugar de esperar al documento completo.
+
+`ClienteEmbeddings` es el cliente asíncrono que usan `generar_embedding` y el pipeline
+de indexación: envía los textos en tramos de hasta EMBEDDINGS_LOTE_MAX, cada uno con su
+propio plazo, y si el servicio no está levantado o no responde a tiempo, codifica en el
+propio proceso con el modelo cargado bajo demanda y vuelve a intentar el servicio
+pasados EMBEDDINGS_REINTENTO segundos.
+
+Protocolo (todas las longitudes en big-endian):
+    petición:  uint32 longitud + lista JSON de textos en utf-8
+    respuesta: int32 filas + uint32 dimensión + filas*dimensión float32 (little-endian)
+               o int32 -1 + uint32 longitud + mensaje de error en utf-8
+
+Levantar el servicio (desde la carpeta Backend):
+    python -m app.utils.servicio_embeddings
+"""
+
+import os
+import json
+import time
+import struct
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+
+from app.config import (
+    MODELO_EMBEDDING,
+    EMBEDDINGS_SOCKET,
+    EMBEDDINGS_LOTE_MAX,
+    EMBEDDINGS_ESPERA_LOTE_MS,
+    EMBEDDINGS_TIMEOUT,
+    EMBEDDINGS_REINTENTO,
+)
+
+CABECERA_PETICION = struct.Struct("!I")
+CABECERA_RESPUESTA = struct.Struct("!iI")
+PETICION_MAX_BYTES = 16 * 1024 * 1024
+
+_modelo = None
+_candado_modelo = threading.Lock()
+
+
+class ErrorServicioEmbeddings(Exception):
+    """
+    El servicio recibió la petición pero no pudo codificar los textos.
+    """
+
+
+def obtener_modelo():
+    """
+    Modelo de sentence-transformers del proceso, cargado la primera vez que se usa.
+    """
+    global _modelo
+    with _candado_modelo:
+        if _modelo is None:
+            from sentence_transformers import SentenceTransformer
+
+            _modelo = SentenceTransformer(MODELO_EMBEDDING)
+    return _modelo
+
+
+def codificar_local(textos: List[str], batch_size: int = 64) -> np.ndarray:
+    """
+    Codifica los textos con el modelo del propio proceso.
+
+    :return: Matriz float32 con un embedding por fila.
+    """
+    return np.asarray(obtener_modelo().encode(textos, batch_size=batch_size), dtype=np.float32)
+
+
+def codificar_peticion(textos: List[str]) -> bytes:
+    datos = json.dumps(textos, ensure_ascii=False).encode("utf-8")
+    return CABECERA_PETICION.pack(len(datos)) + datos
+
+
+async def leer_peticion(reader: asyncio.StreamReader) -> List[str]:
+    """
+    Lee una petición completa del socket.
+
+    :raise asyncio.IncompleteReadError: Si el cliente cerró la conexión.
+    :raise ValueError: Si la petición es demasiado grande o no es una lista de textos.
+    """
+    (longitud,) = CABECERA_PETICION.unpack(await reader.readexactly(CABECERA_PETICION.size))
+    if longitud > PETICION_MAX_BYTES:
+        raise ValueError(f"Petición de {longitud} bytes supera el máximo")
+    textos = json.loads((await reader.readexactly(longitud)).decode("utf-8"))
+    if not isinstance(textos, list) or not all(isinstance(t, str) for t in textos):
+        raise ValueError("La petición debe ser una lista de textos")
+    return textos
+
+
+def codificar_respuesta(matriz: np.ndarray) -> bytes:
+    matriz = np.ascontiguousarray(matriz, dtype="<f4")
+    filas, dimension = matriz.shape
+    return CABECERA_RESPUESTA.pack(filas, dimension) + matriz.tobytes()
+
+
+def codificar_error(mensaje: str) -> bytes:
+    datos = mensaje.encode("utf-8")
+    return CABECERA_RESPUESTA.pack(-1, len(datos)) + datos
+
+
+async def leer_respuesta(reader: asyncio.StreamReader) -> np.ndarray:
+    """
+    Lee la respuesta del servicio.
+
+    :raise ErrorServicioEmbeddings: Si el servicio respondió con un error.
+    """
+    filas, dimension = CABECERA_RESPUESTA.unpack(await reader.readexactly(CABECERA_RESPUESTA.size))
+    if filas < 0:
+        raise ErrorServicioEmbeddings((await reader.readexactly(dimension)).decode("utf-8"))
+    datos = await reader.readexactly(filas * dimension * 4)
+    return np.frombuffer(datos, dtype="<f4").reshape(filas, dimension).astype(np.float32)
+
+
+class ServidorEmbeddings:
+    """
+    Proceso que atiende las peticiones de embeddings agrupándolas en lotes.
+    """
+
+    def __init__(
+        self,
+        ruta: str = EMBEDDINGS_SOCKET,
+        lote_max: int = EMBEDDINGS_LOTE_MAX,
+        espera_lote_ms: float = EMBEDDINGS_ESPERA_LOTE_MS,
+    ):
+        """
+        :param ruta: Ruta del socket Unix.
+        :param lote_max: Textos a partir de los cuales el lote se codifica sin esperar más;
+            también el tamaño de los tramos en que se parten las peticiones grandes.
+        :param espera_lote_ms: Espera máxima desde la primera petición del lote.
+        """
+        self.ruta = ruta
+        self.lote_max = max(1, lote_max)
+        self.espera_lote = espera_lote_ms / 1000
+        self._cola = asyncio.Queue()
+        # La inferencia corre siempre en el mismo hilo, fuera del event loop
+        self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embeddings")
+        self._escritores = set()
+        self.conexiones = 0
+        self.peticiones = 0
+        self.textos = 0
+        self.lotes = 0
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Atiende las peticiones de una conexión, una tras otra, hasta que el cliente la cierre.
+        """
+        self.conexiones += 1
+        self._escritores.add(writer)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    textos = await leer_peticion(reader)
+                except (ValueError, UnicodeDecodeError) as e:
+                    # El flujo ya no está sincronizado: se informa y se cierra la conexión
+                    writer.write(codificar_error(str(e)))
+                    await writer.drain()
+                    return
+                # Cada tramo se encola cuando el anterior termina, así las peticiones de
+                # otras conexiones se intercalan entre los tramos de una petición grande
+                tramos = [textos[i:i + self.lote_max] for i in range(0, len(textos), self.lote_max)] or [textos]
+                self.peticiones += 1
+                try:
+                    partes = []
+                    for tramo in tramos:
+                        if reader.at_eof() or writer.is_closing():
+                            # El cliente se rindió (timeout): no encolar más tramos delante de otros
+                            return
+                        futuro = loop.create_future()
+                        await self._cola.put((tramo, futuro))
+                        partes.append(await futuro)
+                    writer.write(codificar_respuesta(partes[0] if len(partes) == 1 else np.vstack(partes)))
+                except Exception as e:
+                    writer.write(codificar_error(f"{type(e).__name__}: {e}"))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.conexiones -= 1
+            self._escritores.discard(writer)
+            writer.close()
+
+    async def _agrupar(self):
+        """
+        Junta las peticiones pendientes en lotes y los codifica en el hilo de inferencia.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self._cola.get()]
+            total = len(lote[0][0])
+            limite = loop.time() + self.espera_lote
+            while total < self.lote_max:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self._cola.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+                total += len(lote[-1][0])
+
+            textos = [t for pendientes, _ in lote for t in pendientes]
+            try:
+                matriz = (
+                    await loop.run_in_executor(self._ejecutor, codificar_local, textos, self.lote_max)
+                    if textos
+                    else np.zeros((0, 0), dtype=np.float32)
+                )
+            except Exception as e:
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+
+            self.lotes += 1
+            self.textos += len(textos)
+            inicio = 0
+            for pendientes, futuro in lote:
+                if not futuro.done():
+                    futuro.set_result(matriz[inicio:inicio + len(pendientes)])
+                inicio += len(pendientes)
+
+    async def _socket_en_uso(self) -> bool:
+        try:
+            _, writer = await asyncio.open_unix_connection(self.ruta)
+        except OSError:
+            return False
+        writer.close()
+        return True
+
+    async def servir(self):
+        """
+        Carga el modelo y atiende el socket hasta que se interrumpa el proceso.
+
+        :raise RuntimeError: Si otro servicio ya atiende el mismo socket.
+        """
+        if await self._socket_en_uso():
+            raise RuntimeError(f"Ya hay un servicio de embeddings en {self.ruta}")
+        if os.path.exists(self.ruta):
+            # Socket huérfano de una ejecución anterior
+            os.unlink(self.ruta)
+
+        inicio = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(self._ejecutor, obtener_modelo)
+        print(f"[Embeddings] Modelo {MODELO_EMBEDDING} cargado en {time.perf_counter() - inicio:.1f} s")
+
+        servidor = await asyncio.start_unix_server(self._atender, path=self.ruta)
+        os.chmod(self.ruta, 0o660)
+        agrupador = asyncio.create_task(self._agrupar())
+        print(f"[Embeddings] Escuchando en {self.ruta} (lotes de hasta {self.lote_max} textos)")
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            # Cerrar el servidor no cierra las conexiones abiertas: los clientes deben
+            # ver el cierre para reconectarse a la siguiente instancia del servicio
+            for writer in list(self._escritores):
+                writer.close()
+            agrupador.cancel()
+            self._ejecutor.shutdown(wait=False)
+            if os.path.exists(self.ruta):
+                os.unlink(self.ruta)
+            print(
+                f"[Embeddings] {self.peticiones} peticiones, {self.textos} textos en {self.lotes} lotes"
+            )
+
+
+class ClienteEmbeddings:
+    """
+    Cliente asíncrono del servicio de embeddings con respaldo en el propio proceso.
+    """
+
+    def __init__(
+        self,
+        ruta: str = EMBEDDINGS_SOCKET,
+        timeout: float = EMBEDDINGS_TIMEOUT,
+        reintento: float = EMBEDDINGS_REINTENTO,
+        lote_max: int = EMBEDDINGS_LOTE_MAX,
+    ):
+        """
+        :param ruta: Ruta del socket Unix; vacía para codificar siempre en el proceso.
+        :param timeout: Espera máxima (s) por la respuesta del servicio a cada tramo.
+        :param reintento: Segundos sin intentar el servicio después de un fallo.
+        :param lote_max: Textos máximos por petición; las listas más largas se envían por tramos.
+        """
+        self.ruta = ruta
+        self.timeout = timeout
+        self.reintento = reintento
+        self.lote_max = max(1, lote_max)
+        self._libres = []
+        self._no_disponible_hasta = 0.0
+        self.remotas = 0
+        self.locales = 0
+        self.fallos = 0
+
+    async def _pedir(self, conexion, textos: List[str]) -> np.ndarray:
+        reader, writer = conexion
+        try:
+            writer.write(codificar_peticion(textos))
+            await writer.drain()
+            matriz = await leer_respuesta(reader)
+        except BaseException:
+            # Incluye la cancelación por timeout: la conexión queda a medio leer
+            writer.close()
+            raise
+        self._libres.append(conexion)
+        return matriz
+
+    async def _remoto(self, textos: List[str]) -> np.ndarray:
+        # Las conexiones ociosas pueden haberse cerrado si el servicio se reinició
+        while self._libres:
+            try:
+                return await self._pedir(self._libres.pop(), textos)
+            except (OSError, asyncio.IncompleteReadError):
+                continue
+        return await self._pedir(await asyncio.open_unix_connection(self.ruta), textos)
+
+    async def embeber(self, textos: List[str]) -> np.ndarray:
+        """
+        Embeddings de los textos, del servicio si está disponible o del modelo local.
+
+        Los fragmentos de un documento largo se piden en tramos de `lote_max` textos con
+        el plazo aplicado a cada tramo, de modo que el tamaño del documento no agota el
+        timeout y las preguntas del chat se intercalan entre tramos.
+
+        :param textos: Textos a vectorizar.
+        :return: Matriz float32 con un embedding por texto.
+        """
+        if self.ruta and time.monotonic() >= self._no_disponible_hasta:
+            try:
+                tramos = [textos[i:i + self.lote_max] for i in range(0, len(textos), self.lote_max)] or [textos]
+                partes = []
+                for tramo in tramos:
+                    partes.append(await asyncio.wait_for(self._remoto(tramo), self.timeout))
+                self.remotas += 1
+                return partes[0] if len(partes) == 1 else np.vstack(partes)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ErrorServicioEmbeddings) as e:
+                self.fallos += 1
+                self._no_disponible_hasta = time.monotonic() + self.reintento
+                print(f"[Embeddings] Servicio no disponible ({type(e).__name__}: {e}); se codifica en el proceso")
+        self.locales += 1
+        return await asyncio.to_thread(codificar_local, textos)
+
+    def estado(self) -> dict:
+        """
+        Peticiones atendidas por el servicio y por el modelo local.
+        """
+        return {
+            "socket": self.ruta,
+            "disponible": bool(self.ruta) and time.monotonic() >= self._no_disponible_hasta,
+            "remotas": self.remotas,
+            "locales": self.locales,
+            "fallos": self.fallos,
+            "conexiones_libres": len(self._libres),
+        }
+
+
+# Instancia global para usar en la app
+cliente_embeddings = ClienteEmbeddings()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio de embeddings compartido por los workers.")
+    parser.add_argument("--socket", default=EMBEDDINGS_SOCKET, help="Ruta del socket Unix.")
+    parser.add_argument("--lote-max", type=int, default=EMBEDDINGS_LOTE_MAX, help="Textos máximos por lote.")
+    parser.add_argument(
+        "--espera-lote-ms", type=float, default=EMBEDDINGS_ESPERA_LOTE_MS,
+        help="Espera máxima para completar un lote.",
+    )
+    args = parser.parse_args()
+    servidor = ServidorEmbeddings(args.socket, args.lote_max, args.espera_lote_ms)
+    try:
+        asyncio.run(servidor.servir())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
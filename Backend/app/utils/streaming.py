@@ -0,0 +1,213 @@
+"""
+Utilidades de streaming para las respuestas del agente.
+
+Incluye un decodificador incremental de Server-Sent Events (SSE) que trabaja sobre
+bytes recorriendo el buffer por desplazamiento, un coalescedor que agrupa los
+fragmentos pequeños del modelo antes de escribirlos al cliente, y un vigilante que
+cancela la generación cuando el cliente se desconecta.
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from app.config import STREAM_FLUSH_BYTES, STREAM_FLUSH_MS, DESCONEXION_INTERVALO_MS
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson es opcional, se usa json de la librería estándar
+    import json as jsonlib
+    _json_loads = jsonlib.loads
+
+FIN_STREAM = b"[DONE]"
+
+
+class DecodificadorSSE:
+    """
+    Decodificador incremental de eventos SSE.
+
+    Recibe bloques de bytes tal como llegan de la red y devuelve el contenido de las
+    líneas `data:` completas. Cada bloque se recorre una sola vez y el buffer solo se
+    compacta al final de cada bloque, por lo que el costo es lineal en los bytes recibidos.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def alimentar(self, bloque: bytes) -> List[bytes]:
+        """
+        Agrega un bloque de bytes y extrae los datos de las líneas completas.
+
+        :param bloque: Bytes recibidos del stream.
+        :return: Lista con el contenido de cada línea `data:` completa.
+        """
+        buffer = self._buffer
+        buffer += bloque
+        datos = []
+        inicio = 0
+        while True:
+            fin = buffer.find(b"\n", inicio)
+            if fin == -1:
+                break
+            fin_linea = fin
+            if fin_linea > inicio and buffer[fin_linea - 1] == 0x0D:
+                fin_linea -= 1
+            if buffer.startswith(b"data:", inicio):
+                desde = inicio + 5
+                if desde < fin_linea and buffer[desde] == 0x20:
+                    desde += 1
+                datos.append(bytes(buffer[desde:fin_linea]))
+            inicio = fin + 1
+        if inicio:
+            del buffer[:inicio]
+        return datos
+
+
+def extraer_contenido(datos: bytes) -> Optional[str]:
+    """
+    Obtiene el texto incremental (delta) de un evento de chat completions.
+
+    :param datos: Contenido JSON de una línea `data:`.
+    :return: Texto del delta o None si el evento no trae contenido o está mal formado.
+    """
+    try:
+        evento = _json_loads(datos)
+        return evento["choices"][0]["delta"].get("content")
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        # Ignorar líneas mal formadas
+        return None
+
+
+async def coalescer_salida(
+    fragmentos: AsyncIterator[bytes],
+    max_bytes: int = STREAM_FLUSH_BYTES,
+    max_espera_ms: int = STREAM_FLUSH_MS,
+) -> AsyncIterator[bytes]:
+    """
+    Agrupa fragmentos pequeños para reducir las escrituras al socket.
+
+    El primer fragmento se envía de inmediato para no retrasar el primer token; los
+    siguientes se acumulan hasta alcanzar `max_bytes` o hasta que pasen `max_espera_ms`
+    desde el primer fragmento pendiente, aunque el modelo no haya enviado nada nuevo.
+    Al cerrarse (fin, error o `aclose`) también cierra `fragmentos`.
+
+    :param fragmentos: Iterador asíncrono de fragmentos en bytes.
+    :param max_bytes: Tamaño a partir del cual se vacía el buffer.
+    :param max_espera_ms: Tiempo máximo que un fragmento puede esperar en el buffer.
+    :yield: Bloques de bytes agrupados.
+    """
+    loop = asyncio.get_running_loop()
+    iterador = fragmentos.__aiter__()
+    pendiente = bytearray()
+    limite = 0.0
+    siguiente = None
+    entradas = 0
+    escrituras = 0
+
+    try:
+        while True:
+            if siguiente is None:
+                siguiente = asyncio.ensure_future(iterador.__anext__())
+            espera = max(0.0, limite - loop.time()) if pendiente else None
+            hechos, _ = await asyncio.wait({siguiente}, timeout=espera)
+
+            if not hechos:
+                escrituras += 1
+                yield bytes(pendiente)
+                pendiente.clear()
+                continue
+
+            tarea, siguiente = siguiente, None
+            try:
+                fragmento = tarea.result()
+            except StopAsyncIteration:
+                break
+
+            entradas += 1
+            if entradas == 1:
+                escrituras += 1
+                yield fragmento
+                continue
+            if not pendiente:
+                limite = loop.time() + max_espera_ms / 1000
+            pendiente += fragmento
+            if len(pendiente) >= max_bytes:
+                escrituras += 1
+                yield bytes(pendiente)
+                pendiente.clear()
+
+        if pendiente:
+            escrituras += 1
+            yield bytes(pendiente)
+    finally:
+        if siguiente is not None and not siguiente.done():
+            siguiente.cancel()
+            # Esperar a que termine la cancelación: aclose falla si el generador sigue en curso
+            await asyncio.wait({siguiente})
+        # Cierra la fuente (y con ella el stream hacia el LLM) sin esperar al recolector
+        if hasattr(iterador, "aclose"):
+            await iterador.aclose()
+        print(f"[Stream] {entradas} fragmentos enviados en {escrituras} escrituras")
+
+
+async def cancelar_si_desconecta(
+    fragmentos: AsyncIterator[bytes],
+    desconectado: Callable[[], Awaitable[bool]],
+    intervalo_ms: int = DESCONEXION_INTERVALO_MS,
+) -> AsyncIterator[bytes]:
+    """
+    Reenvía los fragmentos y cancela su generación si el cliente se desconecta.
+
+    La desconexión se revisa periódicamente también mientras se espera el siguiente
+    fragmento, de modo que el stream hacia el LLM se cierra aunque el modelo esté
+    tardando en responder.
+
+    :param fragmentos: Iterador asíncrono de fragmentos (por ejemplo, la respuesta del agente).
+    :param desconectado: Función asíncrona que indica si el cliente cerró la conexión.
+    :param intervalo_ms: Cada cuánto revisar la conexión.
+    :yield: Los mismos fragmentos mientras el cliente siga conectado.
+    """
+    iterador = fragmentos.__aiter__()
+
+    async def vigilar() -> bool:
+        try:
+            while not await desconectado():
+                await asyncio.sleep(intervalo_ms / 1000)
+            return True
+        except Exception:
+            # Sin forma de saber si hay desconexión: se deja de vigilar
+            return False
+
+    vigia = asyncio.ensure_future(vigilar())
+    siguiente = None
+    try:
+        while True:
+            siguiente = asyncio.ensure_future(iterador.__anext__())
+            esperar = {siguiente, vigia} if vigia is not None else {siguiente}
+            hechos, _ = await asyncio.wait(esperar, return_when=asyncio.FIRST_COMPLETED)
+
+            if siguiente not in hechos:
+                if not vigia.result():
+                    vigia = None
+                    await asyncio.wait({siguiente})
+                else:
+                    print("[Stream] Cliente desconectado, cancelando la generación")
+                    siguiente.cancel()
+                    await asyncio.wait({siguiente})
+                    return
+
+            tarea, siguiente = siguiente, None
+            try:
+                fragmento = tarea.result()
+            except StopAsyncIteration:
+                return
+            yield fragmento
+    finally:
+        if vigia is not None:
+            vigia.cancel()
+        if siguiente is not None and not siguiente.done():
+            siguiente.cancel()
+            # Esperar a que termine la cancelación: aclose falla si el generador sigue en curso
+            await asyncio.wait({siguiente})
+        if hasattr(iterador, "aclose"):
+            await iterador.aclose()
@@ -0,0 +1,105 @@
+"""
+Benchmark de extracción de texto de PDFs sobre el corpus pdfs_mayo_2025.
+
+Compara los backends instalados (PyMuPDF, pypdfium2, pdfplumber, PyPDF2) en
+páginas por segundo y fidelidad del texto frente a un backend de referencia
+(F1 de palabras por documento), y mide la lectura desde la caché de extracción.
+
+Uso (desde la carpeta Backend):
+    python benchmark_extraccion.py --referencia pdfplumber
+"""
+
+import re
+import time
+import argparse
+import tempfile
+import statistics
+from collections import Counter
+from pathlib import Path
+
+from app.utils import extraccion_pdf
+from app.utils.extraccion_pdf import BACKENDS, CacheExtraccion, backend_disponible, extraer_paginas
+
+
+def f1_palabras(texto: str, referencia: str) -> float:
+    """
+    F1 entre las bolsas de palabras de un texto y el de referencia.
+
+    :param texto: Texto extraído por el backend evaluado.
+    :param referencia: Texto extraído por el backend de referencia.
+    :return: Valor entre 0 y 1 (1 si ambos están vacíos).
+    """
+    palabras = Counter(re.findall(r"\w+", texto.lower()))
+    palabras_ref = Counter(re.findall(r"\w+", referencia.lower()))
+    if not palabras and not palabras_ref:
+        return 1.0
+    comunes = sum((palabras & palabras_ref).values())
+    if not comunes:
+        return 0.0
+    precision = comunes / sum(palabras.values())
+    recall = comunes / sum(palabras_ref.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def medir(backend: str, archivos: dict, usar_cache: bool = False) -> dict:
+    """
+    Extrae todos los archivos con un backend.
+
+    :return: Textos por archivo, páginas totales y segundos empleados.
+    """
+    textos, paginas, segundos = {}, 0, 0.0
+    for nombre, datos in archivos.items():
+        inicio = time.perf_counter()
+        try:
+            resultado = extraer_paginas(datos, backend, usar_cache=usar_cache)
+        except Exception as e:
+            print(f"[Benchmark] {backend} falló con {nombre}: {e}")
+            resultado = []
+        segundos += time.perf_counter() - inicio
+        textos[nombre] = "\n".join(resultado)
+        paginas += len(resultado)
+    return {"textos": textos, "paginas": paginas, "segundos": segundos}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de backends de extracción de PDFs.")
+    parser.add_argument("--directorio", default="../pdfs_mayo_2025", help="Carpeta con los PDFs.")
+    parser.add_argument("--referencia", default="pdfplumber", help="Backend de referencia para la fidelidad.")
+    parser.add_argument("--detalle", action="store_true", help="Mostrar el F1 por archivo.")
+    args = parser.parse_args()
+
+    archivos = {ruta.name: ruta.read_bytes() for ruta in sorted(Path(args.directorio).glob("*.pdf"))}
+    backends = [b for b in BACKENDS if backend_disponible(b)]
+    print(f"[Benchmark] {len(archivos)} PDFs, backends disponibles: {', '.join(backends)}")
+    if args.referencia not in backends:
+        parser.error(f"El backend de referencia {args.referencia} no está instalado")
+
+    resultados = {b: medir(b, archivos) for b in backends}
+    referencia = resultados[args.referencia]["textos"]
+
+    print(f"\n{'backend':<12}{'páginas':>9}{'seg':>9}{'págs/s':>10}{'F1 medio':>10}{'F1 mín':>9}{'caracteres':>12}")
+    for backend, r in resultados.items():
+        f1s = {n: f1_palabras(r["textos"][n], referencia[n]) for n in archivos}
+        caracteres = sum(len(t) for t in r["textos"].values())
+        print(
+            f"{backend:<12}{r['paginas']:>9}{r['segundos']:>9.2f}{r['paginas'] / r['segundos']:>10.1f}"
+            f"{statistics.mean(f1s.values()):>10.3f}{min(f1s.values()):>9.3f}{caracteres:>12}"
+        )
+        if args.detalle:
+            for nombre, f1 in sorted(f1s.items(), key=lambda x: x[1])[:10]:
+                print(f"    {f1:.3f}  {nombre}")
+
+    # Caché de extracción: primera pasada la llena, la segunda lee de disco
+    with tempfile.TemporaryDirectory() as directorio:
+        extraccion_pdf.cache_extraccion = CacheExtraccion(directorio)
+        backend = extraccion_pdf.resolver_backend()
+        fria = medir(backend, archivos, usar_cache=True)
+        caliente = medir(backend, archivos, usar_cache=True)
+    print(
+        f"\n[Benchmark] Caché ({backend}): {fria['segundos']:.2f}s sin caché, "
+        f"{caliente['segundos']:.3f}s con caché ({caliente['paginas'] / caliente['segundos']:.0f} págs/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
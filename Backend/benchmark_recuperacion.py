@@ -0,0 +1,442 @@
+"""
+Benchmark de recuperación sobre el corpus pdfs_mayo_2025.
+
+Fragmenta los PDFs del corpus con distintos tamaños, los carga en tablas temporales
+de PostgreSQL (pgvector) y evalúa un conjunto pequeño de preguntas etiquetadas con
+cada configuración de recuperación: escaneo exacto, HNSW, IVFFlat, HNSW compacto
+(halfvec o binario, con reordenamiento exacto), búsqueda híbrida (vector + texto
+completo) y re-ranking con cross-encoder.
+
+Para cada configuración reporta recall@k, MRR, latencia de consulta (p50/p95) y el
+tamaño del índice ANN.
+
+Uso (desde la carpeta Backend):
+    python benchmark_recuperacion.py --k 5 --tamanos 200 400 800
+"""
+
+import re
+import json
+import math
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+import asyncpg
+from pgvector.asyncpg import register_vector
+
+from app.config import DATABASE_URL, DIMENSION_EMBEDDING
+from app.utils.servicio_embeddings import obtener_modelo
+from mcp_proceso import (
+    DIRECTORIO_MCP,
+    extraer_texto_pdf,
+    fragmentar_texto,
+    obtener_todos_los_archivos,
+)
+
+RUTA_PREGUNTAS = Path(__file__).parent / "benchmark" / "preguntas_mayo_2025.json"
+MODELO_RERANK = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+K_RRF = 60
+
+# Índices compactos: expresión sobre el embedding y clase de operadores
+EXPRESIONES_COMPACTAS = {
+    "hnsw-halfvec": (f"{{columna}}::halfvec({DIMENSION_EMBEDDING})", "halfvec_l2_ops"),
+    "hnsw-binario": (f"binary_quantize({{columna}})::bit({DIMENSION_EMBEDDING})", "bit_hamming_ops"),
+}
+OPERADORES_COMPACTOS = {"hnsw-halfvec": "<->", "hnsw-binario": "<~>"}
+
+
+def cargar_corpus(directorio: str) -> dict:
+    """
+    Extrae el texto de todos los PDFs del directorio.
+
+    :param directorio: Carpeta con los PDFs.
+    :return: Diccionario nombre_archivo -> texto.
+    """
+    corpus = {}
+    for ruta in sorted(obtener_todos_los_archivos(directorio)):
+        if not ruta.lower().endswith(".pdf"):
+            continue
+        texto = extraer_texto_pdf(ruta)
+        if texto.strip():
+            corpus[Path(ruta).name] = texto
+    return corpus
+
+
+def cargar_preguntas(ruta: Path) -> list:
+    """
+    Carga el conjunto de preguntas etiquetadas.
+
+    Cada pregunta trae `relevantes`: una lista de grupos de archivos; un grupo se
+    considera recuperado si aparece cualquiera de sus copias.
+
+    :param ruta: Ruta al archivo JSON.
+    :return: Lista de diccionarios con pregunta y relevantes.
+    """
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def separar_sin_texto(preguntas: list, corpus: dict) -> tuple:
+    """
+    Separa las preguntas que el corpus no puede responder.
+
+    Los grupos de relevantes sin ninguna copia con capa de texto (PDFs escaneados,
+    que cargar_corpus omite) se quitan; una pregunta sin grupos restantes no se evalúa,
+    para que el recall de todas las configuraciones no quede topado por debajo de 1.
+
+    :param preguntas: Preguntas etiquetadas.
+    :param corpus: Documentos con texto (nombre_archivo -> texto).
+    :return: Tupla (preguntas evaluables con sus relevantes filtrados, preguntas sin respuesta).
+    """
+    evaluables, sin_respuesta = [], []
+    for pregunta in preguntas:
+        grupos = [grupo for grupo in pregunta["relevantes"] if any(n in corpus for n in grupo)]
+        if grupos:
+            evaluables.append({**pregunta, "relevantes": grupos})
+        else:
+            sin_respuesta.append(pregunta)
+    return evaluables, sin_respuesta
+
+
+def consulta_texto(pregunta: str) -> str:
+    """
+    Convierte la pregunta en una consulta tsquery con términos unidos por OR.
+
+    :param pregunta: Texto de la pregunta.
+    :return: Cadena para to_tsquery.
+    """
+    terminos = [t for t in re.findall(r"\w+", pregunta.lower()) if len(t) > 2]
+    return " | ".join(terminos)
+
+
+async def crear_tabla_fragmentos(conn, tabla: str, corpus: dict, tamano: int, solape: int) -> int:
+    """
+    Crea y llena una tabla de fragmentos con sus embeddings.
+
+    :return: Número de fragmentos insertados.
+    """
+    await conn.execute(f"DROP TABLE IF EXISTS {tabla};")
+    await conn.execute(
+        f"""
+        CREATE TABLE {tabla} (
+            id SERIAL PRIMARY KEY,
+            nombre_archivo TEXT NOT NULL,
+            contenido TEXT NOT NULL,
+            embedding vector({DIMENSION_EMBEDDING}) NOT NULL
+        );
+        """
+    )
+
+    nombres, fragmentos = [], []
+    for nombre, texto in corpus.items():
+        for fragmento in fragmentar_texto(texto, tamano, solape):
+            nombres.append(nombre)
+            fragmentos.append(fragmento)
+
+    embeddings = obtener_modelo().encode(fragmentos, batch_size=64)
+    await conn.copy_records_to_table(
+        tabla,
+        records=list(zip(nombres, fragmentos, embeddings)),
+        columns=["nombre_archivo", "contenido", "embedding"],
+    )
+    await conn.execute(
+        f"CREATE INDEX ON {tabla} USING gin (to_tsvector('spanish', contenido));"
+    )
+    await conn.execute(f"ANALYZE {tabla};")
+    return len(fragmentos)
+
+
+async def crear_indice(conn, tabla: str, tipo: str, total: int) -> dict:
+    """
+    Reemplaza el índice ANN de la tabla.
+
+    :param tipo: "exacto", "hnsw", "hnsw-halfvec", "hnsw-binario" o "ivfflat".
+    :param total: Número de filas (para dimensionar IVFFlat).
+    :return: Parámetros de construcción usados.
+    """
+    await conn.execute(f"DROP INDEX IF EXISTS {tabla}_ann;")
+    if tipo in EXPRESIONES_COMPACTAS:
+        expresion, operador = EXPRESIONES_COMPACTAS[tipo]
+        await conn.execute(
+            f"CREATE INDEX {tabla}_ann ON {tabla} USING hnsw (({expresion.format(columna='embedding')}) {operador}) "
+            "WITH (m = 16, ef_construction = 64);"
+        )
+        return {"m": 16, "ef_construction": 64}
+    if tipo == "hnsw":
+        await conn.execute(
+            f"CREATE INDEX {tabla}_ann ON {tabla} USING hnsw (embedding vector_l2_ops) "
+            "WITH (m = 16, ef_construction = 64);"
+        )
+        return {"m": 16, "ef_construction": 64}
+    if tipo == "ivfflat":
+        listas = max(1, int(math.sqrt(total)))
+        await conn.execute(
+            f"CREATE INDEX {tabla}_ann ON {tabla} USING ivfflat (embedding vector_l2_ops) "
+            f"WITH (lists = {listas});"
+        )
+        return {"lists": listas}
+    return {}
+
+
+async def recuperar(conn, tabla: str, config: dict, pregunta: str, embedding, k: int, reranker) -> list:
+    """
+    Ejecuta una consulta de recuperación según la configuración.
+
+    :return: Lista ordenada de nombres de archivo de los fragmentos recuperados.
+    """
+    async with conn.transaction():
+        if config["indice"] == "exacto":
+            await conn.execute("SET LOCAL enable_indexscan = off;")
+            await conn.execute("SET LOCAL enable_bitmapscan = off;")
+        for ajuste, valor in config.get("ajustes", {}).items():
+            await conn.execute(f"SET LOCAL {ajuste} = {int(valor)};")
+
+        if config["modo"] == "hibrido":
+            candidatos = max(k * 4, 20)
+            rows = await conn.fetch(
+                f"""
+                WITH vec AS (
+                    SELECT id, row_number() OVER (ORDER BY embedding <-> $1) AS r
+                    FROM {tabla} ORDER BY embedding <-> $1 LIMIT $3
+                ),
+                txt AS (
+                    SELECT id, row_number() OVER (
+                        ORDER BY ts_rank_cd(to_tsvector('spanish', contenido), q) DESC
+                    ) AS r
+                    FROM {tabla}, to_tsquery('spanish', $2) q
+                    WHERE to_tsvector('spanish', contenido) @@ q
+                    ORDER BY r LIMIT $3
+                ),
+                fusion AS (
+                    SELECT id, SUM(1.0 / ({K_RRF} + r)) AS puntaje
+                    FROM (SELECT * FROM vec UNION ALL SELECT * FROM txt) u
+                    GROUP BY id
+                )
+                SELECT t.nombre_archivo, t.contenido
+                FROM fusion f JOIN {tabla} t USING (id)
+                ORDER BY f.puntaje DESC
+                LIMIT $4;
+                """,
+                embedding, consulta_texto(pregunta) or "''", candidatos, k,
+            )
+            return [r["nombre_archivo"] for r in rows]
+
+        if config["modo"] == "rescore":
+            # Pasada ANN sobre el índice compacto y reordenamiento con el vector float32
+            expresion, _ = EXPRESIONES_COMPACTAS[config["indice"]]
+            operador = OPERADORES_COMPACTOS[config["indice"]]
+            rows = await conn.fetch(
+                f"""
+                WITH candidatos AS (
+                    SELECT id FROM {tabla}
+                    ORDER BY {expresion.format(columna='embedding')} {operador} {expresion.format(columna='$1::vector')}
+                    LIMIT $3
+                )
+                SELECT t.nombre_archivo
+                FROM candidatos c JOIN {tabla} t USING (id)
+                ORDER BY t.embedding <-> $1
+                LIMIT $2;
+                """,
+                embedding, k, k * config["sobremuestreo"],
+            )
+            return [r["nombre_archivo"] for r in rows]
+
+        limite = max(k * 6, 30) if config["modo"] == "rerank" else k
+        rows = await conn.fetch(
+            f"SELECT nombre_archivo, contenido FROM {tabla} ORDER BY embedding <-> $1 LIMIT $2;",
+            embedding, limite,
+        )
+
+    if config["modo"] == "rerank":
+        puntajes = reranker.predict([(pregunta, r["contenido"]) for r in rows])
+        orden = sorted(range(len(rows)), key=lambda i: puntajes[i], reverse=True)
+        return [rows[i]["nombre_archivo"] for i in orden[:k]]
+    return [r["nombre_archivo"] for r in rows]
+
+
+def calcular_metricas(recuperados: list, relevantes: list) -> tuple:
+    """
+    Calcula recall@k y reciprocal rank para una pregunta.
+
+    :param recuperados: Nombres de archivo en orden de ranking.
+    :param relevantes: Grupos de archivos equivalentes.
+    :return: (recall, reciprocal_rank)
+    """
+    encontrados = sum(1 for grupo in relevantes if any(n in grupo for n in recuperados))
+    recall = encontrados / len(relevantes)
+
+    todos = {n for grupo in relevantes for n in grupo}
+    rr = 0.0
+    for posicion, nombre in enumerate(recuperados, start=1):
+        if nombre in todos:
+            rr = 1.0 / posicion
+            break
+    return recall, rr
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def configuraciones(ef_search: list, probes: list, usar_rerank: bool, sobremuestreo: list) -> list:
+    """
+    Arma la lista de configuraciones agrupadas por índice, para construir cada índice una sola vez.
+    """
+    configs = [
+        {"nombre": "exacto", "indice": "exacto", "modo": "vector"},
+        {"nombre": "exacto+hibrido", "indice": "exacto", "modo": "hibrido"},
+    ]
+    if usar_rerank:
+        configs.append({"nombre": "exacto+rerank", "indice": "exacto", "modo": "rerank"})
+    for ef in ef_search:
+        configs.append({
+            "nombre": f"hnsw ef_search={ef}", "indice": "hnsw", "modo": "vector",
+            "ajustes": {"hnsw.ef_search": ef},
+        })
+    for p in probes:
+        configs.append({
+            "nombre": f"ivfflat probes={p}", "indice": "ivfflat", "modo": "vector",
+            "ajustes": {"ivfflat.probes": p},
+        })
+    for indice in EXPRESIONES_COMPACTAS:
+        for factor in sobremuestreo:
+            configs.append({
+                "nombre": f"{indice} x{factor}+rescore", "indice": indice, "modo": "rescore",
+                "sobremuestreo": factor,
+                # ef_search debe cubrir todos los candidatos sobremuestreados
+                "ajustes": {"hnsw.ef_search": max(40, factor * 10)},
+            })
+    return configs
+
+
+def imprimir_tabla(filas: list, k: int):
+    """
+    Imprime los resultados como tabla de texto.
+    """
+    encabezados = ["tamaño", "fragmentos", "configuración", f"recall@{k}", "MRR", "p50 ms", "p95 ms", "índice MB"]
+    datos = [
+        [
+            str(f["tamano"]), str(f["fragmentos"]), f["config"],
+            f"{f['recall']:.3f}", f"{f['mrr']:.3f}", f"{f['p50']:.1f}", f"{f['p95']:.1f}",
+            f"{f['indice_mb']:.2f}",
+        ]
+        for f in filas
+    ]
+    anchos = [max(len(h), *(len(d[i]) for d in datos)) for i, h in enumerate(encabezados)]
+    linea = "  ".join(h.ljust(anchos[i]) for i, h in enumerate(encabezados))
+    print("\n" + linea)
+    print("-" * len(linea))
+    for d in datos:
+        print("  ".join(v.ljust(anchos[i]) for i, v in enumerate(d)))
+
+
+async def ejecutar_benchmark(args):
+    preguntas = cargar_preguntas(Path(args.preguntas))
+    print(f"[Benchmark] {len(preguntas)} preguntas etiquetadas.")
+
+    corpus = cargar_corpus(args.directorio)
+    print(f"[Benchmark] {len(corpus)} documentos con texto en {args.directorio}.")
+
+    preguntas, sin_respuesta = separar_sin_texto(preguntas, corpus)
+    if sin_respuesta:
+        print(f"[Benchmark] {len(sin_respuesta)} preguntas sin respuesta (sus documentos no tienen texto), no se evalúan:")
+        for pregunta in sin_respuesta:
+            print(f"  - {pregunta['pregunta']}")
+
+    embeddings_preguntas = obtener_modelo().encode([p["pregunta"] for p in preguntas])
+
+    reranker = None
+    if not args.sin_rerank:
+        from sentence_transformers import CrossEncoder
+        reranker = CrossEncoder(args.modelo_rerank)
+
+    configs = configuraciones(args.ef_search, args.probes, reranker is not None, args.sobremuestreo)
+    filas = []
+
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await conn.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        await register_vector(conn)
+
+        for tamano in args.tamanos:
+            tabla = f"bench_fragmentos_{tamano}"
+            inicio = time.perf_counter()
+            total = await crear_tabla_fragmentos(conn, tabla, corpus, tamano, args.solape)
+            print(f"[Benchmark] {tabla}: {total} fragmentos en {time.perf_counter() - inicio:.1f}s")
+
+            for indice in ("exacto", "hnsw", "ivfflat", *EXPRESIONES_COMPACTAS):
+                inicio = time.perf_counter()
+                parametros = await crear_indice(conn, tabla, indice, total)
+                indice_mb = 0.0
+                if parametros:
+                    indice_mb = await conn.fetchval(f"SELECT pg_relation_size('{tabla}_ann')") / 2 ** 20
+                    print(
+                        f"[Benchmark] índice {indice} {parametros} en {time.perf_counter() - inicio:.1f}s, "
+                        f"{indice_mb:.2f} MB"
+                    )
+
+                for config in (c for c in configs if c["indice"] == indice):
+                    # Consulta de calentamiento para no medir cachés frías
+                    await recuperar(conn, tabla, config, preguntas[0]["pregunta"],
+                                    embeddings_preguntas[0], args.k, reranker)
+
+                    recalls, rrs, latencias = [], [], []
+                    for pregunta, embedding in zip(preguntas, embeddings_preguntas):
+                        t0 = time.perf_counter()
+                        recuperados = await recuperar(conn, tabla, config, pregunta["pregunta"],
+                                                      embedding, args.k, reranker)
+                        latencias.append((time.perf_counter() - t0) * 1000)
+                        recall, rr = calcular_metricas(recuperados, pregunta["relevantes"])
+                        recalls.append(recall)
+                        rrs.append(rr)
+
+                    filas.append({
+                        "tamano": tamano,
+                        "fragmentos": total,
+                        "config": config["nombre"],
+                        "recall": statistics.mean(recalls),
+                        "mrr": statistics.mean(rrs),
+                        "p50": percentil(latencias, 50),
+                        "p95": percentil(latencias, 95),
+                        "indice_mb": indice_mb,
+                    })
+
+            if not args.conservar:
+                await conn.execute(f"DROP TABLE IF EXISTS {tabla};")
+    finally:
+        await conn.close()
+
+    imprimir_tabla(filas, args.k)
+    print(f"\nEvaluadas {len(preguntas)} preguntas; sin respuesta en el corpus: {len(sin_respuesta)}.")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(filas, f, ensure_ascii=False, indent=2)
+        print(f"\n[Benchmark] Resultados guardados en {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de recuperación sobre pdfs_mayo_2025.")
+    parser.add_argument("--directorio", default=DIRECTORIO_MCP, help="Carpeta con los PDFs.")
+    parser.add_argument("--preguntas", default=str(RUTA_PREGUNTAS), help="JSON de preguntas etiquetadas.")
+    parser.add_argument("--k", type=int, default=5, help="Número de fragmentos recuperados.")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[200, 400, 800],
+                        help="Tamaños de fragmento en palabras.")
+    parser.add_argument("--solape", type=int, default=50, help="Palabras compartidas entre fragmentos.")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[40, 100])
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--sobremuestreo", type=int, nargs="+", default=[1, 4],
+                        help="Candidatos por resultado en los índices compactos antes de reordenar.")
+    parser.add_argument("--modelo-rerank", default=MODELO_RERANK)
+    parser.add_argument("--sin-rerank", action="store_true", help="Omitir la configuración con re-ranking.")
+    parser.add_argument("--conservar", action="store_true", help="No borrar las tablas de fragmentos al terminar.")
+    parser.add_argument("--json", help="Ruta opcional para guardar los resultados en JSON.")
+    asyncio.run(ejecutar_benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
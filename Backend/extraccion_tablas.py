@@ -0,0 +1,301 @@
+"""
+Extracción de tablas presupuestarias de los reportes SICOIN GL.
+
+Lee los reportes de ejecución presupuestaria de egresos e ingresos con pdfplumber,
+que respeta el orden de las columnas (PyPDF2 las mezcla), interpreta cada línea de
+la tabla y guarda las filas en tablas tipadas de PostgreSQL con índices, para que
+el agente resuelva preguntas numéricas con una consulta SQL en lugar de pasar el
+texto completo del reporte al LLM.
+
+Los reportes escaneados (por ejemplo COMPRAS-DIRECTAS o LISTADO-DE-OBRAS) no tienen
+capa de texto; se informan y se omiten hasta contar con OCR.
+
+Uso (desde la carpeta Backend):
+    python extraccion_tablas.py --directorio ../pdfs_mayo_2025
+"""
+
+import re
+import asyncio
+import argparse
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+import asyncpg
+import pdfplumber
+
+from app.config import DATABASE_URL
+from app.agents.consultas_tablas import normalizar
+
+MONTO = r"-?[\d,]+\.\d{2}"
+RE_PERIODO = re.compile(r"(?:Periodo del|Fecha de):\s*(\d{2}/\d{2}/\d{4})\s+al:?\s*(\d{2}/\d{2}/\d{4})")
+
+# Egresos: renglón, fuente de financiamiento, descripción y 11 montos
+RE_RENGLON = re.compile(rf"^(\d{{3}}) (\d{{2}}-\d{{4}}-\d{{4}}) (.+?) ((?:{MONTO} ?){{11}})$")
+# Egresos: programa (01ACTIVIDADES...), subprograma, proyecto, actividad u obra con 7 montos
+RE_ESTRUCTURA = re.compile(rf"^(\d{{2,3}}) ?(\D.*?) ((?:{MONTO} ?){{7}})$")
+RE_GRUPO_GASTO = re.compile(r"^\d{3}$")
+# Ingresos: cuenta, concepto, fuente (solo en cuentas de detalle) y 7 montos
+RE_CUENTA = re.compile(rf"^(\d{{2}}(?:\.\d{{2}}){{4}}\.?) (.*?) ?(\d{{2}}-\d{{4}}-\d{{4}})? ((?:{MONTO} ?){{7}})$")
+
+COLUMNAS_EGRESOS = [
+    "asignado", "modificado", "vigente", "precompromiso", "compromiso", "devengado",
+    "pagado", "extrapresupuestario", "saldo_disponible", "saldo_por_devengar", "saldo_por_pagar",
+]
+COLUMNAS_INGRESOS = [
+    "asignado", "modificaciones", "saldo_caja", "vigente", "percibido", "alzas", "saldo_por_ejecutar",
+]
+
+ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS ejecucion_egresos (
+    id SERIAL PRIMARY KEY,
+    nombre_archivo TEXT NOT NULL,
+    periodo_inicio DATE,
+    periodo_fin DATE,
+    programa TEXT,
+    subprograma TEXT,
+    proyecto TEXT,
+    actividad TEXT,
+    obra TEXT,
+    renglon TEXT NOT NULL,
+    fuente TEXT NOT NULL,
+    descripcion TEXT NOT NULL,
+    texto_busqueda TEXT NOT NULL,
+    {", ".join(f"{c} NUMERIC(16, 2) NOT NULL" for c in COLUMNAS_EGRESOS)}
+);
+CREATE INDEX IF NOT EXISTS idx_egresos_renglon ON ejecucion_egresos (renglon);
+CREATE INDEX IF NOT EXISTS idx_egresos_periodo ON ejecucion_egresos (periodo_inicio, periodo_fin);
+CREATE INDEX IF NOT EXISTS idx_egresos_busqueda
+    ON ejecucion_egresos USING GIN (to_tsvector('spanish', texto_busqueda));
+
+CREATE TABLE IF NOT EXISTS ejecucion_ingresos (
+    id SERIAL PRIMARY KEY,
+    nombre_archivo TEXT NOT NULL,
+    periodo_inicio DATE,
+    periodo_fin DATE,
+    cuenta TEXT NOT NULL,
+    concepto TEXT NOT NULL,
+    fuente TEXT,
+    es_detalle BOOLEAN NOT NULL,
+    texto_busqueda TEXT NOT NULL,
+    {", ".join(f"{c} NUMERIC(16, 2) NOT NULL" for c in COLUMNAS_INGRESOS)}
+);
+CREATE INDEX IF NOT EXISTS idx_ingresos_cuenta ON ejecucion_ingresos (cuenta);
+CREATE INDEX IF NOT EXISTS idx_ingresos_periodo ON ejecucion_ingresos (periodo_inicio, periodo_fin);
+CREATE INDEX IF NOT EXISTS idx_ingresos_busqueda
+    ON ejecucion_ingresos USING GIN (to_tsvector('spanish', texto_busqueda));
+"""
+
+
+def convertir_montos(montos: str) -> list:
+    """
+    Convierte una secuencia de montos con separador de miles en Decimales.
+
+    :param montos: Texto con los montos separados por espacios.
+    :return: Lista de Decimal.
+    """
+    return [Decimal(m.replace(",", "")) for m in montos.split()]
+
+
+def lineas_de_tabla(pdf, fin_encabezado) -> list:
+    """
+    Devuelve las líneas de cada página omitiendo el encabezado repetido del reporte.
+
+    :param pdf: Documento abierto con pdfplumber.
+    :param fin_encabezado: Función que reconoce la última línea del encabezado.
+    :return: Lista de líneas de la tabla.
+    """
+    lineas = []
+    for pagina in pdf.pages:
+        texto = pagina.extract_text() or ""
+        en_tabla = False
+        for linea in texto.splitlines():
+            linea = linea.strip()
+            if en_tabla and linea:
+                lineas.append(linea)
+            elif fin_encabezado(linea):
+                en_tabla = True
+    return lineas
+
+
+def extraer_periodo(pdf) -> tuple:
+    """
+    Obtiene las fechas del periodo del reporte desde la primera página.
+
+    :param pdf: Documento abierto con pdfplumber.
+    :return: Tupla (inicio, fin) como date, o (None, None) si no se encuentra.
+    """
+    texto = (pdf.pages[0].extract_text() or "") if pdf.pages else ""
+    coincidencia = RE_PERIODO.search(texto)
+    if not coincidencia:
+        return None, None
+    return tuple(datetime.strptime(f, "%d/%m/%Y").date() for f in coincidencia.groups())
+
+
+def _asignar_niveles(estructuras: list):
+    """
+    Asigna el nivel a una serie consecutiva de líneas de estructura programática.
+
+    El programa se reconoce porque su código va pegado a la descripción y el
+    subprograma por tener dos dígitos; las líneas de tres dígitos siempre terminan
+    en la obra justo antes del grupo de gasto, así que se asignan desde el final.
+    """
+    tres_digitos = [e for e in estructuras if e["nivel"] is None]
+    for estructura, nivel in zip(reversed(tres_digitos), ("obra", "actividad", "proyecto")):
+        estructura["nivel"] = nivel
+
+
+def parsear_egresos(lineas: list) -> list:
+    """
+    Interpreta las líneas del reporte de ejecución de egresos.
+
+    :param lineas: Líneas de la tabla sin encabezados.
+    :return: Lista de diccionarios, uno por renglón de gasto, con su estructura programática.
+    """
+    filas = []
+    contexto = dict.fromkeys(("programa", "subprograma", "proyecto", "actividad", "obra"))
+    serie = []
+    ultimo = None
+
+    def cerrar_serie():
+        _asignar_niveles(serie)
+        for estructura in serie:
+            contexto[estructura["nivel"]] = estructura["descripcion"]
+            if estructura["nivel"] == "programa":
+                contexto.update(subprograma=None, proyecto=None, actividad=None, obra=None)
+        serie.clear()
+
+    for linea in lineas:
+        if linea.startswith("TOTAL"):
+            break
+        renglon = RE_RENGLON.match(linea)
+        if renglon:
+            cerrar_serie()
+            codigo, fuente, descripcion, montos = renglon.groups()
+            ultimo = {"renglon": codigo, "fuente": fuente, "descripcion": descripcion, **contexto}
+            ultimo.update(zip(COLUMNAS_EGRESOS, convertir_montos(montos)))
+            filas.append(ultimo)
+            continue
+        estructura = RE_ESTRUCTURA.match(linea)
+        if estructura:
+            codigo, descripcion, _ = estructura.groups()
+            nivel = None
+            if len(codigo) == 2:
+                nivel = "programa" if linea[2] != " " else "subprograma"
+            ultimo = {"nivel": nivel, "descripcion": descripcion}
+            serie.append(ultimo)
+            continue
+        if RE_GRUPO_GASTO.match(linea):
+            cerrar_serie()
+            ultimo = None
+            continue
+        if ultimo is not None:
+            # Descripción que continúa en la línea siguiente
+            ultimo["descripcion"] += f" {linea}"
+
+    return filas
+
+
+def parsear_ingresos(lineas: list) -> list:
+    """
+    Interpreta las líneas del reporte de ejecución de ingresos.
+
+    :param lineas: Líneas de la tabla sin encabezados.
+    :return: Lista de diccionarios, uno por cuenta (de resumen o de detalle).
+    """
+    filas = []
+    ultimo = None
+    for linea in lineas:
+        if linea.startswith("TOTAL"):
+            break
+        cuenta = RE_CUENTA.match(linea)
+        if cuenta:
+            codigo, concepto, fuente, montos = cuenta.groups()
+            ultimo = {
+                "cuenta": codigo.rstrip("."),
+                "concepto": concepto,
+                "fuente": fuente,
+                "es_detalle": fuente is not None,
+            }
+            ultimo.update(zip(COLUMNAS_INGRESOS, convertir_montos(montos)))
+            filas.append(ultimo)
+        elif ultimo is not None:
+            ultimo["concepto"] += f" {linea}"
+    return filas
+
+
+# Reportes con tabla reconocida: fragmento del nombre -> (tabla, fin del encabezado, parser, columnas)
+REPORTES = {
+    "EJECUCION-PRESUPUESTARIA-DE-EGRESOS": (
+        "ejecucion_egresos",
+        lambda linea: linea.startswith("Renglon"),
+        parsear_egresos,
+        ["programa", "subprograma", "proyecto", "actividad", "obra", "renglon", "fuente", "descripcion"]
+        + COLUMNAS_EGRESOS,
+    ),
+    "EJECUCION-PRESUPUESTARIA-DE-INGRESOS": (
+        "ejecucion_ingresos",
+        lambda linea: linea == "(Q)",
+        parsear_ingresos,
+        ["cuenta", "concepto", "fuente", "es_detalle"] + COLUMNAS_INGRESOS,
+    ),
+}
+
+
+async def guardar_filas(conn, tabla: str, columnas: list, nombre_archivo: str, periodo: tuple, filas: list):
+    """
+    Reemplaza las filas de un archivo en su tabla, de modo que reprocesar sea idempotente.
+
+    :param conn: Conexión asyncpg.
+    :param tabla: Tabla destino.
+    :param columnas: Columnas tomadas de cada fila.
+    :param nombre_archivo: Nombre del PDF de origen.
+    :param periodo: Tupla (inicio, fin) del reporte.
+    :param filas: Filas interpretadas.
+    """
+    campo_texto = "descripcion" if "descripcion" in columnas else "concepto"
+    registros = [
+        (nombre_archivo, *periodo, normalizar(fila[campo_texto]), *(fila[c] for c in columnas))
+        for fila in filas
+    ]
+    async with conn.transaction():
+        await conn.execute(f"DELETE FROM {tabla} WHERE nombre_archivo = $1", nombre_archivo)
+        await conn.copy_records_to_table(
+            tabla,
+            records=registros,
+            columns=["nombre_archivo", "periodo_inicio", "periodo_fin", "texto_busqueda", *columnas],
+        )
+
+
+async def procesar_tablas(directorio: str):
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await conn.execute(ESQUEMA)
+        for ruta in sorted(Path(directorio).rglob("*.pdf")):
+            reporte = next((r for clave, r in REPORTES.items() if clave in ruta.name.upper()), None)
+            with pdfplumber.open(ruta) as pdf:
+                if not any((pagina.extract_text() or "").strip() for pagina in pdf.pages[:1]):
+                    print(f"{ruta.name}: sin capa de texto (escaneado), se omite")
+                    continue
+                if reporte is None:
+                    continue
+                tabla, fin_encabezado, parser, columnas = reporte
+                filas = parser(lineas_de_tabla(pdf, fin_encabezado))
+                periodo = extraer_periodo(pdf)
+            await guardar_filas(conn, tabla, columnas, ruta.name, periodo, filas)
+            print(f"{ruta.name}: {len(filas)} filas en {tabla}")
+        await conn.execute("ANALYZE ejecucion_egresos; ANALYZE ejecucion_ingresos;")
+    finally:
+        await conn.close()
+    print("Extracción de tablas completada.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extrae las tablas presupuestarias de los PDFs a PostgreSQL")
+    parser.add_argument("--directorio", default="../pdfs_mayo_2025", help="Carpeta con los PDFs")
+    args = parser.parse_args()
+    asyncio.run(procesar_tablas(args.directorio))
+
+
+if __name__ == "__main__":
+    main()
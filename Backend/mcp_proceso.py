@@ -1,11 +1,14 @@
 import os
-import PyPDF2
+import asyncio
 from typing import List
 from pgvector.psycopg2 import register_vector
 import psycopg2
 from dotenv import load_dotenv
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
+from app.utils.extraccion_pdf import extraer_texto
+from app.agents.indice_vectorial import publicar_desde_bd
+from app.utils.duplicados import DetectorDuplicados, SQL_CREAR_ALIAS
+from app.utils.servicio_embeddings import obtener_modelo
 
 # Cargar variables de entorno
 ruta_env = Path('.') / '.env'
@@ -21,16 +24,11 @@ PUERTO_POSTGRES = os.getenv("POSTGRES_PORT", "5432")
 # Directorio MCP
 DIRECTORIO_MCP = "../pdfs_mayo_2025"
 
-# Cargar modelo de embeddings
-modelo_embedding = SentenceTransformer('all-MiniLM-L6-v2')
-
 def extraer_texto_pdf(ruta_pdf: str) -> str:
+    # Backend según PDF_BACKEND (PyPDF2 como respaldo) y caché por hash del archivo
     texto = ""
     try:
-        with open(ruta_pdf, "rb") as archivo:
-            lector = PyPDF2.PdfReader(archivo)
-            for pagina in lector.pages:
-                texto += pagina.extract_text() or ""
+        texto = extraer_texto(ruta_pdf)
     except Exception as e:
         print(f"Error al extraer texto de {ruta_pdf}: {e}")
     return texto
@@ -43,9 +41,21 @@ def obtener_todos_los_archivos(directorio: str) -> List[str]:
             rutas_archivos.append(ruta_archivo)
     return rutas_archivos
 
+def fragmentar_texto(texto: str, tamano: int = 400, solape: int = 50) -> List[str]:
+    # Fragmentos de `tamano` palabras que comparten `solape` palabras con el anterior
+    palabras = texto.split()
+    paso = max(1, tamano - solape)
+    fragmentos = []
+    for inicio in range(0, len(palabras), paso):
+        fragmentos.append(" ".join(palabras[inicio:inicio + tamano]))
+        if inicio + tamano >= len(palabras):
+            break
+    return fragmentos
+
 def generar_embedding(texto: str) -> List[float]:
     try:
-        embedding = modelo_embedding.encode(texto).tolist()
+        # El modelo se carga la primera vez que se usa
+        embedding = obtener_modelo().encode(texto).tolist()
         return embedding
     except Exception as e:
         print(f"Error al generar embedding: {e}")
@@ -66,6 +76,20 @@ def insertar_documento_en_bd(
         print(f"Error al insertar documento en la base de datos: {e}")
         conexion.rollback()
 
+def guardar_alias(conexion, alias: str, canonico: str, similitud: float):
+    try:
+        cursor = conexion.cursor()
+        cursor.execute(
+            "INSERT INTO documentos_alias (alias, canonico, similitud) VALUES (%s, %s, %s) "
+            "ON CONFLICT (alias) DO UPDATE SET canonico = EXCLUDED.canonico, similitud = EXCLUDED.similitud",
+            (alias, canonico, similitud),
+        )
+        conexion.commit()
+        cursor.close()
+    except Exception as e:
+        print(f"Error al guardar el alias en la base de datos: {e}")
+        conexion.rollback()
+
 def procesar_mcp(directorio: str):
     rutas_archivos = obtener_todos_los_archivos(directorio)
 
@@ -77,6 +101,12 @@ def procesar_mcp(directorio: str):
         port=PUERTO_POSTGRES,
     )
     register_vector(conexion)
+    cursor = conexion.cursor()
+    cursor.execute(SQL_CREAR_ALIAS)
+    conexion.commit()
+    cursor.close()
+    # Las copias de un documento ya procesado se registran como alias y no se insertan
+    detector = DetectorDuplicados()
 
     for ruta_archivo in rutas_archivos:
         try:
@@ -95,7 +125,11 @@ def procesar_mcp(directorio: str):
                 print(f"Tipo de archivo no soportado: {nombre_archivo}")
                 continue
 
-            if contenido.strip():
+            canonico = detector.documento_canonico(nombre_archivo, contenido) if contenido.strip() else None
+            if canonico is not None:
+                guardar_alias(conexion, nombre_archivo, *canonico)
+                print(f"{nombre_archivo} es copia de {canonico[0]}, se registra como alias.")
+            elif contenido.strip():
                 embedding = generar_embedding(contenido)
                 if embedding:
                     insertar_documento_en_bd(conexion, nombre_archivo, tipo, contenido, embedding)
@@ -109,6 +143,11 @@ def procesar_mcp(directorio: str):
             print(f"Error al procesar {ruta_archivo}: {e}")
 
     conexion.close()
+    # Nueva instantánea para los workers que usan el índice vectorial en memoria
+    try:
+        asyncio.run(publicar_desde_bd())
+    except Exception as e:
+        print(f"Error al publicar la instantánea del índice vectorial: {e}")
     print("Procesamiento del MCP completado.")
 
 if __name__ == "__main__":
@@ -0,0 +1,227 @@
+"""
+Pipeline continuo de descarga e indexación de los PDFs mensuales.
+
+Une en un solo comando la descarga (scraping/extracion_pdf.py) y la indexación
+(mcp_proceso.py): cada PDF nuevo o actualizado pasa de inmediato por extracción de
+texto, fragmentación, embeddings e inserción en la tabla documentos, sin esperar a
+que terminen las demás descargas. Las etapas se comunican por colas acotadas, así
+una etapa lenta frena a la anterior en lugar de acumular archivos en memoria, y el
+tiempo total queda cerca del de la etapa más lenta.
+
+Al terminar publica una instantánea del índice vectorial y devuelve a revisión las
+respuestas precalculadas que dependían de los documentos reemplazados.
+
+Uso (desde la carpeta Backend):
+    python pipeline_indexacion.py --meses mayo-2025 junio-2025
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+import asyncpg
+from pgvector.asyncpg import register_vector
+
+from app.config import DATABASE_URL
+from app.agents.indice_vectorial import publicar_instantanea
+from app.db.crud import invalidar_respuestas_precalculadas
+from app.utils.duplicados import DetectorDuplicados, guardar_alias
+from app.utils.metadatos import asegurar_metadatos, metadatos_archivo
+from app.utils.helpers import generar_embeddings
+from mcp_proceso import extraer_texto_pdf, fragmentar_texto
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "scraping"))
+from extracion_pdf import descargar_meses  # noqa: E402
+
+# Marca de fin que cada etapa reenvía a la siguiente al terminar
+_FIN = object()
+
+
+class Etapa:
+    """
+    Trabajadores que consumen una cola de entrada y publican en la de salida.
+    """
+
+    def __init__(self, nombre: str, funcion, trabajadores: int, entrada: asyncio.Queue, salida: asyncio.Queue = None):
+        """
+        :param nombre: Nombre para los mensajes y métricas.
+        :param funcion: Función asíncrona que procesa un elemento; si devuelve None no se publica nada.
+        :param trabajadores: Trabajadores concurrentes de la etapa.
+        :param entrada: Cola de la que se leen los elementos.
+        :param salida: Cola donde se publican los resultados (None en la última etapa).
+        """
+        self.nombre = nombre
+        self.funcion = funcion
+        self.trabajadores = trabajadores
+        self.entrada = entrada
+        self.salida = salida
+        self.siguiente = None
+        self.procesados = 0
+        self.errores = 0
+        self.segundos = 0.0
+
+    async def _trabajar(self):
+        while True:
+            elemento = await self.entrada.get()
+            if elemento is _FIN:
+                return
+            inicio = time.perf_counter()
+            try:
+                resultado = await self.funcion(elemento)
+            except Exception as e:
+                self.errores += 1
+                print(f"[Pipeline] Error en {self.nombre}: {e}")
+                continue
+            finally:
+                self.segundos += time.perf_counter() - inicio
+            self.procesados += 1
+            if resultado is not None and self.salida is not None:
+                await self.salida.put(resultado)
+
+    async def ejecutar(self):
+        """
+        Procesa la entrada hasta recibir la marca de fin y avisa a la etapa siguiente.
+        """
+        await asyncio.gather(*(self._trabajar() for _ in range(self.trabajadores)))
+        if self.siguiente is not None:
+            await self.siguiente.terminar_entrada()
+
+    async def terminar_entrada(self):
+        """
+        Encola una marca de fin por cada trabajador.
+        """
+        for _ in range(self.trabajadores):
+            await self.entrada.put(_FIN)
+
+
+async def invalidar_precalculadas(conn):
+    """
+    Devuelve a revisión las respuestas precalculadas generadas con documentos que se
+    acaban de reemplazar; los workers dejan de usarlas en su siguiente recarga.
+    """
+    try:
+        invalidadas = await invalidar_respuestas_precalculadas(conn)
+    except asyncpg.exceptions.UndefinedTableError:
+        # La app aún no creó la tabla: no hay respuestas que invalidar
+        return
+    if invalidadas:
+        print(f"[Pipeline] {len(invalidadas)} respuestas precalculadas vuelven a revisión: {invalidadas}")
+
+
+async def ejecutar_pipeline(args):
+    conn = await asyncpg.connect(DATABASE_URL)
+    await register_vector(conn)
+    await asegurar_metadatos(conn)
+    detector = DetectorDuplicados()
+    await detector.cargar(conn)
+
+    colas = [asyncio.Queue(maxsize=args.tam_cola) for _ in range(3)]
+
+    async def extraer(ruta: Path):
+        texto = await asyncio.to_thread(extraer_texto_pdf, str(ruta))
+        fragmentos = fragmentar_texto(texto, args.tamano, args.solape)
+        if not fragmentos:
+            print(f"[Pipeline] {ruta.name}: sin texto extraíble")
+            return None
+        return ruta.name, fragmentos
+
+    async def embeber(elemento):
+        nombre, fragmentos = elemento
+        # Una sola etapa decide los duplicados, así dos copias nunca se revisan a la vez;
+        # las copias y los fragmentos repetidos no llegan a generar embeddings
+        detector.olvidar_documento(nombre)
+        canonico = detector.documento_canonico(nombre, " ".join(fragmentos))
+        if canonico is not None:
+            return nombre, None, None, canonico
+        fragmentos = [fragmentos[i] for i in detector.filtrar_fragmentos(nombre, fragmentos)]
+        embeddings = await generar_embeddings(fragmentos)
+        return nombre, fragmentos, embeddings, None
+
+    async def insertar(elemento):
+        nombre, fragmentos, embeddings, canonico = elemento
+        if canonico is not None:
+            await guardar_alias(conn, nombre, *canonico)
+            return
+        m = metadatos_archivo(nombre)
+        # Un archivo actualizado reemplaza a su versión anterior
+        async with conn.transaction():
+            await conn.execute("DELETE FROM documentos WHERE nombre_archivo = $1", nombre)
+            await conn.copy_records_to_table(
+                "documentos",
+                records=[
+                    (nombre, "pdf", f, e, m["categoria"], m["periodo"], m["anio"])
+                    for f, e in zip(fragmentos, embeddings)
+                ],
+                columns=["nombre_archivo", "tipo", "contenido", "embedding", "categoria", "periodo", "anio"],
+            )
+        print(f"[Pipeline] {nombre}: {len(fragmentos)} fragmentos indexados")
+
+    etapas = [
+        Etapa("extracción", extraer, args.extractores, colas[0], colas[1]),
+        Etapa("embeddings", embeber, 1, colas[1], colas[2]),
+        Etapa("inserción", insertar, 1, colas[2]),
+    ]
+    for etapa, siguiente in zip(etapas, etapas[1:]):
+        etapa.siguiente = siguiente
+
+    async def descargar():
+        inicio = time.perf_counter()
+        try:
+            resumen = await descargar_meses(
+                args.meses, args.raiz, args.concurrencia, al_descargar=colas[0].put
+            )
+        finally:
+            await etapas[0].terminar_entrada()
+        return resumen, time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    try:
+        # Si la descarga falla, su marca de fin igual llega a las etapas: se espera a que
+        # vacíen sus colas antes de seguir, porque todas usan `conn`
+        (descarga, *resultados) = await asyncio.gather(
+            descargar(), *(etapa.ejecutar() for etapa in etapas), return_exceptions=True
+        )
+        if etapas[-1].procesados:
+            # Nueva instantánea para los workers que usan el índice vectorial en memoria
+            await publicar_instantanea(conn)
+            await invalidar_precalculadas(conn)
+        for resultado in (descarga, *resultados):
+            if isinstance(resultado, BaseException):
+                raise resultado
+    finally:
+        await conn.close()
+    resumen, segundos_descarga = descarga
+    total = time.perf_counter() - inicio
+
+    print(
+        f"[Pipeline] Descarga: {resumen['descargados']} nuevos, {resumen['sin_cambios']} sin cambios, "
+        f"{resumen['errores']} con error en {segundos_descarga:.1f}s"
+    )
+    for etapa in etapas:
+        print(
+            f"[Pipeline] {etapa.nombre}: {etapa.procesados} procesados, {etapa.errores} errores, "
+            f"{etapa.segundos:.1f}s de trabajo"
+        )
+    print(
+        f"[Pipeline] Duplicados: {detector.documentos_duplicados} documentos, "
+        f"{detector.fragmentos_duplicados} fragmentos omitidos"
+    )
+    print(f"[Pipeline] Tiempo total: {total:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Descarga e indexa los PDFs mensuales en un solo pipeline")
+    parser.add_argument("--meses", nargs="+", default=["mayo-2025"], help="Páginas mensuales, por ejemplo mayo-2025")
+    parser.add_argument("--raiz", default="..", help="Carpeta donde se crean las carpetas pdfs_<mes>")
+    parser.add_argument("--concurrencia", type=int, default=6, help="Descargas simultáneas")
+    parser.add_argument("--extractores", type=int, default=2, help="Trabajadores de extracción de texto")
+    parser.add_argument("--tam-cola", type=int, default=8, help="Capacidad de cada cola entre etapas")
+    parser.add_argument("--tamano", type=int, default=400, help="Palabras por fragmento")
+    parser.add_argument("--solape", type=int, default=50, help="Palabras compartidas entre fragmentos")
+    asyncio.run(ejecutar_pipeline(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Precalcula respuestas para las preguntas más frecuentes de consultas_respuestas.
+
+Agrupa las preguntas históricas por similitud de embeddings, elige los grupos más
+grandes y genera con AgnoMunicipalAgent una respuesta canónica para cada uno, con
+llamadas concurrentes limitadas por un cubo de tokens. Las respuestas quedan
+pendientes de revisión en respuestas_precalculadas; el chat solo usa las aprobadas.
+
+Antes de generar reporta la tasa de aciertos esperada: los grupos se forman con la
+parte más antigua del historial y se mide qué fracción de las preguntas más
+recientes habría encontrado una respuesta precalculada.
+
+Las preguntas sobre montos no se precalculan: dependen del último reporte
+presupuestario cargado. Cada respuesta guarda los documentos con que se generó y
+vuelve a revisión cuando esos datos cambian (ver RespuestasPrecalculadas.recargar).
+
+Uso (desde la carpeta Backend):
+    python precalcular_respuestas.py --top 25
+    python precalcular_respuestas.py --solo-reporte
+    python precalcular_respuestas.py --pendientes
+    python precalcular_respuestas.py --aprobar 3 4 7
+"""
+
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+import numpy as np
+
+from app.config import OPENROUTER_API_KEY, RESPUESTAS_PRECALCULADAS_UMBRAL
+from app.db.connection import db
+from app.db.crud import (
+    asegurar_tabla_respuestas_precalculadas,
+    obtener_respuestas_precalculadas,
+    aprobar_respuestas_precalculadas,
+)
+from app.utils.admision import CuboTokens
+from app.utils.helpers import sanitizar_texto
+from app.utils.servicio_embeddings import obtener_modelo
+from app.agents.agno_agent import AgnoMunicipalAgent
+from app.agents.consultas_tablas import es_pregunta_numerica
+
+# Respuestas que indican que el agente no pudo contestar; no se guardan
+PREFIJOS_FALLIDOS = ("Lo siento", "Error del servidor", "Error en la comunicación")
+
+
+def normalizar_pregunta(pregunta: str) -> str:
+    return " ".join(sanitizar_texto(pregunta).lower().split())
+
+
+def agrupar(preguntas: list, umbral: float):
+    """
+    Agrupa preguntas por similitud coseno con un algoritmo de líder.
+
+    Las preguntas distintas se recorren de la más a la menos repetida; cada una se une
+    al primer grupo cuyo líder (la pregunta más repetida del grupo) supere el umbral o
+    abre un grupo nuevo.
+
+    :param preguntas: Preguntas normalizadas, con repeticiones.
+    :param umbral: Similitud mínima con el líder del grupo.
+    :return: Lista de grupos ordenada por tamaño, cada uno con `pregunta` (el líder),
+        `embedding` normalizado y `frecuencia`.
+    """
+    conteo = Counter(preguntas)
+    distintas = [p for p, _ in conteo.most_common()]
+    if not distintas:
+        return []
+    embeddings = np.asarray(obtener_modelo().encode(distintas, batch_size=64), dtype=np.float32)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    lideres = []
+    frecuencias = []
+    for i, pregunta in enumerate(distintas):
+        if lideres:
+            similitudes = embeddings[lideres] @ embeddings[i]
+            mejor = int(np.argmax(similitudes))
+            if similitudes[mejor] >= umbral:
+                frecuencias[mejor] += conteo[pregunta]
+                continue
+        lideres.append(i)
+        frecuencias.append(conteo[pregunta])
+
+    grupos = [
+        {"pregunta": distintas[i], "embedding": embeddings[i], "frecuencia": f}
+        for i, f in zip(lideres, frecuencias)
+    ]
+    return sorted(grupos, key=lambda g: g["frecuencia"], reverse=True)
+
+
+def agrupar_precalculables(preguntas: list, umbral: float):
+    """
+    Igual que `agrupar`, sin los grupos de preguntas sobre montos, que el chat nunca
+    responde con una respuesta precalculada.
+    """
+    grupos = agrupar(preguntas, umbral)
+    precalculables = [g for g in grupos if not es_pregunta_numerica(g["pregunta"])]
+    if len(precalculables) < len(grupos):
+        print(f"[Precalculo] {len(grupos) - len(precalculables)} grupos sobre montos excluidos")
+    return precalculables
+
+
+def tasa_aciertos(grupos: list, preguntas: list, umbral: float) -> float:
+    """
+    Fracción de las preguntas que encontraría respuesta entre los grupos dados.
+
+    :param grupos: Grupos con su embedding normalizado.
+    :param preguntas: Preguntas normalizadas a evaluar, con repeticiones.
+    :param umbral: Similitud mínima para usar la respuesta precalculada (la del chat).
+    """
+    if not grupos or not preguntas:
+        return 0.0
+    conteo = Counter(preguntas)
+    distintas = list(conteo)
+    embeddings = np.asarray(obtener_modelo().encode(distintas, batch_size=64), dtype=np.float32)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    similitudes = (embeddings @ np.stack([g["embedding"] for g in grupos]).T).max(axis=1)
+    aciertos = sum(conteo[p] for p, s in zip(distintas, similitudes) if s >= umbral)
+    return aciertos / len(preguntas)
+
+
+def reportar(preguntas: list, args):
+    """
+    Imprime la tasa de aciertos esperada para distintos N con una partición temporal.
+    """
+    corte = int(len(preguntas) * (1 - args.evaluacion))
+    historial, recientes = preguntas[:corte], preguntas[corte:]
+    grupos = agrupar_precalculables(historial, args.umbral_grupo)
+    print(
+        f"[Precalculo] {len(preguntas)} preguntas históricas: {len(historial)} para agrupar "
+        f"({len(grupos)} grupos), {len(recientes)} recientes para evaluar"
+    )
+    print(f"\n{'top N':>7}{'cobertura historial':>22}{'aciertos recientes':>21}")
+    for n in sorted({5, 10, 25, 50, 100, args.top}):
+        if n > len(grupos) and n != args.top:
+            continue
+        cobertura = sum(g["frecuencia"] for g in grupos[:n]) / len(historial) if historial else 0.0
+        aciertos = tasa_aciertos(grupos[:n], recientes, args.umbral_busqueda)
+        print(f"{n:>7}{cobertura:>22.1%}{aciertos:>21.1%}")
+    print()
+
+
+async def generar(grupos: list, args):
+    """
+    Genera y guarda como pendientes las respuestas de los grupos.
+    """
+    agente = AgnoMunicipalAgent(db, OPENROUTER_API_KEY)
+    semaforo = asyncio.Semaphore(args.concurrencia)
+    cubo = CuboTokens(capacidad=args.concurrencia, recarga_por_segundo=args.por_minuto / 60)
+
+    async def responder(grupo: dict):
+        async with semaforo:
+            while not cubo.consumir(time.monotonic()):
+                await asyncio.sleep(cubo.segundos_para_token())
+            partes = []
+            traza = {}
+            try:
+                async for fragmento in agente.responder_stream(
+                    grupo["pregunta"], grupo["embedding"].tolist(), traza=traza
+                ):
+                    partes.append(fragmento.decode("utf-8"))
+            except Exception as e:
+                print(f"[Precalculo] Error generando la respuesta de {grupo['pregunta']}: {e}")
+                return None
+            respuesta = "".join(partes).strip()
+        if not respuesta or respuesta.startswith(PREFIJOS_FALLIDOS):
+            print(f"[Precalculo] Sin respuesta válida para: {grupo['pregunta']}")
+            return None
+        print(f"[Precalculo] Respuesta generada ({grupo['frecuencia']} consultas): {grupo['pregunta']}")
+        return grupo["pregunta"], respuesta, grupo["embedding"], grupo["frecuencia"], traza.get("documentos_ids", [])
+
+    registros = [r for r in await asyncio.gather(*(responder(g) for g in grupos)) if r is not None]
+
+    # Las pendientes anteriores se reemplazan; las aprobadas se conservan
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("DELETE FROM respuestas_precalculadas WHERE revisada = FALSE;")
+            await conn.copy_records_to_table(
+                "respuestas_precalculadas",
+                records=registros,
+                columns=["pregunta", "respuesta", "embedding", "frecuencia", "documentos_ids"],
+            )
+    print(f"[Precalculo] {len(registros)} respuestas guardadas pendientes de revisión")
+
+
+async def ejecutar(args):
+    await db.connect()
+    try:
+        await asegurar_tabla_respuestas_precalculadas()
+
+        if args.aprobar:
+            aprobadas = await aprobar_respuestas_precalculadas(args.aprobar)
+            print(f"[Precalculo] {aprobadas} respuestas aprobadas")
+            return
+
+        if args.pendientes:
+            for r in await obtener_respuestas_precalculadas(revisadas=False):
+                print(f"\n#{r['id']} ({r['frecuencia']} consultas) {r['pregunta']}\n{r['respuesta']}")
+            return
+
+        filas = await db.fetch("SELECT pregunta FROM consultas_respuestas ORDER BY id;")
+        preguntas = [p for p in (normalizar_pregunta(f["pregunta"] or "") for f in filas) if p]
+        reportar(preguntas, args)
+        if args.solo_reporte:
+            return
+
+        aprobadas = {r["pregunta"] for r in await obtener_respuestas_precalculadas(revisadas=True)}
+        grupos = [g for g in agrupar_precalculables(preguntas, args.umbral_grupo) if g["pregunta"] not in aprobadas]
+        await generar(grupos[:args.top], args)
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precalcula respuestas para las preguntas más frecuentes.")
+    parser.add_argument("--top", type=int, default=25, help="Grupos de preguntas a responder.")
+    parser.add_argument("--umbral-grupo", type=float, default=0.85, help="Similitud mínima para agrupar preguntas.")
+    parser.add_argument(
+        "--umbral-busqueda", type=float, default=RESPUESTAS_PRECALCULADAS_UMBRAL,
+        help="Similitud mínima con que el chat usa una respuesta (para el reporte).",
+    )
+    parser.add_argument("--evaluacion", type=float, default=0.2, help="Fracción más reciente del historial para evaluar.")
+    parser.add_argument("--concurrencia", type=int, default=3, help="Respuestas generadas a la vez.")
+    parser.add_argument("--por-minuto", type=float, default=20, help="Llamadas máximas al LLM por minuto.")
+    parser.add_argument("--solo-reporte", action="store_true", help="Solo reportar la tasa de aciertos esperada.")
+    parser.add_argument("--pendientes", action="store_true", help="Listar las respuestas pendientes de revisión.")
+    parser.add_argument("--aprobar", type=int, nargs="+", help="IDs de respuestas revisadas a publicar.")
+    asyncio.run(ejecutar(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
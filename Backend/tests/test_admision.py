@@ -0,0 +1,141 @@
+"""
+Pruebas del control de admisión: cubo de tokens, cola acotada, límites por ciudadano
+y liberación de turnos cuya respuesta nunca empieza.
+
+Ejecutar (desde la carpeta Backend):
+    python -m pytest -q tests
+"""
+
+import asyncio
+
+import pytest
+
+from app.utils.admision import ControladorAdmision, CuboTokens, SolicitudRechazada
+
+
+def controlador(**kwargs) -> ControladorAdmision:
+    opciones = dict(
+        max_concurrentes=1, max_cola=2, espera_max=60.0, max_por_ciudadano=2,
+        capacidad_cubo=100, recarga_cubo=100,
+    )
+    opciones.update(kwargs)
+    return ControladorAdmision(**opciones)
+
+
+def test_cubo_tokens_se_vacia_y_recarga():
+    cubo = CuboTokens(capacidad=2, recarga_por_segundo=1)
+    ahora = cubo.actualizado
+    assert cubo.consumir(ahora)
+    assert cubo.consumir(ahora)
+    assert not cubo.consumir(ahora)
+    assert cubo.segundos_para_token() == pytest.approx(1.0)
+    assert cubo.consumir(ahora + 1.0)
+    assert not cubo.lleno(ahora + 1.5)
+    assert cubo.lleno(ahora + 10)
+    assert cubo.tokens == 2
+
+
+def test_cubo_del_ciudadano_rechaza_con_429():
+    async def probar():
+        c = controlador(max_concurrentes=5, capacidad_cubo=1, recarga_cubo=0.5)
+        (await c.admitir("ana")).liberar()
+        with pytest.raises(SolicitudRechazada) as error:
+            await c.admitir("ana")
+        assert error.value.status == 429
+        assert error.value.reintentar_en == pytest.approx(2.0, abs=0.05)
+        # Otro ciudadano tiene su propio cubo
+        (await c.admitir("luis")).liberar()
+
+    asyncio.run(probar())
+
+
+def test_cola_llena_rechaza_con_503_y_turnos_en_orden():
+    async def probar():
+        c = controlador(max_por_ciudadano=5)
+        activo = await c.admitir("a")
+        esperas = [asyncio.ensure_future(c.admitir(n)) for n in ("b", "c")]
+        await asyncio.sleep(0)
+        assert c.profundidad_cola == 2
+
+        with pytest.raises(SolicitudRechazada) as error:
+            await c.admitir("d")
+        assert error.value.status == 503
+
+        activo.liberar()
+        segundo = await esperas[0]
+        assert segundo.ciudadano_id == "b"
+        assert not esperas[1].done()
+        segundo.liberar()
+        (await esperas[1]).liberar()
+
+        assert c.activos == 0
+        assert c._por_ciudadano == {}
+        assert c.estado()["rechazadas"] == 1
+
+    asyncio.run(probar())
+
+
+def test_espera_vencida_devuelve_503_y_limpia_al_ciudadano():
+    async def probar():
+        c = controlador(espera_max=0.05)
+        # Estimación de espera baja: se encola y el rechazo llega al vencer el plazo
+        c.duracion_media = 0.01
+        activo = await c.admitir("a")
+        with pytest.raises(SolicitudRechazada) as error:
+            await c.admitir("b")
+        assert error.value.status == 503
+        assert c.profundidad_cola == 0
+        assert "b" not in c._por_ciudadano
+        activo.liberar()
+        assert c.activos == 0
+
+    asyncio.run(probar())
+
+
+def test_limite_por_ciudadano():
+    async def probar():
+        c = controlador(max_concurrentes=5, max_por_ciudadano=2)
+        permisos = [await c.admitir("ana"), await c.admitir("ana")]
+        with pytest.raises(SolicitudRechazada) as error:
+            await c.admitir("ana")
+        assert error.value.status == 429
+        for permiso in permisos:
+            permiso.liberar()
+            permiso.liberar()
+        assert c.activos == 0
+        assert c._por_ciudadano == {}
+
+    asyncio.run(probar())
+
+
+def test_vigilancia_libera_el_turno_si_la_respuesta_no_empieza():
+    async def probar():
+        c = controlador()
+        permiso = await c.admitir("ana")
+        permiso.vigilar_inicio(0.05)
+        espera = asyncio.ensure_future(c.admitir("luis"))
+        await asyncio.sleep(0.1)
+        # El cupo pasó al siguiente en la cola sin que nadie llamara a liberar()
+        assert espera.done()
+        assert c.estado()["abandonadas"] == 1
+        assert "ana" not in c._por_ciudadano
+        (await espera).liberar()
+        permiso.liberar()
+        assert c.activos == 0
+
+    asyncio.run(probar())
+
+
+def test_vigilancia_se_cancela_al_iniciar():
+    async def probar():
+        c = controlador()
+        permiso = await c.admitir("ana")
+        permiso.vigilar_inicio(0.05)
+        permiso.iniciar()
+        await asyncio.sleep(0.1)
+        assert c.activos == 1
+        assert c.estado()["abandonadas"] == 0
+        permiso.liberar()
+        assert c.activos == 0
+
+    asyncio.run(probar())
@@ -0,0 +1,196 @@
+"""
+Pruebas del agente: llamadas sin streaming con OpenRouter simulado por un transporte
+de httpx y ensamblado concurrente del contexto con herramientas falsas.
+
+Ejecutar (desde la carpeta Backend):
+    python -m pytest -q tests
+"""
+
+import json
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from app.agents import agno_agent
+from app.agents.agno_agent import AgnoMunicipalAgent
+from app.agents.enrutador_modelos import ErrorModelo
+
+
+def agente_con(monkeypatch, responder) -> AgnoMunicipalAgent:
+    """
+    Agente con dos modelos cuyo cliente HTTP responde con `responder(modelo)`.
+    """
+    cliente_real = httpx.AsyncClient
+
+    def manejar(request: httpx.Request) -> httpx.Response:
+        return responder(json.loads(request.content)["model"])
+
+    monkeypatch.setattr(
+        agno_agent.httpx, "AsyncClient",
+        lambda **kwargs: cliente_real(transport=httpx.MockTransport(manejar), **kwargs),
+    )
+    agente = AgnoMunicipalAgent(None, "clave", modelos=["modelo-a", "modelo-b"])
+    agente.enrutador.circuitos["modelo-a"].max_fallos = 2
+    return agente
+
+
+def respuesta_ok(texto: str) -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": texto}}]})
+
+
+def test_completar_registra_fallos_y_abre_el_circuito(monkeypatch):
+    def responder(modelo):
+        if modelo == "modelo-a":
+            return httpx.Response(503, text="saturado")
+        return respuesta_ok(" resumen ")
+
+    agente = agente_con(monkeypatch, responder)
+    mensajes = [{"role": "user", "content": "hola"}]
+
+    assert asyncio.run(agente._completar(mensajes, max_tokens=10)) == "resumen"
+    assert agente.enrutador.circuitos["modelo-a"].fallos == 1
+
+    asyncio.run(agente._completar(mensajes, max_tokens=10))
+    estado = {m["modelo"]: m for m in agente.enrutador.estado()["modelos"]}
+    assert estado["modelo-a"]["disponible"] is False
+    assert estado["modelo-a"]["fallos_consecutivos"] == 2
+    assert estado["modelo-b"]["fallos_consecutivos"] == 0
+    # Una respuesta sin streaming no cuenta como tiempo al primer token
+    assert estado["modelo-b"]["ttft_medio_s"] is None
+
+
+def test_completar_exito_reinicia_los_fallos(monkeypatch):
+    # modelo-a responde vacío la primera vez y bien la segunda; modelo-b siempre falla
+    respuestas_a = iter([respuesta_ok(""), respuesta_ok("ok")])
+
+    def responder(modelo):
+        return next(respuestas_a) if modelo == "modelo-a" else httpx.Response(500)
+
+    agente = agente_con(monkeypatch, responder)
+    mensajes = [{"role": "user", "content": "hola"}]
+
+    with pytest.raises(ErrorModelo):
+        asyncio.run(agente._completar(mensajes, max_tokens=10))
+    assert agente.enrutador.circuitos["modelo-a"].fallos == 1
+    assert agente.enrutador.circuitos["modelo-b"].fallos == 1
+
+    assert asyncio.run(agente._completar(mensajes, max_tokens=10)) == "ok"
+    assert agente.enrutador.circuitos["modelo-a"].fallos == 0
+
+
+class HerramientaLenta:
+    """
+    Herramienta falsa que tarda `espera` segundos y devuelve `resultado`.
+    """
+
+    def __init__(self, espera: float, resultado):
+        self.espera = espera
+        self.resultado = resultado
+        self.canceladas = 0
+
+    async def responder(self, *args, **kwargs):
+        try:
+            await asyncio.sleep(self.espera)
+        except asyncio.CancelledError:
+            self.canceladas += 1
+            raise
+        return self.resultado
+
+
+def agente_con_etapas(monkeypatch, tablas: HerramientaLenta, vectores: HerramientaLenta, faqs: HerramientaLenta):
+    """
+    Agente con tablas, búsqueda vectorial y FAQs falsas y un modelo que repite el prompt.
+    """
+    monkeypatch.setattr(agno_agent, "CONTEXTO_TIMEOUT_RECUPERACION", 0.2)
+    monkeypatch.setattr(agno_agent, "CONTEXTO_TIMEOUT_OPCIONAL", 0.05)
+    monkeypatch.setattr(agno_agent, "obtener_faqs", faqs.responder)
+    agente = AgnoMunicipalAgent(None, "clave", modelos=["modelo-a"])
+    agente.tablas_tool.consultar = tablas.responder
+    agente.vector_tool.search = vectores.responder
+
+    async def stream_falso(modelo, messages):
+        yield "\n".join(m["content"] for m in messages)
+
+    agente._stream_openrouter = stream_falso
+    return agente
+
+
+def responder(agente: AgnoMunicipalAgent, traza: dict) -> str:
+    async def consumir():
+        partes = [p async for p in agente.responder_stream("¿Dónde pago el boleto de ornato?", embedding=[0.1], traza=traza)]
+        return b"".join(partes).decode("utf-8")
+
+    return asyncio.run(consumir())
+
+
+def test_etapas_en_paralelo_arman_el_contexto(monkeypatch):
+    documentos = [{"id": 7, "contenido": "El boleto de ornato se paga en la tesorería."}]
+    agente = agente_con_etapas(
+        monkeypatch,
+        HerramientaLenta(0.15, "Renglón 062: vigente Q881,143.50"),
+        HerramientaLenta(0.15, documentos),
+        HerramientaLenta(0.03, [{"pregunta": "¿Horario?", "respuesta": "8 a 16 h"}]),
+    )
+    traza = {}
+
+    t = time.perf_counter()
+    respuesta = responder(agente, traza)
+
+    # Tablas y documentos (150 ms cada una) corren a la vez, no en serie
+    assert time.perf_counter() - t < 0.28
+    assert "tesorería" in respuesta and "Q881,143.50" in respuesta and "8 a 16 h" in respuesta
+    assert traza["documentos_ids"] == [7]
+    assert {"consulta_tablas_ms", "busqueda_vectorial_ms", "faqs_ms"} <= set(traza["tiempos"])
+
+
+def test_etapa_opcional_lenta_se_omite(monkeypatch):
+    faqs = HerramientaLenta(5.0, [{"pregunta": "x", "respuesta": "no debe aparecer"}])
+    agente = agente_con_etapas(
+        monkeypatch,
+        HerramientaLenta(0, ""),
+        HerramientaLenta(0, [{"id": 1, "contenido": "Documento municipal"}]),
+        faqs,
+    )
+    traza = {}
+
+    respuesta = responder(agente, traza)
+
+    assert "Documento municipal" in respuesta and "no debe aparecer" not in respuesta
+    assert traza["tiempos"]["omitidas"] == ["faqs"]
+    assert agente.etapas_omitidas == {"faqs": 1}
+    assert agente.etapas_fallidas == 0
+    assert faqs.canceladas == 1
+
+
+def test_etapa_critica_lenta_devuelve_disculpa(monkeypatch):
+    tablas = HerramientaLenta(5.0, "")
+    faqs = HerramientaLenta(5.0, [])
+    agente = agente_con_etapas(monkeypatch, tablas, HerramientaLenta(0, []), faqs)
+    traza = {}
+
+    t = time.perf_counter()
+    respuesta = responder(agente, traza)
+
+    assert time.perf_counter() - t < 1
+    assert respuesta.startswith("Lo siento, no pude consultar los documentos municipales en este momento")
+    assert traza["tiempos"]["error_recuperacion"] == "consulta_tablas superó 0.2s"
+    assert "documentos_ids" not in traza
+    assert agente.etapas_fallidas == 1
+    # Las etapas restantes se cancelan en lugar de quedar corriendo
+    assert tablas.canceladas == 1 and faqs.canceladas == 1
+
+
+def test_error_en_busqueda_vectorial_devuelve_disculpa(monkeypatch):
+    class VectoresRotos:
+        async def responder(self, *args, **kwargs):
+            raise ConnectionError("sin conexión a postgres")
+
+    agente = agente_con_etapas(monkeypatch, HerramientaLenta(0, ""), HerramientaLenta(0, []), HerramientaLenta(0, []))
+    agente.vector_tool.search = VectoresRotos().responder
+    traza = {}
+
+    assert responder(agente, traza).startswith("Lo siento, no pude consultar")
+    assert traza["tiempos"]["error_recuperacion"] == "busqueda_vectorial: sin conexión a postgres"
+    assert agente.etapas_fallidas == 1
@@ -0,0 +1,122 @@
+"""
+Pruebas de la elección del reporte presupuestario con el reporte de egresos de mayo
+de 2025 incluido en el repositorio.
+
+Ejecutar (desde la carpeta Backend):
+    python -m pytest -q tests
+"""
+
+import asyncio
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+
+import pdfplumber
+import pytest
+
+from extraccion_tablas import REPORTES, extraer_periodo, lineas_de_tabla
+from app.agents.consultas_tablas import (
+    SQL_PERIODOS, SQL_EGRESOS, ConsultaTablasTool, elegir_periodo, normalizar,
+)
+from app.utils.metadatos import inferir_mes
+
+REPORTE_EGRESOS = (
+    Path(__file__).resolve().parents[2] / "pdfs_mayo_2025" / "EJECUCION-PRESUPUESTARIA-DE-EGRESOS-DEL-MES-DE-MAYO-2025.pdf"
+)
+MAYO = (date(2025, 5, 1), date(2025, 6, 6))
+
+
+@pytest.fixture(scope="module")
+def reporte_mayo():
+    _, fin_encabezado, parser, _ = REPORTES["EJECUCION-PRESUPUESTARIA-DE-EGRESOS"]
+    with pdfplumber.open(REPORTE_EGRESOS) as pdf:
+        return extraer_periodo(pdf), parser(lineas_de_tabla(pdf, fin_encabezado))
+
+
+class ConexionTablas:
+    """
+    Conexión falsa con ejecucion_egresos cargada en memoria y ejecucion_ingresos vacía.
+    """
+
+    def __init__(self, periodo: tuple, filas: list):
+        self.egresos = [(periodo, fila) for fila in filas]
+
+    async def fetch(self, sql: str, *args):
+        if sql == SQL_PERIODOS.format(tabla="ejecucion_egresos"):
+            return [{"periodo_inicio": i, "periodo_fin": f} for i, f in {p for p, _ in self.egresos}]
+        if sql == SQL_PERIODOS.format(tabla="ejecucion_ingresos"):
+            return []
+        if sql == SQL_EGRESOS:
+            consulta, limite, inicio, fin = args
+            terminos = consulta.split(" | ")
+            grupos = defaultdict(list)
+            for periodo, fila in self.egresos:
+                if periodo == (inicio, fin) and any(t in normalizar(fila["descripcion"]) for t in terminos):
+                    grupos[(fila["renglon"], fila["descripcion"])].append(fila)
+            return [
+                {
+                    "renglon": renglon, "descripcion": descripcion, "partidas": len(partidas),
+                    **{c: sum(p[c] for p in partidas) for c in ("vigente", "devengado", "pagado", "saldo_disponible")},
+                    "periodo_inicio": inicio, "periodo_fin": fin,
+                }
+                for (renglon, descripcion), partidas in list(grupos.items())[:limite]
+            ]
+        return []
+
+
+class PoolTablas:
+    def __init__(self, conexion):
+        self.conexion = conexion
+
+    def acquire(self):
+        pool = self
+
+        class Adquirida:
+            async def __aenter__(self):
+                return pool.conexion
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return Adquirida()
+
+
+def test_periodo_del_reporte_de_mayo(reporte_mayo):
+    periodo, filas = reporte_mayo
+    # SICOIN cierra el reporte de mayo en junio: "Periodo del 01/05/2025 al 06/06/2025"
+    assert periodo == MAYO
+    assert any(normalizar(f["descripcion"]) == "energia electrica" for f in filas)
+
+
+@pytest.mark.parametrize("pregunta, esperado", [
+    ("¿Cuánto se gastó en energía eléctrica en mayo?", MAYO),
+    ("¿Cuánto se gastó en energía eléctrica en mayo de 2025?", MAYO),
+    ("¿Cuánto se gastó en energía eléctrica?", MAYO),
+    ("¿Cuánto se gastó en energía eléctrica en junio?", None),
+    ("¿Cuánto se gastó en energía eléctrica en mayo de 2024?", None),
+])
+def test_elegir_periodo_por_mes_de_inicio(reporte_mayo, pregunta, esperado):
+    periodo, _ = reporte_mayo
+    assert elegir_periodo([periodo], *inferir_mes(pregunta)) == esperado
+
+
+def test_elegir_periodo_mas_reciente_del_mes():
+    abril = (date(2025, 4, 1), date(2025, 5, 7))
+    mayo_corregido = (date(2025, 5, 1), date(2025, 6, 10))
+    periodos = [abril, MAYO, mayo_corregido]
+    assert elegir_periodo(periodos, None, None) == mayo_corregido
+    assert elegir_periodo(periodos, 5, 2025) == mayo_corregido
+    assert elegir_periodo(periodos, 4, None) == abril
+    assert elegir_periodo([(None, None)], None, None) == (None, None)
+    assert elegir_periodo([], None, None) is None
+
+
+def test_consultar_mayo_y_junio(reporte_mayo):
+    herramienta = ConsultaTablasTool(PoolTablas(ConexionTablas(*reporte_mayo)))
+
+    mayo = asyncio.run(herramienta.consultar("¿Cuánto se gastó en energía eléctrica en mayo?"))
+    assert "periodo del 01/05/2025 al 06/06/2025" in mayo
+    assert "ENERGÍA ELÉCTRICA" in mayo
+
+    junio = asyncio.run(herramienta.consultar("¿Cuánto se gastó en energía eléctrica en junio?"))
+    assert junio == "No hay reportes de ejecución presupuestaria cargados para el mes 06."
@@ -0,0 +1,70 @@
+"""
+Pruebas del detector de duplicados con los PDFs de mayo de 2025 incluidos en el
+repositorio: las dos copias del Código Municipal, el Código de Trabajo como documento
+distinto y la guarda de periodo entre publicaciones mensuales.
+
+Ejecutar (desde la carpeta Backend):
+    python -m pytest -q tests
+"""
+
+from pathlib import Path
+
+import pytest
+
+from app.utils.duplicados import DetectorDuplicados, mismo_periodo
+from app.utils.extraccion_pdf import extraer_texto
+
+CARPETA_PDFS = Path(__file__).resolve().parents[2] / "pdfs_mayo_2025"
+
+
+@pytest.fixture(scope="module")
+def textos():
+    nombres = (
+        "10.-CODIGO-MUNICIPAL.pdf", "CODIGO-MUNICIPAL-6.pdf",
+        "12.-CODIGO-DE-TRABAJO.pdf", "DIRECTORIO-MES-DE-MAYO-2025.pdf",
+    )
+    return {n: extraer_texto(CARPETA_PDFS / n, usar_cache=False) for n in nombres}
+
+
+def test_codigo_municipal_repetido_es_copia(textos):
+    detector = DetectorDuplicados()
+    assert detector.documento_canonico("10.-CODIGO-MUNICIPAL.pdf", textos["10.-CODIGO-MUNICIPAL.pdf"]) is None
+    assert detector.documento_canonico("12.-CODIGO-DE-TRABAJO.pdf", textos["12.-CODIGO-DE-TRABAJO.pdf"]) is None
+
+    canonico, similitud = detector.documento_canonico("CODIGO-MUNICIPAL-6.pdf", textos["CODIGO-MUNICIPAL-6.pdf"])
+
+    assert canonico == "10.-CODIGO-MUNICIPAL.pdf"
+    assert similitud >= detector.umbral_documento
+    # La copia no se registra como documento nuevo
+    assert detector.estado()["documentos"] == 2
+    assert detector.documentos_duplicados == 1
+
+
+def test_reindexar_el_mismo_archivo_no_es_copia(textos):
+    detector = DetectorDuplicados()
+    texto = textos["10.-CODIGO-MUNICIPAL.pdf"]
+    detector.documento_canonico("10.-CODIGO-MUNICIPAL.pdf", texto)
+    detector.olvidar_documento("10.-CODIGO-MUNICIPAL.pdf")
+    assert detector.documento_canonico("10.-CODIGO-MUNICIPAL.pdf", texto) is None
+
+
+def test_publicacion_de_otro_mes_no_es_alias(textos):
+    mayo, junio = "DIRECTORIO-MES-DE-MAYO-2025.pdf", "DIRECTORIO-MES-DE-JUNIO-2025.pdf"
+    assert not mismo_periodo(mayo, junio)
+
+    detector = DetectorDuplicados()
+    texto = textos[mayo]
+    assert detector.documento_canonico(mayo, texto) is None
+    assert detector.documento_canonico(junio, texto) is None
+    assert detector.documento_canonico("DIRECTORIO-MES-DE-MAYO-2025-1.pdf", texto) == (mayo, 1.0)
+
+
+def test_fragmentos_repetidos_solo_entre_documentos_del_mismo_periodo(textos):
+    fragmentos = textos["DIRECTORIO-MES-DE-MAYO-2025.pdf"].split("\n\n")[:1] * 2 + ["Alcalde municipal y concejo"]
+    detector = DetectorDuplicados()
+
+    # Un documento conserva sus propios párrafos repetidos
+    assert detector.filtrar_fragmentos("DIRECTORIO-MES-DE-MAYO-2025.pdf", fragmentos) == [0, 1, 2]
+    assert detector.filtrar_fragmentos("DIRECTORIO-MES-DE-JUNIO-2025.pdf", fragmentos) == [0, 1, 2]
+    assert detector.filtrar_fragmentos("INFORME-MES-DE-MAYO-2025.pdf", fragmentos) == []
+    assert detector.fragmentos_duplicados == 3
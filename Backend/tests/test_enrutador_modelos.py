@@ -0,0 +1,115 @@
+"""
+Pruebas del enrutador de modelos: cobertura cuando el primer modelo tarda, fallo del
+primer modelo y apertura de los circuitos, con streams simulados.
+
+Ejecutar (desde la carpeta Backend):
+    python -m pytest -q tests
+"""
+
+import asyncio
+
+import pytest
+
+from app.agents.enrutador_modelos import EnrutadorModelos, ErrorModelo
+
+
+class ModelosFalsos:
+    """
+    Streams simulados por modelo: (espera antes del primer token, fragmentos o excepción).
+    """
+
+    def __init__(self, comportamiento: dict):
+        self.comportamiento = comportamiento
+        self.abiertos = []
+        self.cerrados = []
+
+    async def abrir(self, modelo: str):
+        self.abiertos.append(modelo)
+        espera, salida = self.comportamiento[modelo]
+        try:
+            await asyncio.sleep(espera)
+            if isinstance(salida, Exception):
+                raise salida
+            for fragmento in salida:
+                yield fragmento
+        finally:
+            self.cerrados.append(modelo)
+
+
+async def recolectar(enrutador: EnrutadorModelos, modelos: ModelosFalsos) -> str:
+    return "".join([f async for f in enrutador.generar(modelos.abrir)])
+
+
+def test_sin_cobertura_si_el_primero_responde_a_tiempo():
+    enrutador = EnrutadorModelos(["a", "b"], umbral_primer_token=0.5)
+    modelos = ModelosFalsos({"a": (0.0, ["ho", "la"]), "b": (0.0, ["x"])})
+    assert asyncio.run(recolectar(enrutador, modelos)) == "hola"
+    assert modelos.abiertos == ["a"]
+    assert enrutador.coberturas == 0
+    assert enrutador.circuitos["a"].ttft_medio is not None
+
+
+def test_cobertura_gana_el_modelo_mas_rapido_y_cancela_al_otro():
+    enrutador = EnrutadorModelos(["lento", "rapido"], umbral_primer_token=0.05)
+    modelos = ModelosFalsos({"lento": (5.0, ["tarde"]), "rapido": (0.0, ["a ", "tiempo"])})
+
+    async def probar():
+        texto = await recolectar(enrutador, modelos)
+        await asyncio.sleep(0)
+        return texto
+
+    assert asyncio.run(probar()) == "a tiempo"
+    assert modelos.abiertos == ["lento", "rapido"]
+    assert "lento" in modelos.cerrados
+    assert enrutador.coberturas == 1
+    assert enrutador.victorias == {"lento": 0, "rapido": 1}
+    # Perder la carrera no es un fallo
+    assert enrutador.circuitos["lento"].fallos == 0
+
+
+def test_fallo_del_primer_modelo_pasa_al_siguiente():
+    enrutador = EnrutadorModelos(["a", "b"], umbral_primer_token=5.0)
+    modelos = ModelosFalsos({"a": (0.0, RuntimeError("502")), "b": (0.0, ["respuesta"])})
+    assert asyncio.run(recolectar(enrutador, modelos)) == "respuesta"
+    assert modelos.abiertos == ["a", "b"]
+    assert enrutador.circuitos["a"].fallos == 1
+    assert enrutador.circuitos["b"].fallos == 0
+
+
+def test_respuesta_vacia_cuenta_como_fallo():
+    enrutador = EnrutadorModelos(["a", "b"], umbral_primer_token=5.0)
+    modelos = ModelosFalsos({"a": (0.0, []), "b": (0.0, ["ok"])})
+    assert asyncio.run(recolectar(enrutador, modelos)) == "ok"
+    assert enrutador.circuitos["a"].fallos == 1
+
+
+def test_circuito_se_abre_y_saca_al_modelo_de_rotacion():
+    enrutador = EnrutadorModelos(["a", "b"], umbral_primer_token=5.0, max_fallos=2, enfriamiento=60)
+    modelos = ModelosFalsos({"a": (0.0, RuntimeError("caído")), "b": (0.0, ["ok"])})
+    for _ in range(2):
+        assert asyncio.run(recolectar(enrutador, modelos)) == "ok"
+    assert enrutador.candidatos() == ["b"]
+
+    modelos.abiertos.clear()
+    assert asyncio.run(recolectar(enrutador, modelos)) == "ok"
+    assert modelos.abiertos == ["b"]
+    estado = {m["modelo"]: m for m in enrutador.estado()["modelos"]}
+    assert estado["a"]["disponible"] is False
+    assert estado["b"]["respuestas"] == 3
+
+
+def test_todos_fallan():
+    enrutador = EnrutadorModelos(["a", "b"], umbral_primer_token=5.0)
+    modelos = ModelosFalsos({"a": (0.0, RuntimeError("uno")), "b": (0.0, ErrorModelo("dos"))})
+    with pytest.raises(ErrorModelo, match="dos"):
+        asyncio.run(recolectar(enrutador, modelos))
+
+
+def test_con_todos_los_circuitos_abiertos_se_intenta_igual():
+    enrutador = EnrutadorModelos(["a", "b"], umbral_primer_token=5.0, max_fallos=1, enfriamiento=60)
+    enrutador.circuitos["a"].registrar_fallo()
+    enrutador.circuitos["b"].registrar_fallo()
+    modelos = ModelosFalsos({"a": (0.0, ["a"]), "b": (0.0, ["b"])})
+    assert asyncio.run(recolectar(enrutador, modelos)) == "a"
+    # El éxito cierra el circuito del modelo que respondió
+    assert enrutador.candidatos() == ["a"]
@@ -0,0 +1,107 @@
+"""
+Pruebas de la extracción de texto de PDFs: caché en disco por hash y backend,
+extracción sin caché y respaldo con PyPDF2 cuando el backend pedido falla.
+
+Ejecutar (desde la carpeta Backend):
+    python -m pytest -q tests
+"""
+
+from pathlib import Path
+
+import pytest
+
+from app.utils import extraccion_pdf
+
+DIRECTORIO = Path(__file__).resolve().parents[2] / "pdfs_mayo_2025" / "DIRECTORIO-MES-DE-MAYO-2025.pdf"
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    """
+    Caché de extracción en una carpeta temporal en lugar de PDF_CACHE_DIR.
+    """
+    nueva = extraccion_pdf.CacheExtraccion(str(tmp_path / "pdf"))
+    monkeypatch.setattr(extraccion_pdf, "cache_extraccion", nueva)
+    return nueva
+
+
+def archivos_en(cache) -> list:
+    return sorted(p.name for p in cache.directorio.rglob("*.json")) if cache.directorio.exists() else []
+
+
+def contar_llamadas(monkeypatch, backend: str) -> list:
+    """
+    Envuelve la función de un backend para contar las extracciones reales.
+    """
+    llamadas = []
+    modulo, funcion = extraccion_pdf.BACKENDS[backend]
+
+    def contada(datos):
+        llamadas.append(len(datos))
+        return funcion(datos)
+
+    monkeypatch.setitem(extraccion_pdf.BACKENDS, backend, (modulo, contada))
+    return llamadas
+
+
+def test_segunda_lectura_sale_de_la_cache(cache, monkeypatch):
+    llamadas = contar_llamadas(monkeypatch, "pypdf2")
+
+    primera = extraccion_pdf.extraer_paginas(DIRECTORIO, backend="pypdf2")
+    segunda = extraccion_pdf.extraer_paginas(DIRECTORIO.read_bytes(), backend="pypdf2")
+
+    assert segunda == primera
+    assert "DIRECTORIO DE LA ENTIDAD" in primera[0]
+    assert len(llamadas) == 1
+    assert (cache.fallos, cache.aciertos) == (1, 1)
+    assert len(archivos_en(cache)) == 1 and archivos_en(cache)[0].endswith("-pypdf2.json")
+
+
+def test_cache_separada_por_backend(cache):
+    extraccion_pdf.extraer_paginas(DIRECTORIO, backend="pypdf2")
+    extraccion_pdf.extraer_paginas(DIRECTORIO, backend="pdfplumber")
+    assert [n.rsplit("-", 1)[1] for n in archivos_en(cache)] == ["pdfplumber.json", "pypdf2.json"]
+
+
+def test_sin_cache_no_lee_ni_escribe(cache, monkeypatch):
+    llamadas = contar_llamadas(monkeypatch, "pypdf2")
+
+    extraccion_pdf.extraer_texto(DIRECTORIO, backend="pypdf2", usar_cache=False)
+    extraccion_pdf.extraer_texto(DIRECTORIO, backend="pypdf2", usar_cache=False)
+
+    assert len(llamadas) == 2
+    assert archivos_en(cache) == []
+    assert (cache.fallos, cache.aciertos) == (0, 0)
+
+
+def test_cache_corrupta_se_vuelve_a_extraer(cache):
+    paginas = extraccion_pdf.extraer_paginas(DIRECTORIO, backend="pypdf2")
+    next(cache.directorio.rglob("*.json")).write_text("{no es json", encoding="utf-8")
+    assert extraccion_pdf.extraer_paginas(DIRECTORIO, backend="pypdf2") == paginas
+    assert cache.fallos == 2
+
+
+def test_backend_que_falla_pasa_a_pypdf2(cache, monkeypatch):
+    def rota(datos):
+        raise RuntimeError("archivo dañado")
+
+    monkeypatch.setitem(extraccion_pdf.BACKENDS, "pdfplumber", ("pdfplumber", rota))
+
+    paginas = extraccion_pdf.extraer_paginas(DIRECTORIO, backend="pdfplumber")
+
+    assert paginas == extraccion_pdf.extraer_paginas(DIRECTORIO, backend="pypdf2", usar_cache=False)
+    # Se guarda bajo el backend que realmente extrajo el texto
+    assert [n.rsplit("-", 1)[1] for n in archivos_en(cache)] == ["pypdf2.json"]
+
+
+def test_backend_no_instalado_usa_pypdf2(monkeypatch):
+    monkeypatch.setitem(extraccion_pdf.BACKENDS, "inexistente", ("modulo_que_no_existe", None))
+    assert extraccion_pdf.resolver_backend("inexistente") == "pypdf2"
+    assert extraccion_pdf.resolver_backend("auto") in extraccion_pdf.ORDEN_AUTO
+
+
+def test_cache_desactivada_con_directorio_vacio(monkeypatch):
+    sin_cache = extraccion_pdf.CacheExtraccion("")
+    monkeypatch.setattr(extraccion_pdf, "cache_extraccion", sin_cache)
+    assert extraccion_pdf.extraer_paginas(DIRECTORIO, backend="pypdf2")
+    assert (sin_cache.fallos, sin_cache.aciertos) == (0, 0)
@@ -0,0 +1,112 @@
+"""
+Pruebas de la extracción de tablas de los reportes de ejecución presupuestaria de
+mayo de 2025 incluidos en el repositorio: periodo, renglones de egresos y cuentas de
+ingresos, cuadrando las sumas con la línea TOTAL de cada reporte.
+
+Ejecutar (desde la carpeta Backend):
+    python -m pytest -q tests
+"""
+
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import pdfplumber
+import pytest
+
+from extraccion_tablas import REPORTES, convertir_montos, extraer_periodo, lineas_de_tabla, parsear_egresos
+
+CARPETA_PDFS = Path(__file__).resolve().parents[2] / "pdfs_mayo_2025"
+MAYO = (date(2025, 5, 1), date(2025, 6, 6))
+
+
+def leer_reporte(clave: str) -> tuple:
+    """
+    Devuelve (periodo, líneas de tabla, filas) del reporte de mayo con esa clave de REPORTES.
+    """
+    _, fin_encabezado, parser, _ = REPORTES[clave]
+    with pdfplumber.open(CARPETA_PDFS / f"{clave}-DEL-MES-DE-MAYO-2025.pdf") as pdf:
+        lineas = lineas_de_tabla(pdf, fin_encabezado)
+        return extraer_periodo(pdf), lineas, parser(lineas)
+
+
+def totales(lineas: list) -> list:
+    linea = next(l for l in lineas if l.startswith("TOTAL"))
+    return convertir_montos(linea.split(":", 1)[1])
+
+
+@pytest.fixture(scope="module")
+def egresos():
+    return leer_reporte("EJECUCION-PRESUPUESTARIA-DE-EGRESOS")
+
+
+@pytest.fixture(scope="module")
+def ingresos():
+    return leer_reporte("EJECUCION-PRESUPUESTARIA-DE-INGRESOS")
+
+
+def test_periodo_de_los_reportes(egresos, ingresos):
+    # El reporte de mayo se emitió el 6 de junio: el mes lo da el inicio del periodo
+    assert egresos[0] == MAYO
+    assert ingresos[0] == MAYO
+
+
+def test_periodo_ausente():
+    class Pagina:
+        def extract_text(self):
+            return "MUNICIPALIDAD DE SAN MIGUEL\nReporte sin fechas"
+
+    class Documento:
+        pages = [Pagina()]
+
+    assert extraer_periodo(Documento()) == (None, None)
+
+
+def test_renglones_de_egresos(egresos):
+    _, lineas, filas = egresos
+    assert len(filas) == 806
+    primera = filas[0]
+    assert primera["renglon"] == "062"
+    assert primera["fuente"] == "21-0101-0001"
+    assert primera["descripcion"] == "DIETAS PARA CARGOS REPRESENTATIVOS"
+    assert primera["programa"] == "ACTIVIDADES CENTRALES"
+    assert primera["actividad"] == "CONCEJO MUNICIPAL"
+    assert primera["vigente"] == Decimal("881143.50")
+    assert primera["asignado"] + primera["modificado"] == primera["vigente"]
+
+    total = totales(lineas)
+    assert sum(f["vigente"] for f in filas) == total[2]
+    assert sum(f["devengado"] for f in filas) == total[5]
+
+
+def test_cuentas_de_ingresos(ingresos):
+    _, lineas, filas = ingresos
+    assert len(filas) == 99
+    resumen = filas[0]
+    assert resumen["cuenta"] == "10.00.00.00.00"
+    assert resumen["concepto"] == "INGRESOS TRIBUTARIOS"
+    assert resumen["es_detalle"] is False
+    assert resumen["percibido"] == Decimal("16753.00")
+
+    # Solo las cuentas de detalle suman al total: las de resumen ya las agregan
+    detalle = [f for f in filas if f["es_detalle"]]
+    assert all(f["fuente"] for f in detalle)
+    total = totales(lineas)
+    assert sum(f["vigente"] for f in detalle) == total[3]
+    assert sum(f["percibido"] for f in detalle) == total[4]
+
+
+def test_descripcion_en_dos_lineas():
+    montos = " ".join(["1,000.00"] * 11)
+    filas = parsear_egresos([
+        "01ACTIVIDADES CENTRALES 1.00 1.00 1.00 1.00 1.00 1.00 1.00",
+        "000",
+        f"122 21-0101-0001 IMPRESION, ENCUADERNACION Y {montos}",
+        "REPRODUCCION",
+        "TOTAL : 0.00",
+        f"199 21-0101-0001 NO SE LEE {montos}",
+    ])
+    assert len(filas) == 1
+    assert filas[0]["descripcion"] == "IMPRESION, ENCUADERNACION Y REPRODUCCION"
+    assert filas[0]["programa"] == "ACTIVIDADES CENTRALES"
+    assert filas[0]["vigente"] == Decimal("1000.00")
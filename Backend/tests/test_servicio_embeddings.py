@@ -0,0 +1,150 @@
+"""
+Pruebas del protocolo del servicio de embeddings y del reparto por tramos, con un
+modelo falso en lugar de sentence-transformers.
+
+Ejecutar (desde la carpeta Backend):
+    python -m pytest -q tests
+"""
+
+import time
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.utils import servicio_embeddings as se
+
+
+def lector_con(datos: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(datos)
+    reader.feed_eof()
+    return reader
+
+
+def test_protocolo_ida_y_vuelta():
+    async def probar():
+        textos = ["¿Dónde pago el boleto de ornato?", "", "año 2025"]
+        assert await se.leer_peticion(lector_con(se.codificar_peticion(textos))) == textos
+
+        matriz = np.arange(12, dtype=np.float32).reshape(3, 4) / 7
+        recibida = await se.leer_respuesta(lector_con(se.codificar_respuesta(matriz)))
+        assert recibida.dtype == np.float32
+        np.testing.assert_array_equal(recibida, matriz)
+
+        with pytest.raises(se.ErrorServicioEmbeddings, match="sin memoria"):
+            await se.leer_respuesta(lector_con(se.codificar_error("sin memoria")))
+
+        with pytest.raises(ValueError):
+            await se.leer_peticion(lector_con(se.codificar_peticion(["a"])[:4] + b'{"a": 1}'))
+
+    asyncio.run(probar())
+
+
+class ModeloFalso:
+    """
+    Codifica cada texto como [longitud, 1] y registra los lotes que recibe.
+    """
+
+    def __init__(self, demora: float = 0.0):
+        self.demora = demora
+        self.lotes = []
+
+    def __call__(self, textos, batch_size=64):
+        self.lotes.append(list(textos))
+        time.sleep(self.demora)
+        return np.array([[float(len(t)), 1.0] for t in textos], dtype=np.float32)
+
+
+@pytest.fixture
+def servicio(tmp_path, monkeypatch):
+    """
+    Servidor de embeddings en un socket temporal con lotes de 4 textos.
+    """
+    modelo = ModeloFalso(demora=0.05)
+    monkeypatch.setattr(se, "codificar_local", modelo)
+    monkeypatch.setattr(se, "obtener_modelo", lambda: None)
+    ruta = str(tmp_path / "embeddings.sock")
+    return ruta, modelo
+
+
+async def levantar(ruta: str) -> asyncio.Task:
+    servidor = se.ServidorEmbeddings(ruta, lote_max=4, espera_lote_ms=1)
+    tarea = asyncio.create_task(servidor.servir())
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if await servidor._socket_en_uso():
+            break
+    return tarea
+
+
+async def detener(tarea: asyncio.Task):
+    tarea.cancel()
+    await asyncio.gather(tarea, return_exceptions=True)
+
+
+def test_peticion_grande_se_intercala_con_el_chat(servicio):
+    ruta, modelo = servicio
+
+    async def probar():
+        tarea = await levantar(ruta)
+        try:
+            # El servidor parte la petición aunque el cliente no lo haga
+            ingesta = se.ClienteEmbeddings(ruta, timeout=10, lote_max=1000)
+            chat = se.ClienteEmbeddings(ruta, timeout=10)
+            documento = asyncio.create_task(ingesta.embeber(["x" * i for i in range(1, 21)]))
+            await asyncio.sleep(0.07)
+            pregunta = await chat.embeber(["pregunta"])
+            matriz = await documento
+        finally:
+            await detener(tarea)
+        return matriz, pregunta
+
+    matriz, pregunta = asyncio.run(probar())
+    assert matriz[:, 0].tolist() == list(range(1, 21))
+    assert pregunta.tolist() == [[8.0, 1.0]]
+    assert max(len(lote) for lote in modelo.lotes) <= 5
+    # La pregunta no espera a que termine el documento
+    posicion = next(i for i, lote in enumerate(modelo.lotes) if "pregunta" in lote)
+    assert posicion < len(modelo.lotes) - 1
+
+
+def test_cliente_envia_por_tramos_con_plazo_por_tramo(servicio):
+    ruta, modelo = servicio
+
+    async def probar():
+        tarea = await levantar(ruta)
+        try:
+            # 5 tramos de 0.05 s superan el plazo total pero no el de cada tramo
+            cliente = se.ClienteEmbeddings(ruta, timeout=0.2, lote_max=4)
+            matriz = await cliente.embeber(["y" * i for i in range(1, 21)])
+        finally:
+            await detener(tarea)
+        return cliente, matriz
+
+    cliente, matriz = asyncio.run(probar())
+    assert matriz.shape == (20, 2)
+    assert matriz[:, 0].tolist() == list(range(1, 21))
+    assert [len(lote) for lote in modelo.lotes] == [4, 4, 4, 4, 4]
+    assert cliente.estado()["remotas"] == 1
+    assert cliente.estado()["locales"] == 0
+
+
+def test_servidor_deja_de_encolar_si_el_cliente_se_va(servicio):
+    ruta, modelo = servicio
+
+    async def probar():
+        tarea = await levantar(ruta)
+        try:
+            reader, writer = await asyncio.open_unix_connection(ruta)
+            writer.write(se.codificar_peticion(["z"] * 40))
+            await writer.drain()
+            await asyncio.sleep(0.08)
+            writer.close()
+            await asyncio.sleep(0.3)
+        finally:
+            await detener(tarea)
+
+    asyncio.run(probar())
+    # 10 tramos de 4 textos; tras cerrar el cliente no se codifica el resto
+    assert len(modelo.lotes) < 5
@@ -0,0 +1,120 @@
+"""
+Pruebas de las utilidades de streaming de respuestas.
+
+Ejecutar (desde la carpeta Backend):
+    python -m pytest -q tests
+"""
+
+import asyncio
+
+from app.utils.streaming import (
+    DecodificadorSSE, FIN_STREAM, cancelar_si_desconecta, coalescer_salida, extraer_contenido,
+)
+
+
+class FuenteLLM:
+    """
+    Generador de fragmentos que registra si se cerró, como el stream hacia el LLM.
+    """
+
+    def __init__(self, fragmentos: list, bloquear: bool = False):
+        self.fragmentos = fragmentos
+        self.bloquear = bloquear
+        self.cerrada = False
+
+    async def generar(self):
+        try:
+            for fragmento in self.fragmentos:
+                yield fragmento
+            if self.bloquear:
+                await asyncio.Event().wait()
+        finally:
+            self.cerrada = True
+
+
+def test_coalescer_cierra_la_fuente_al_cerrarse():
+    async def probar():
+        fuente = FuenteLLM([b"hola", b" mundo"], bloquear=True)
+        salida = coalescer_salida(fuente.generar(), max_bytes=1024, max_espera_ms=5)
+        assert await salida.__anext__() == b"hola"
+        assert await salida.__anext__() == b" mundo"
+        # El cliente deja de leer mientras el modelo aún no termina
+        await salida.aclose()
+        # Cerrada en el acto, no cuando el recolector finalice el generador
+        assert fuente.cerrada
+
+    asyncio.run(probar())
+
+
+def test_coalescer_cierra_toda_la_cadena():
+    async def probar():
+        fuente = FuenteLLM([b"a"], bloquear=True)
+
+        async def conectado():
+            return False
+
+        salida = coalescer_salida(cancelar_si_desconecta(fuente.generar(), conectado, intervalo_ms=5))
+        assert await salida.__anext__() == b"a"
+        await salida.aclose()
+        # Cerrada en el acto, no cuando el recolector finalice el generador
+        assert fuente.cerrada
+
+    asyncio.run(probar())
+
+
+def test_coalescer_agrupa_fragmentos():
+    async def probar():
+        fuente = FuenteLLM([b"a", b"b", b"c", b"d"])
+        return [b async for b in coalescer_salida(fuente.generar(), max_bytes=2, max_espera_ms=1000)], fuente
+
+    bloques, fuente = asyncio.run(probar())
+    # El primero sale solo; los siguientes se agrupan hasta max_bytes
+    assert bloques == [b"a", b"bc", b"d"]
+    assert fuente.cerrada
+
+
+EVENTOS = (
+    b'data: {"choices":[{"delta":{"content":"Hola"}}]}\r\n\r\n'
+    b": comentario de keep-alive\n\n"
+    b'data:{"choices":[{"delta":{"content":" se\\u00f1or"}}]}\n\n'
+    b'data: {"choices":[{"delta":{}}]}\n\n'
+    b"data: [DONE]\n\n"
+)
+
+
+def decodificar_en_bloques(datos: bytes, tamano: int) -> list:
+    decodificador = DecodificadorSSE()
+    lineas = []
+    for inicio in range(0, len(datos), tamano):
+        lineas.extend(decodificador.alimentar(datos[inicio:inicio + tamano]))
+    return lineas
+
+
+def test_sse_igual_con_cualquier_corte_de_bloques():
+    esperado = decodificar_en_bloques(EVENTOS, len(EVENTOS))
+    assert len(esperado) == 4
+    assert esperado[-1] == FIN_STREAM
+    # Los cortes caen dentro de "data:", entre \r y \n y dentro de secuencias UTF-8
+    for tamano in range(1, 40):
+        assert decodificar_en_bloques(EVENTOS, tamano) == esperado
+
+
+def test_sse_linea_incompleta_queda_pendiente():
+    decodificador = DecodificadorSSE()
+    assert decodificador.alimentar(b'data: {"choices":[{"delta":{"content":"a"') == []
+    assert decodificador.alimentar(b"}}]}\n") == [b'{"choices":[{"delta":{"content":"a"}}]}']
+    assert decodificador.alimentar(b"") == []
+
+
+def test_sse_utf8_partido_entre_bloques():
+    evento = 'data: {"choices":[{"delta":{"content":"niño"}}]}\n'.encode("utf-8")
+    corte = evento.index("ñ".encode("utf-8")) + 1
+    decodificador = DecodificadorSSE()
+    lineas = decodificador.alimentar(evento[:corte]) + decodificador.alimentar(evento[corte:])
+    assert [extraer_contenido(l) for l in lineas] == ["niño"]
+
+
+def test_extraer_contenido():
+    lineas = decodificar_en_bloques(EVENTOS, 7)
+    assert [extraer_contenido(l) for l in lineas] == ["Hola", " señor", None, None]
+    assert extraer_contenido(b"{no es json") is None
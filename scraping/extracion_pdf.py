@@ -1,11 +1,31 @@
+"""
+Descarga de los PDFs publicados por la municipalidad, mes por mes.
+
+Recorre las páginas mensuales (por ejemplo https://municipalidaddemomostenango.com/mayo-2025/)
+y descarga sus PDFs en paralelo con un número acotado de conexiones, escribiendo cada
+archivo a disco mientras llega. Cada carpeta guarda un manifiesto con el ETag y
+Last-Modified de la página y de cada PDF, de modo que las siguientes ejecuciones usan
+GET condicionales y un mes sin cambios se resuelve con respuestas 304. Las descargas
+interrumpidas se reanudan con Range desde el archivo .part.
+
+Uso:
+    python extracion_pdf.py --meses mayo-2025 junio-2025 --concurrencia 6
+"""
+
 import os
-import requests
+import json
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urljoin, urlsplit, unquote
+
+import httpx
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
 
-url = "https://municipalidaddemomostenango.com/mayo-2025/"
-output_folder = "pdfs_mayo_2025"
-os.makedirs(output_folder, exist_ok=True)
+URL_BASE = "https://municipalidaddemomostenango.com/"
+MANIFIESTO = "manifiesto.json"
+TAM_BLOQUE = 64 * 1024
 
 headers = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -13,26 +33,203 @@ headers = {
                   "Chrome/114.0.0.0 Safari/537.36"
 }
 
-response = requests.get(url, headers=headers)
-response.raise_for_status()
 
-soup = BeautifulSoup(response.text, "html.parser")
+def carpeta_del_mes(mes: str, raiz: str = ".") -> Path:
+    # mayo-2025 -> pdfs_mayo_2025, el nombre que usa el resto del proyecto
+    return Path(raiz) / f"pdfs_{mes.replace('-', '_')}"
+
+
+def cargar_manifiesto(carpeta: Path) -> dict:
+    ruta = carpeta / MANIFIESTO
+    if not ruta.exists():
+        return {"pagina": {}, "archivos": {}}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_manifiesto(carpeta: Path, manifiesto: dict):
+    # Escritura atómica para no dejar un manifiesto a medias si se interrumpe
+    temporal = carpeta / f"{MANIFIESTO}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, carpeta / MANIFIESTO)
+
+
+def cabeceras_condicionales(entrada: dict) -> dict:
+    condicionales = {}
+    if entrada.get("etag"):
+        condicionales["If-None-Match"] = entrada["etag"]
+    if entrada.get("last_modified"):
+        condicionales["If-Modified-Since"] = entrada["last_modified"]
+    return condicionales
+
+
+def validadores(respuesta: httpx.Response) -> dict:
+    return {
+        "etag": respuesta.headers.get("ETag"),
+        "last_modified": respuesta.headers.get("Last-Modified"),
+    }
+
+
+def extraer_enlaces_pdf(html: str, url_pagina: str) -> list:
+    soup = BeautifulSoup(html, "html.parser")
+    enlaces = []
+    for a_tag in soup.find_all("a", href=True):
+        href = a_tag['href']
+        if urlsplit(href).path.lower().endswith(".pdf"):
+            full_url = urljoin(url_pagina, href)
+            if full_url not in enlaces:
+                enlaces.append(full_url)
+    return enlaces
+
+
+async def obtener_enlaces(cliente: httpx.AsyncClient, url_pagina: str, manifiesto: dict) -> list:
+    """
+    Lista los PDFs de una página mensual; si la página no cambió se reutiliza la
+    lista guardada en el manifiesto.
+    """
+    pagina = manifiesto["pagina"]
+    condicionales = cabeceras_condicionales(pagina) if pagina.get("enlaces") else {}
+    respuesta = await cliente.get(url_pagina, headers=condicionales)
+    if respuesta.status_code == 304:
+        print(f"{url_pagina} sin cambios")
+        return pagina["enlaces"]
+    respuesta.raise_for_status()
+    enlaces = extraer_enlaces_pdf(respuesta.text, url_pagina)
+    manifiesto["pagina"] = {**validadores(respuesta), "enlaces": enlaces}
+    return enlaces
+
+
+async def descargar_pdf(cliente: httpx.AsyncClient, pdf_url: str, carpeta: Path, manifiesto: dict) -> Optional[Path]:
+    """
+    Descarga un PDF con GET condicional, reanudando desde el .part si existe.
+
+    :return: Ruta del archivo si se descargó de nuevo, None si no había cambios.
+    """
+    nombre = unquote(urlsplit(pdf_url).path.split("/")[-1])
+    destino = carpeta / nombre
+    parcial = carpeta / f"{nombre}.part"
+    entrada = manifiesto["archivos"].get(pdf_url, {})
+
+    solicitud = {}
+    if destino.exists():
+        solicitud.update(cabeceras_condicionales(entrada))
+    desde = parcial.stat().st_size if parcial.exists() else 0
+    validador_parcial = entrada.get("parcial", {})
+    if desde and (validador_parcial.get("etag") or validador_parcial.get("last_modified")):
+        # If-Range: si el archivo cambió en el servidor llega completo (200) en lugar de 206
+        solicitud["Range"] = f"bytes={desde}-"
+        solicitud["If-Range"] = validador_parcial.get("etag") or validador_parcial["last_modified"]
+
+    async with cliente.stream("GET", pdf_url, headers=solicitud) as respuesta:
+        if respuesta.status_code == 304:
+            return None
+        rango_invalido = respuesta.status_code == 416
+        if not rango_invalido:
+            respuesta.raise_for_status()
+            reanudando = respuesta.status_code == 206
+            entrada["parcial"] = validadores(respuesta) if not reanudando else validador_parcial
+            manifiesto["archivos"][pdf_url] = entrada
+            guardar_manifiesto(carpeta, manifiesto)
+            print(f"Descargando {pdf_url}" + (f" (reanudando en {desde} bytes)" if reanudando else "") + " ...")
+
+            with open(parcial, "ab" if reanudando else "wb") as f:
+                async for bloque in respuesta.aiter_bytes(TAM_BLOQUE):
+                    f.write(bloque)
+
+    if rango_invalido:
+        # El .part ya tenía el archivo completo o quedó inválido: empezar de cero
+        parcial.unlink(missing_ok=True)
+        entrada.pop("parcial", None)
+        return await descargar_pdf(cliente, pdf_url, carpeta, manifiesto)
+
+    os.replace(parcial, destino)
+    manifiesto["archivos"][pdf_url] = {
+        **entrada.pop("parcial"),
+        "archivo": nombre,
+        "tamano": destino.stat().st_size,
+    }
+    guardar_manifiesto(carpeta, manifiesto)
+    return destino
+
+
+async def descargar_meses(
+    meses: list,
+    raiz: str = ".",
+    concurrencia: int = 6,
+    al_descargar: Optional[Callable[[Path], Awaitable[None]]] = None,
+) -> dict:
+    """
+    Descarga los PDFs de varias páginas mensuales compartiendo un pool de conexiones.
+
+    :param meses: Slugs de las páginas mensuales, por ejemplo ["mayo-2025"].
+    :param raiz: Carpeta donde se crean las carpetas pdfs_<mes>.
+    :param concurrencia: Descargas simultáneas (y conexiones máximas del pool).
+    :param al_descargar: Función asíncrona opcional que recibe cada PDF nuevo o actualizado
+        en cuanto termina de escribirse.
+    :return: Contadores de archivos descargados, sin cambios y con error.
+    """
+    resumen = {"descargados": 0, "sin_cambios": 0, "errores": 0}
+    semaforo = asyncio.Semaphore(concurrencia)
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    tiempo_espera = httpx.Timeout(30.0, read=60.0)
+
+    async with httpx.AsyncClient(
+        headers=headers, limits=limites, timeout=tiempo_espera, follow_redirects=True
+    ) as cliente:
+
+        async def procesar(pdf_url: str, carpeta: Path, manifiesto: dict):
+            async with semaforo:
+                try:
+                    ruta = await descargar_pdf(cliente, pdf_url, carpeta, manifiesto)
+                except (httpx.HTTPError, OSError) as e:
+                    resumen["errores"] += 1
+                    print(f"Error descargando {pdf_url}: {e}")
+                    return
+            if ruta is None:
+                resumen["sin_cambios"] += 1
+                return
+            resumen["descargados"] += 1
+            if al_descargar is not None:
+                await al_descargar(ruta)
+
+        tareas = []
+        manifiestos = []
+        for mes in meses:
+            url_pagina = urljoin(URL_BASE, f"{mes}/")
+            carpeta = carpeta_del_mes(mes, raiz)
+            carpeta.mkdir(parents=True, exist_ok=True)
+            manifiesto = cargar_manifiesto(carpeta)
+            try:
+                enlaces = await obtener_enlaces(cliente, url_pagina, manifiesto)
+            except httpx.HTTPError as e:
+                print(f"Error leyendo {url_pagina}: {e}")
+                resumen["errores"] += 1
+                continue
+            print(f"Encontrados {len(enlaces)} archivos PDF en {mes}.")
+            manifiestos.append((carpeta, manifiesto))
+            tareas.extend(procesar(pdf_url, carpeta, manifiesto) for pdf_url in enlaces)
+
+        await asyncio.gather(*tareas)
+        for carpeta, manifiesto in manifiestos:
+            guardar_manifiesto(carpeta, manifiesto)
+
+    return resumen
+
 
-pdf_links = []
-for a_tag in soup.find_all("a", href=True):
-    href = a_tag['href']
-    if href.lower().endswith(".pdf"):
-        full_url = urljoin(url, href)
-        pdf_links.append(full_url)
+def main():
+    parser = argparse.ArgumentParser(description="Descarga los PDFs mensuales de la municipalidad")
+    parser.add_argument("--meses", nargs="+", default=["mayo-2025"], help="Páginas mensuales, por ejemplo mayo-2025")
+    parser.add_argument("--salida", default=".", help="Carpeta donde se crean las carpetas pdfs_<mes>")
+    parser.add_argument("--concurrencia", type=int, default=6, help="Descargas simultáneas")
+    args = parser.parse_args()
 
-print(f"Encontrados {len(pdf_links)} archivos PDF.")
+    resumen = asyncio.run(descargar_meses(args.meses, args.salida, args.concurrencia))
+    print(
+        f"Descarga completada: {resumen['descargados']} descargados, "
+        f"{resumen['sin_cambios']} sin cambios, {resumen['errores']} con error."
+    )
 
-for pdf_url in pdf_links:
-    filename = os.path.join(output_folder, pdf_url.split("/")[-1])
-    print(f"Descargando {pdf_url} ...")
-    r = requests.get(pdf_url, headers=headers)
-    r.raise_for_status()
-    with open(filename, "wb") as f:
-        f.write(r.content)
 
-print("Descarga completada.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
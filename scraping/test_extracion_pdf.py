@@ -0,0 +1,215 @@
+"""
+Pruebas de extracion_pdf contra un servidor HTTP local que imita la página mensual
+de la municipalidad: GET condicionales con ETag/Last-Modified, reanudación con
+Range/If-Range, reinicio ante 416 o un validador distinto y persistencia del manifiesto.
+
+Ejecutar (desde la carpeta scraping):
+    python -m pytest -q
+"""
+
+import json
+import asyncio
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import extracion_pdf
+
+MES = "mayo-2025"
+PDF_A = b"%PDF-1.4 informe de ingresos " + bytes(range(256)) * 40
+PDF_B = b"%PDF-1.4 informe de egresos " + bytes(range(255, -1, -1)) * 30
+
+
+class ServidorMunicipal:
+    """
+    Página mensual con dos PDFs, servida por http.server en un hilo aparte.
+    """
+
+    def __init__(self):
+        self.archivos = {}
+        self.peticiones = []
+        self.pagina = (
+            '<html><body><a href="/docs/ingresos.pdf">Ingresos</a>'
+            '<a href="/docs/egresos.pdf">Egresos</a><a href="/otra/">Otra</a></body></html>'
+        ).encode("utf-8")
+        self.publicar("/docs/ingresos.pdf", PDF_A, "v1")
+        self.publicar("/docs/egresos.pdf", PDF_B, "v1")
+
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                servidor.peticiones.append((self.path, dict(self.headers)))
+                if self.path == f"/{MES}/":
+                    self._responder(servidor.pagina, '"pagina"', formatdate(0, usegmt=True))
+                elif self.path in servidor.archivos:
+                    self._responder(*servidor.archivos[self.path])
+                else:
+                    self.send_error(404)
+
+            def _responder(self, contenido, etag, ultima_modificacion):
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                rango = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                if rango and if_range in (None, etag, ultima_modificacion):
+                    desde = int(rango.removeprefix("bytes=").rstrip("-"))
+                    if desde >= len(contenido):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(contenido)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {desde}-{len(contenido) - 1}/{len(contenido)}")
+                    contenido = contenido[desde:]
+                else:
+                    self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", ultima_modificacion)
+                self.send_header("Content-Length", str(len(contenido)))
+                self.end_headers()
+                self.wfile.write(contenido)
+
+            def log_message(self, *args):
+                pass
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self.url = f"http://127.0.0.1:{self._http.server_address[1]}/"
+        self._hilo = threading.Thread(target=self._http.serve_forever, daemon=True)
+
+    def publicar(self, ruta: str, contenido: bytes, version: str):
+        self.archivos[ruta] = (contenido, f'"{version}"', formatdate(len(version), usegmt=True))
+
+    def peticiones_a(self, ruta: str) -> list:
+        return [cabeceras for camino, cabeceras in self.peticiones if camino == ruta]
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._http.shutdown()
+        self._http.server_close()
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    with ServidorMunicipal() as s:
+        monkeypatch.setattr(extracion_pdf, "URL_BASE", s.url)
+        yield s
+
+
+def descargar(raiz, al_descargar=None) -> dict:
+    return asyncio.run(extracion_pdf.descargar_meses([MES], str(raiz), concurrencia=2, al_descargar=al_descargar))
+
+
+def preparar_parcial(servidor, carpeta, nombre: str, contenido: bytes, etag: str):
+    """
+    Deja un .part y su validador en el manifiesto, como tras una descarga interrumpida.
+    """
+    carpeta.mkdir(parents=True, exist_ok=True)
+    (carpeta / f"{nombre}.part").write_bytes(contenido)
+    url = f"{servidor.url}docs/{nombre}"
+    extracion_pdf.guardar_manifiesto(carpeta, {
+        "pagina": {},
+        "archivos": {url: {"parcial": {"etag": etag, "last_modified": None}}},
+    })
+
+
+def test_primera_descarga_guarda_archivos_y_manifiesto(servidor, tmp_path):
+    recibidos = []
+
+    async def al_descargar(ruta):
+        recibidos.append(ruta.name)
+
+    resumen = descargar(tmp_path, al_descargar)
+
+    carpeta = extracion_pdf.carpeta_del_mes(MES, str(tmp_path))
+    assert resumen == {"descargados": 2, "sin_cambios": 0, "errores": 0}
+    assert sorted(recibidos) == ["egresos.pdf", "ingresos.pdf"]
+    assert (carpeta / "ingresos.pdf").read_bytes() == PDF_A
+    assert (carpeta / "egresos.pdf").read_bytes() == PDF_B
+    assert not list(carpeta.glob("*.part"))
+
+    manifiesto = json.loads((carpeta / extracion_pdf.MANIFIESTO).read_text(encoding="utf-8"))
+    assert manifiesto["pagina"]["etag"] == '"pagina"'
+    assert sorted(manifiesto["pagina"]["enlaces"]) == sorted(f"{servidor.url}docs/{n}" for n in ("egresos.pdf", "ingresos.pdf"))
+    entrada = manifiesto["archivos"][f"{servidor.url}docs/ingresos.pdf"]
+    assert entrada["etag"] == '"v1"'
+    assert entrada["last_modified"]
+    assert entrada["archivo"] == "ingresos.pdf"
+    assert entrada["tamano"] == len(PDF_A)
+    assert "parcial" not in entrada
+
+
+def test_segunda_ejecucion_reutiliza_con_304(servidor, tmp_path):
+    descargar(tmp_path)
+    servidor.peticiones.clear()
+
+    resumen = descargar(tmp_path)
+
+    assert resumen == {"descargados": 0, "sin_cambios": 2, "errores": 0}
+    assert servidor.peticiones_a(f"/{MES}/")[0]["If-None-Match"] == '"pagina"'
+    cabeceras = servidor.peticiones_a("/docs/ingresos.pdf")[0]
+    assert cabeceras["If-None-Match"] == '"v1"'
+    assert cabeceras["If-Modified-Since"] == servidor.archivos["/docs/ingresos.pdf"][2]
+
+
+def test_archivo_modificado_se_descarga_de_nuevo(servidor, tmp_path):
+    descargar(tmp_path)
+    nuevo = PDF_A + b" corregido"
+    servidor.publicar("/docs/ingresos.pdf", nuevo, "v2")
+
+    resumen = descargar(tmp_path)
+
+    carpeta = extracion_pdf.carpeta_del_mes(MES, str(tmp_path))
+    assert resumen == {"descargados": 1, "sin_cambios": 1, "errores": 0}
+    assert (carpeta / "ingresos.pdf").read_bytes() == nuevo
+    manifiesto = extracion_pdf.cargar_manifiesto(carpeta)
+    assert manifiesto["archivos"][f"{servidor.url}docs/ingresos.pdf"]["etag"] == '"v2"'
+
+
+def test_reanuda_descarga_interrumpida_con_range(servidor, tmp_path):
+    carpeta = extracion_pdf.carpeta_del_mes(MES, str(tmp_path))
+    preparar_parcial(servidor, carpeta, "ingresos.pdf", PDF_A[:3000], '"v1"')
+
+    descargar(tmp_path)
+
+    cabeceras = servidor.peticiones_a("/docs/ingresos.pdf")[0]
+    assert cabeceras["Range"] == "bytes=3000-"
+    assert cabeceras["If-Range"] == '"v1"'
+    assert (carpeta / "ingresos.pdf").read_bytes() == PDF_A
+    assert not (carpeta / "ingresos.pdf.part").exists()
+
+
+def test_reinicia_si_el_validador_cambio(servidor, tmp_path):
+    carpeta = extracion_pdf.carpeta_del_mes(MES, str(tmp_path))
+    preparar_parcial(servidor, carpeta, "ingresos.pdf", b"restos de otra version" * 50, '"v0"')
+
+    descargar(tmp_path)
+
+    # If-Range no coincide: el servidor responde 200 completo y el .part se reescribe
+    assert servidor.peticiones_a("/docs/ingresos.pdf")[0]["If-Range"] == '"v0"'
+    assert (carpeta / "ingresos.pdf").read_bytes() == PDF_A
+    manifiesto = extracion_pdf.cargar_manifiesto(carpeta)
+    assert manifiesto["archivos"][f"{servidor.url}docs/ingresos.pdf"]["etag"] == '"v1"'
+
+
+def test_reinicia_con_416(servidor, tmp_path):
+    carpeta = extracion_pdf.carpeta_del_mes(MES, str(tmp_path))
+    preparar_parcial(servidor, carpeta, "ingresos.pdf", PDF_A + b"sobrante", '"v1"')
+
+    resumen = descargar(tmp_path)
+
+    peticiones = servidor.peticiones_a("/docs/ingresos.pdf")
+    assert len(peticiones) == 2
+    assert "Range" in peticiones[0]
+    assert "Range" not in peticiones[1]
+    assert resumen["errores"] == 0
+    assert (carpeta / "ingresos.pdf").read_bytes() == PDF_A